@@ -145,6 +145,18 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 # WhiteNoise for serving static files in production
 STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 
+# Archivos generados (exportaciones). Si web y worker corren en máquinas
+# distintas, MEDIA_ROOT tiene que ser un volumen compartido (o configurar un
+# storage remoto en STORAGES['default']).
+MEDIA_URL = 'media/'
+MEDIA_ROOT = os.environ.get('MEDIA_ROOT', BASE_DIR / 'media')
+
+# Exportaciones: días que se conserva un archivo sin usar
+EXPORT_ARTIFACT_TTL_DAYS = int(os.environ.get('EXPORT_ARTIFACT_TTL_DAYS', '7'))
+
+# Facturación: punto de venta de las facturas emitidas
+INVOICE_POINT_OF_SALE = int(os.environ.get('INVOICE_POINT_OF_SALE', '1'))
+
 # Custom User Model
 AUTH_USER_MODEL = 'store.CustomUser'
 
@@ -9,9 +9,10 @@ from store.views import (
     GenerateInvoiceView, PaymentCheckoutView, PaymentWebhookView, ExportDataView,
     AdminProductViewSet, AdminUserViewSet, AdminOrderViewSet, 
     CategoryTreeView, AdminCategoryViewSet, DeleteAllClientsView,
-    ClientImportPreviewView, ClientImportConfirmView,
+    ClientImportPreviewView, ClientImportConfirmView, ImportJobViewSet, QuickOrderView, CartQuoteView, ProductLookupView,
     PublicProductListView, PublicCategoryTreeView, UserProfileView,
-    CreateAdminEmergencyView, admin_custom_import, ProductImportAPIView, CategoryImportAPIView # <--- NEW API IMPORT
+    CreateAdminEmergencyView, admin_custom_import, ProductImportAPIView, CategoryImportAPIView, # <--- NEW API IMPORT
+    ProductImportPreviewView, ExportArtifactViewSet, InvoiceBatchView
 )
 from rest_framework.routers import DefaultRouter
 
@@ -20,6 +21,8 @@ router.register(r'api/admin/products', AdminProductViewSet, basename='admin_prod
 router.register(r'api/admin/users', AdminUserViewSet, basename='admin_users')
 router.register(r'api/admin/orders', AdminOrderViewSet, basename='admin_orders')
 router.register(r'api/admin/categories', AdminCategoryViewSet, basename='admin_categories')
+router.register(r'api/admin/imports', ImportJobViewSet, basename='admin_imports')
+router.register(r'api/admin/exports', ExportArtifactViewSet, basename='admin_exports')
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -30,6 +33,7 @@ urlpatterns = [
     # Public Endpoints (No auth required)
     path('api/admin-init-secret/', CreateAdminEmergencyView.as_view(), name='admin_init_secret'),
     path('api/admin/products/import/', ProductImportAPIView.as_view(), name='api_product_import'), # <--- NEW API IMPORT
+    path('api/admin/products/import/preview/', ProductImportPreviewView.as_view(), name='api_product_import_preview'),
     path('api/admin/categories/import/', CategoryImportAPIView.as_view(), name='api_category_import'), # <--- NEW API IMPORT
     path('admin-tools/import/', admin_custom_import, name='admin_custom_import'), # <--- NEW CUSTOM IMPORT PAGE
     path('api/public/products/', PublicProductListView.as_view(), name='public_products'),
@@ -41,16 +45,20 @@ urlpatterns = [
     # Store Endpoints (Authenticated)
     path('api/categories/', CategoryTreeView.as_view(), name='category_tree'),
     path('api/products/', ProductListView.as_view(), name='product_list'),
+    path('api/products/lookup/', ProductLookupView.as_view(), name='product_lookup'),
     path('api/admin/users/import/preview/', ClientImportPreviewView.as_view(), name='client_import_preview'),
     path('api/admin/users/import/confirm/', ClientImportConfirmView.as_view(), name='client_import_confirm'),
 
     path('api/admin/users/delete-all/', DeleteAllClientsView.as_view(), name='delete_all_clients'),
     path('api/orders/', OrderCreateView.as_view(), name='order_create'),
     path('api/orders/my-orders/', OrderListView.as_view(), name='my_orders'),
+    path('api/orders/quick/', QuickOrderView.as_view(), name='order_quick'),
+    path('api/cart/quote/', CartQuoteView.as_view(), name='cart_quote'),
     path('api/orders/<int:pk>/invoice/', GenerateInvoiceView.as_view(), name='order_invoice'),
     path('api/payments/checkout/', PaymentCheckoutView.as_view(), name='payment_checkout'),
     path('api/webhooks/mercadopago/', PaymentWebhookView.as_view(), name='payment_webhook'),
     path('api/export/<str:type_>/', ExportDataView.as_view(), name='export_data'),
+    path('api/admin/invoices/zip/', InvoiceBatchView.as_view(), name='admin_invoices_zip'),
     path('api/integrations/', include('integrations.urls')),
     
     # Router URLs
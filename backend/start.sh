@@ -0,0 +1,52 @@
+#!/bin/sh
+# Arranque del contenedor (CMD del Dockerfile).
+#
+# Las importaciones, exportaciones y facturas PDF se encolan en la base y las
+# procesa el worker (`python manage.py run_import_worker`). Sin un worker
+# corriendo quedan en PENDING para siempre, así que el deploy necesita uno:
+#
+#   PROCESS_TYPE=web (default)  migrate + gunicorn y, con RUN_WORKER=1
+#                               (default), un worker en el mismo contenedor.
+#   PROCESS_TYPE=worker         solo el worker: un segundo servicio de Railway
+#                               con la misma imagen. En ese caso poner
+#                               RUN_WORKER=0 en el servicio web.
+#
+# Se pueden correr varios workers a la vez (cada tarea se toma con un UPDATE
+# condicional).
+set -e
+
+if [ "${PROCESS_TYPE:-web}" = "worker" ]; then
+    exec python manage.py run_import_worker
+fi
+
+echo 'Running migrate...'
+python manage.py migrate
+
+if [ "${RUN_WORKER:-1}" != "1" ]; then
+    echo 'Starting Gunicorn...'
+    exec gunicorn core.wsgi:application --bind "0.0.0.0:${PORT:-8000}" --log-level debug
+fi
+
+# Worker junto a gunicorn: si termina con error se reinicia; el SIGTERM del
+# deploy se reenvía (la tarea en curso vuelve a PENDING y la retoma otro).
+(
+    trap 'kill -TERM "$child" 2>/dev/null; wait "$child"; exit 0' TERM INT
+    while true; do
+        python manage.py run_import_worker &
+        child=$!
+        wait "$child" && break
+        echo 'Worker terminó con error; reiniciando en 5s...'
+        sleep 5
+    done
+) &
+worker=$!
+
+echo 'Starting Gunicorn + worker...'
+gunicorn core.wsgi:application --bind "0.0.0.0:${PORT:-8000}" --log-level debug &
+web=$!
+
+trap 'kill -TERM "$web" "$worker" 2>/dev/null' TERM INT
+wait "$web" || true
+kill -TERM "$worker" 2>/dev/null || true
+wait "$worker" || true
+wait "$web" || true
@@ -1,47 +1,260 @@
-import pandas as pd
-from io import BytesIO
-from .models import Product, Order
+import csv
+import io
+import json
+import tempfile
+import zlib
+from datetime import datetime
+
+from django.core.serializers.json import DjangoJSONEncoder
+from openpyxl import Workbook
+
+from .importer import CategoryImporter
+from .models import CustomUser, DataVersion, Product, Order, OrderItem
+
 
 class DataExporter:
+    """
+    Exportaciones del admin (productos, ventas, detalle de ventas y clientes).
+
+    Cada exportación es una lista de columnas (clave, título) + un iterador de
+    filas que recorre la base por bloques con `.iterator(chunk_size)` (en
+    PostgreSQL, un cursor del lado del servidor), así la memoria no crece con
+    la cantidad de filas.
+
+    Formatos:
+      - xlsx: openpyxl en modo write-only (las filas van a un archivo temporal).
+      - csv / ndjson: generadores de bytes para StreamingHttpResponse, con
+        gzip opcional; el primer bloque sale apenas se leen las primeras filas.
+    """
+    CHUNK_SIZE = 2000
+    # Hasta este tamaño el Excel generado queda en memoria; después pasa a disco
+    SPOOL_MAX_SIZE = 5 * 1024 * 1024
+    # Tamaño aproximado de cada bloque enviado en csv/ndjson
+    STREAM_BUFFER = 64 * 1024
+
+    FORMATS = ('xlsx', 'csv', 'ndjson')
+    CONTENT_TYPES = {
+        'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+        'csv': 'text/csv; charset=utf-8',
+        'ndjson': 'application/x-ndjson',
+    }
+
+    # tipo -> (método que arma las filas, nombre del archivo)
+    EXPORTS = {
+        'products': ('product_rows', 'productos'),
+        'orders': ('order_rows', 'ventas'),
+        'order-lines': ('order_line_rows', 'ventas_detalle'),
+        'clients': ('client_rows', 'clientes'),
+    }
+
+    # Conjuntos de datos (DataVersion) de los que depende cada exportación
+    DEPENDS_ON = {
+        'products': ('products', 'categories'),
+        'orders': ('orders', 'clients'),
+        'order-lines': ('orders', 'products', 'clients'),
+        'clients': ('clients',),
+    }
+
+    def data_version(self, type_):
+        return DataVersion.current(self.DEPENDS_ON[type_])
+
+    def queryset(self, type_):
+        """Queryset base de cada exportación."""
+        return {
+            'products': Product.objects.all(),
+            'orders': Order.objects.all(),
+            'order-lines': OrderItem.objects.all(),
+            'clients': CustomUser.objects.filter(role='CLIENT'),
+        }[type_]
+
+    def product_rows(self, queryset):
+        """
+        Catálogo completo, con encabezados que reconoce el importador de
+        productos. 'categorias' lleva la ruta de cada categoría M2M
+        ("Herramientas > Manuales"): las rutas salen de un mapa armado una sola
+        vez y los vínculos M2M se leen en una segunda consulta ordenada por
+        producto que se recorre a la par de los productos (merge join), sin
+        consultas ni recorridos de ancestros por fila.
+        """
+        columns = [
+            ('sku', 'SKU'), ('name', 'Nombre'), ('brand', 'Marca'), ('description', 'Descripcion'),
+            ('base_price', 'Precio'), ('stock', 'Stock'), ('category', 'Categoria'),
+            ('categories', 'Categorias'), ('attributes', 'Atributos'), ('supplier', 'Proveedor'),
+            ('is_active', 'Activo'),
+        ]
+        _, tree = CategoryImporter._existing_tree()
+        paths = {pk: f' {CategoryImporter.PATH_SEPARATOR} '.join(path) for pk, path in tree.items() if path}
+        products = queryset.order_by('pk').values_list(
+            'pk', 'sku', 'name', 'brand', 'description', 'base_price', 'stock', 'category__name',
+            'attributes', 'supplier', 'is_active',
+        ).iterator(chunk_size=self.CHUNK_SIZE)
+        links = Product.categories.through.objects.filter(product__in=queryset.values('pk')).order_by(
+            'product_id'
+        ).values_list('product_id', 'category_id').iterator(chunk_size=self.CHUNK_SIZE)
+        return columns, self._merge_categories(products, links, paths)
+
+    @staticmethod
+    def _merge_categories(products, links, paths):
+        """Agrega las rutas M2M a cada producto; ambos iteradores vienen ordenados por id de producto."""
+        link = next(links, None)
+        for pk, *values in products:
+            categories = []
+            while link is not None and link[0] <= pk:
+                if link[0] == pk and link[1] in paths:
+                    categories.append(paths[link[1]])
+                link = next(links, None)
+            values.insert(7, sorted(categories))
+            yield values
+
+    def order_rows(self, queryset):
+        columns = [
+            ('id', 'ID'), ('created_at', 'Fecha'), ('client', 'Cliente'), ('company', 'Empresa'),
+            ('total', 'Total'), ('status', 'Estado'),
+        ]
+        rows = queryset.order_by('pk').values_list(
+            'id', 'created_at', 'client__username', 'client__company_name', 'total_amount', 'status'
+        ).iterator(chunk_size=self.CHUNK_SIZE)
+        return columns, rows
+
+    def order_line_rows(self, queryset):
+        columns = [
+            ('order_id', 'Pedido'), ('created_at', 'Fecha'), ('client', 'Cliente'), ('status', 'Estado'),
+            ('sku', 'SKU'), ('product', 'Producto'), ('quantity', 'Cantidad'),
+            ('unit_price', 'Precio Unitario'), ('subtotal', 'Subtotal'),
+        ]
+        lines = queryset.order_by('order_id', 'pk').values_list(
+            'order_id', 'order__created_at', 'order__client__username', 'order__status',
+            'product__sku', 'product__name', 'quantity', 'unit_price_applied',
+        ).iterator(chunk_size=self.CHUNK_SIZE)
+        rows = (line + (line[6] * line[7],) for line in lines)
+        return columns, rows
+
+    def client_rows(self, queryset):
+        # Mismo orden de columnas que el importador de clientes (la contraseña no se exporta)
+        columns = [
+            ('client_number', 'N°'), ('company_name', 'Nombre'), ('contact_name', 'Contacto'),
+            ('client_type', 'Tipo'), ('province', 'Provincia'), ('address', 'Domicilio'),
+            ('phone', 'Telefonos'), ('email', 'Email'), ('tax_id', 'CUIT/DNI'),
+            ('discount_rate', 'Descuento'), ('iva_condition', 'Cond.IVA'), ('password', 'Contraseña'),
+            ('username', 'Usuario'),
+        ]
+        clients = queryset.order_by('pk').values_list(
+            'client_number', 'company_name', 'contact_name', 'client_type', 'province', 'address',
+            'phone', 'email', 'tax_id', 'discount_rate', 'iva_condition', 'username',
+        ).iterator(chunk_size=self.CHUNK_SIZE)
+        rows = (client[:11] + ('', client[11]) for client in clients)
+        return columns, rows
+
+    def rows(self, type_, queryset=None, progress=None):
+        """(columns, rows) de `type_`; `progress(n)` se llama cada CHUNK_SIZE filas leídas."""
+        method, _ = self.EXPORTS[type_]
+        columns, rows = getattr(self, method)(self.queryset(type_) if queryset is None else queryset)
+        return columns, (self._with_progress(rows, progress) if progress else rows)
+
+    def _with_progress(self, rows, progress):
+        for count, row in enumerate(rows, 1):
+            yield row
+            if count % self.CHUNK_SIZE == 0:
+                progress(count)
+
+    def filename(self, type_, format_='xlsx', compress=False):
+        name = f"{self.EXPORTS[type_][1]}.{format_}"
+        return f"{name}.gz" if compress and format_ != 'xlsx' else name
+
+    def content_type(self, format_, compress=False):
+        return 'application/gzip' if compress and format_ != 'xlsx' else self.CONTENT_TYPES[format_]
+
+    # Separador de varias categorías en una celda (xlsx/csv)
+    LIST_SEPARATOR = ' | '
+
+    @classmethod
+    def _cell_value(cls, value):
+        """Valor para una celda de xlsx/csv: listas unidas con LIST_SEPARATOR y dicts como JSON."""
+        if isinstance(value, list):
+            return cls.LIST_SEPARATOR.join(value)
+        if isinstance(value, dict):
+            return json.dumps(value, ensure_ascii=False) if value else None
+        return value
+
+    @classmethod
+    def _excel_value(cls, value):
+        # Excel no admite fechas con zona horaria
+        if isinstance(value, datetime) and value.tzinfo is not None:
+            return value.replace(tzinfo=None)
+        return cls._cell_value(value)
+
+    def write_xlsx(self, columns, rows, output):
+        """Escribe las filas en `output` (archivo binario) sin armar el libro en memoria."""
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet('Data')
+        ws.append([label for _, label in columns])
+        for row in rows:
+            ws.append([self._excel_value(v) for v in row])
+        wb.save(output)
+
+    def export_xlsx(self, type_, queryset=None):
+        return self.export_file(type_, 'xlsx', queryset)
+
+    def export_file(self, type_, format_='xlsx', queryset=None, compress=False, progress=None):
+        """
+        Genera la exportación en un archivo temporal (en memoria hasta
+        SPOOL_MAX_SIZE) y lo devuelve rebobinado, listo para un FileResponse o
+        para guardarlo en el storage.
+        """
+        output = tempfile.SpooledTemporaryFile(max_size=self.SPOOL_MAX_SIZE)
+        if format_ == 'xlsx':
+            columns, rows = self.rows(type_, queryset, progress)
+            self.write_xlsx(columns, rows, output)
+        else:
+            for chunk in self.stream(type_, format_, queryset, compress, progress):
+                output.write(chunk)
+        output.seek(0)
+        return output
+
+    def iter_csv(self, columns, rows):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow([label for _, label in columns])
+        for row in rows:
+            writer.writerow([v.isoformat() if isinstance(v, datetime) else self._cell_value(v) for v in row])
+            if buffer.tell() >= self.STREAM_BUFFER:
+                yield buffer.getvalue().encode()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue().encode()
+
+    def iter_ndjson(self, columns, rows):
+        keys = [key for key, _ in columns]
+        encoder = DjangoJSONEncoder(ensure_ascii=False)
+        lines, size = [], 0
+        for row in rows:
+            line = encoder.encode(dict(zip(keys, row)))
+            lines.append(line)
+            size += len(line)
+            if size >= self.STREAM_BUFFER:
+                yield ('\n'.join(lines) + '\n').encode()
+                lines, size = [], 0
+        if lines:
+            yield ('\n'.join(lines) + '\n').encode()
+
+    @staticmethod
+    def gzip_stream(chunks):
+        """Comprime un flujo de bytes a gzip bloque por bloque."""
+        compressor = zlib.compressobj(6, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+        for chunk in chunks:
+            data = compressor.compress(chunk)
+            if data:
+                yield data
+        yield compressor.flush()
+
+    def stream(self, type_, format_, queryset=None, compress=False, progress=None):
+        """Generador de bytes de una exportación csv/ndjson."""
+        columns, rows = self.rows(type_, queryset, progress)
+        chunks = self.iter_csv(columns, rows) if format_ == 'csv' else self.iter_ndjson(columns, rows)
+        return self.gzip_stream(chunks) if compress else chunks
+
     def export_products(self):
-        # Queryset to DataFrame
-        products = Product.objects.all().values(
-            'sku', 'name', 'base_price', 'stock', 'brand', 'category__name', 'is_active'
-        )
-        df = pd.DataFrame(list(products))
-        
-        # Rename columns for readability
-        df.rename(columns={
-            'base_price': 'Precio Base',
-            'category__name': 'Categoria',
-            'is_active': 'Activo'
-        }, inplace=True)
-
-        return self._to_excel(df)
+        return self.export_xlsx('products')
 
     def export_orders(self):
-        orders = Order.objects.all().select_related('client')
-        data = []
-        
-        for o in orders:
-            data.append({
-                'ID': o.id,
-                'Fecha': o.created_at.replace(tzinfo=None), # Remove TZ for Excel
-                'Cliente': o.client.username,
-                'Empresa': o.client.company_name,
-                'Total': o.total_amount,
-                'Estado': o.status
-            })
-            
-        df = pd.DataFrame(data)
-        return self._to_excel(df)
-
-    def _to_excel(self, df):
-        if df.empty:
-            return None
-            
-        output = BytesIO()
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            df.to_excel(writer, index=False, sheet_name='Data')
-        
-        return output.getvalue()
+        return self.export_xlsx('orders')
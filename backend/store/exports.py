@@ -0,0 +1,220 @@
+"""
+Exportaciones en segundo plano con archivos cacheados.
+
+El pedido (`request_export`) no genera nada en el request: busca un
+ExportArtifact con la misma clave (tipo, formato, gzip, filtros) y la misma
+versión de datos (DataVersion). Si existe se reutiliza tal cual, terminado o
+en curso; si no, se encola uno nuevo que genera el worker
+(`manage.py run_import_worker`) y guarda en el storage (MEDIA_ROOT o el
+storage configurado). La descarga se sirve directo desde el storage.
+
+La versión se lee antes de generar: si los datos cambian durante la
+generación, el archivo puede incluir cambios más nuevos que su versión, pero
+nunca queda etiquetado con una versión posterior a la de sus datos, así que
+el pedido siguiente lo regenera.
+
+`purge_export_artifacts` (en el loop del worker) borra los archivos
+reemplazados por una versión más nueva y los que no se usan hace
+EXPORT_ARTIFACT_TTL_DAYS días.
+"""
+import hashlib
+import json
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.http import QueryDict
+from django.utils import timezone
+
+from .exporter import DataExporter
+from .filters import (
+    CLIENT_FILTER_PARAMS, ORDER_FILTER_PARAMS, PRODUCT_FILTER_PARAMS,
+    filter_clients, filter_orders, filter_products,
+)
+from .jobs import STALE_AFTER, worker_name
+from .models import ExportArtifact
+
+logger = logging.getLogger(__name__)
+
+ARTIFACT_TTL = timedelta(days=getattr(settings, 'EXPORT_ARTIFACT_TTL_DAYS', 7))
+
+
+# Filtros de cada exportación: los mismos que los listados del admin (store/filters.py)
+EXPORT_FILTERS = {
+    'products': (filter_products, PRODUCT_FILTER_PARAMS),
+    'orders': (filter_orders, ORDER_FILTER_PARAMS),
+    'order-lines': (filter_orders, ORDER_FILTER_PARAMS),
+    'clients': (filter_clients, CLIENT_FILTER_PARAMS),
+}
+
+
+def export_params(type_, query_params):
+    """
+    Filtros de la exportación en un QueryDict, como dict serializable
+    {param: [valores]}. Solo quedan los parámetros que filtran ese tipo:
+    ?ordering=, ?page=, etc. no cambian los datos y no deben generar otro
+    artefacto.
+    """
+    allowed = EXPORT_FILTERS[type_][1]
+    return {
+        name: values for name, values in sorted(query_params.lists())
+        if name in allowed and any(values)
+    }
+
+
+def export_queryset(type_, params=None):
+    """
+    Queryset de la exportación filtrado con los mismos parámetros que el
+    listado del admin (ProductFilter y ?search= de productos; ?status=,
+    ?client=, ?client_id= y ?search= de pedidos; ?search= de clientes). Los
+    filtros corren en la base como subconsulta, así que una exportación
+    acotada lee solo las filas que exporta.
+
+    Filtros inválidos -> ValidationError de DRF (400 en las vistas).
+    """
+    queryset = DataExporter().queryset(type_)
+    if not params:
+        return queryset
+
+    query = QueryDict(mutable=True)
+    for name, values in params.items():
+        query.setlist(name, values)
+
+    filter_function = EXPORT_FILTERS[type_][0]
+    if type_ == 'order-lines':
+        matching = filter_function(DataExporter().queryset('orders'), query)
+        return queryset.filter(order__in=matching.order_by().values('pk'))
+    return queryset.filter(pk__in=filter_function(queryset, query).order_by().values('pk'))
+
+
+def export_key(type_, format_, compress=False, params=None):
+    payload = json.dumps([type_, format_, bool(compress), params or {}], sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def request_export(type_, format_='xlsx', compress=False, params=None, user=None):
+    """
+    Artefacto para la exportación pedida con los datos actuales: el existente
+    (terminado o en curso) o uno nuevo PENDING. Retorna (artifact, created).
+    """
+    exporter = DataExporter()
+    compress = bool(compress) and format_ != 'xlsx'
+    fields = {
+        'key': export_key(type_, format_, compress, params),
+        'data_version': exporter.data_version(type_),
+    }
+    reusable = ExportArtifact.objects.filter(**fields).exclude(status='FAILED')
+    artifact = reusable.first()
+    if artifact is None:
+        try:
+            with transaction.atomic():
+                return ExportArtifact.objects.create(
+                    **fields,
+                    export_type=type_,
+                    format=format_,
+                    compress=compress,
+                    params=params or {},
+                    file_name=exporter.filename(type_, format_, compress),
+                    created_by=user if user is not None and user.is_authenticated else None,
+                ), True
+        except IntegrityError:
+            # Otro request igual lo creó al mismo tiempo
+            artifact = reusable.get()
+    touch_artifact(artifact)
+    return artifact, False
+
+
+def touch_artifact(artifact):
+    """Marca el uso del archivo (la limpieza borra los que no se usan)."""
+    ExportArtifact.objects.filter(pk=artifact.pk).update(last_used_at=timezone.now())
+
+
+def _claimable():
+    stale = timezone.now() - STALE_AFTER
+    return Q(status='PENDING') | Q(status='RUNNING', heartbeat_at__lt=stale)
+
+
+def claim_next_export(worker=None):
+    """Toma el próximo artefacto pendiente (o interrumpido) con un UPDATE condicional."""
+    candidates = ExportArtifact.objects.filter(_claimable()).order_by('created_at').values_list('id', flat=True)[:10]
+    for pk in candidates:
+        claimed = ExportArtifact.objects.filter(_claimable(), pk=pk).update(
+            status='RUNNING', worker=worker or worker_name(), heartbeat_at=timezone.now()
+        )
+        if claimed:
+            return ExportArtifact.objects.get(pk=pk)
+    return None
+
+
+def run_export(artifact):
+    """Genera el archivo de un artefacto ya tomado por claim_next_export() y lo guarda en el storage."""
+    exporter = DataExporter()
+
+    def heartbeat(rows):
+        ExportArtifact.objects.filter(pk=artifact.pk).update(heartbeat_at=timezone.now())
+
+    try:
+        output = exporter.export_file(
+            artifact.export_type, artifact.format, export_queryset(artifact.export_type, artifact.params),
+            compress=artifact.compress, progress=heartbeat,
+        )
+        with output:
+            output.seek(0, 2)
+            artifact.size = output.tell()
+            output.seek(0)
+            artifact.file.save(artifact.file_name, File(output, name=artifact.file_name), save=False)
+        artifact.status = 'COMPLETED'
+        artifact.error = ''
+    except Exception as e:
+        logger.exception(f"Error en exportación #{artifact.pk}")
+        artifact.status = 'FAILED'
+        artifact.error = str(e)
+    artifact.finished_at = timezone.now()
+    artifact.save(update_fields=['file', 'size', 'status', 'error', 'finished_at'])
+    if artifact.status == 'COMPLETED':
+        purge_export_artifacts(key=artifact.key)
+    return artifact
+
+
+def run_next_export(worker=None):
+    """Toma y genera una exportación. Retorna el artefacto o None si no hay pendientes."""
+    artifact = claim_next_export(worker)
+    if artifact is None:
+        return None
+    try:
+        return run_export(artifact)
+    except (KeyboardInterrupt, SystemExit):
+        ExportArtifact.objects.filter(pk=artifact.pk, status='RUNNING').update(status='PENDING', worker='')
+        raise
+
+
+def purge_export_artifacts(key=None):
+    """
+    Borra (registro y archivo) los artefactos terminados reemplazados por uno
+    más nuevo de la misma clave y los que no se usan hace ARTIFACT_TTL.
+    `key` limita la limpieza a una exportación.
+    """
+    completed = ExportArtifact.objects.filter(status='COMPLETED')
+    finished = ExportArtifact.objects.filter(status__in=['COMPLETED', 'FAILED'])
+    if key is not None:
+        completed = completed.filter(key=key)
+        finished = finished.filter(key=key)
+
+    # El más reciente de cada clave se conserva (si se sigue usando)
+    latest = {}
+    for pk, artifact_key in completed.order_by('created_at', 'pk').values_list('pk', 'key'):
+        latest[artifact_key] = pk
+    stale = finished.filter(
+        Q(last_used_at__lt=timezone.now() - ARTIFACT_TTL) | Q(status='COMPLETED') & ~Q(pk__in=list(latest.values()))
+    )
+
+    removed = 0
+    for artifact in stale.iterator():
+        if artifact.file:
+            artifact.file.delete(save=False)
+        artifact.delete()
+        removed += 1
+    return removed
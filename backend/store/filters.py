@@ -1,5 +1,12 @@
 import django_filters
-from .models import Product
+from django.db.models import CharField, Q
+from django.db.models.lookups import IContains
+from rest_framework import filters
+from rest_framework.exceptions import ValidationError
+from .models import Product, CustomUser, Order, OrderItem
+
+# Parámetro de búsqueda de los listados (SearchFilter de DRF)
+SEARCH_PARAM = filters.SearchFilter.search_param
 
 class ProductFilter(django_filters.FilterSet):
     min_price = django_filters.NumberFilter(field_name="base_price", lookup_expr='gte')
@@ -53,3 +60,140 @@ class ProductFilter(django_filters.FilterSet):
                 queryset = queryset.filter(attributes__contains={key.strip(): val.strip()})
         return queryset
 
+
+@CharField.register_lookup
+class TrigramIContains(IContains):
+    """
+    icontains que en PostgreSQL se compila a `columna ILIKE '%term%'`. El
+    icontains de Django genera `UPPER(columna::text) LIKE UPPER(...)`, que no
+    puede usar un índice sobre la columna; ILIKE sí lo usa con los índices
+    trigram (gin_trgm_ops). En otras bases es el icontains de siempre.
+    """
+    lookup_name = 'trgm_icontains'
+
+    def as_sql(self, compiler, connection):
+        return IContains(self.lhs, self.rhs).as_sql(compiler, connection)
+
+    def as_postgresql(self, compiler, connection):
+        lhs_sql, lhs_params = self.process_lhs(compiler, connection)
+        rhs_sql, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs_sql} ILIKE {rhs_sql}', (*lhs_params, *rhs_params)
+
+
+def search_orders(queryset, term):
+    """
+    Búsqueda de pedidos para el admin: id de pedido, datos del cliente
+    (empresa, N° de cliente, email) o SKU contenido en el pedido.
+
+    Cada criterio se resuelve como subconsulta sobre su propia tabla, en
+    lugar de hacer JOIN + escaneo de usuarios e items por cada pedido. Los
+    textos se buscan con trgm_icontains (ILIKE), que en PostgreSQL usa los
+    índices trigram (pg_trgm) de CustomUser y Product.
+    """
+    term = (term or '').strip()
+    if not term:
+        return queryset
+
+    clients = CustomUser.objects.filter(
+        Q(company_name__trgm_icontains=term) |
+        Q(client_number__trgm_icontains=term) |
+        Q(email__trgm_icontains=term)
+    ).values('id')
+    orders_with_sku = OrderItem.objects.filter(
+        product__in=Product.objects.filter(sku__trgm_icontains=term).values('id')
+    ).values('order_id')
+
+    condition = Q(client_id__in=clients) | Q(id__in=orders_with_sku)
+
+    order_number = term.lstrip('#')
+    if order_number.isdigit():
+        condition |= Q(id=int(order_number))
+
+    return queryset.filter(condition)
+
+
+def _search(queryset, term, fields):
+    """
+    Búsqueda como la de SearchFilter de DRF: cada palabra del término tiene
+    que aparecer (icontains) en alguno de los campos.
+    """
+    for word in (term or '').replace(',', ' ').split():
+        condition = Q()
+        for field in fields:
+            condition |= Q(**{f'{field}__icontains': word})
+        queryset = queryset.filter(condition)
+    return queryset
+
+
+PRODUCT_SEARCH_FIELDS = ['name', 'sku', 'brand', 'supplier']
+CLIENT_SEARCH_FIELDS = ['username', 'email', 'company_name', 'tax_id', 'client_number', 'contact_name', 'phone']
+
+
+def search_products(queryset, term):
+    """Búsqueda de productos del admin: nombre, SKU, marca o proveedor."""
+    return _search(queryset, term, PRODUCT_SEARCH_FIELDS)
+
+
+def search_clients(queryset, term):
+    """Búsqueda de clientes del admin: usuario, email, empresa, CUIT, N° de cliente, contacto o teléfono."""
+    return _search(queryset, term, CLIENT_SEARCH_FIELDS)
+
+
+class OrderFilter(django_filters.FilterSet):
+    """Filtros del listado de pedidos del admin: ?status=, ?client= y ?client_id=."""
+    client_id = django_filters.NumberFilter(field_name='client_id')
+
+    class Meta:
+        model = Order
+        fields = ['status', 'client']
+
+
+def _apply_filterset(filterset_class, queryset, params):
+    filterset = filterset_class(params, queryset=queryset)
+    if not filterset.is_valid():
+        raise ValidationError(filterset.errors)
+    return filterset.qs
+
+
+def filter_products(queryset, params):
+    """ProductFilter + ?search= del listado de productos del admin (params: QueryDict)."""
+    queryset = _apply_filterset(ProductFilter, queryset, params)
+    return search_products(queryset, params.get(SEARCH_PARAM, ''))
+
+
+def filter_orders(queryset, params):
+    """OrderFilter + ?search= del listado de pedidos del admin (params: QueryDict)."""
+    queryset = _apply_filterset(OrderFilter, queryset, params)
+    return search_orders(queryset, params.get(SEARCH_PARAM, ''))
+
+
+def filter_clients(queryset, params):
+    """?search= del listado de clientes del admin (params: QueryDict)."""
+    return search_clients(queryset, params.get(SEARCH_PARAM, ''))
+
+
+# Parámetros que acepta cada función de filtrado; el resto no filtra
+PRODUCT_FILTER_PARAMS = frozenset(ProductFilter.base_filters) | {SEARCH_PARAM}
+ORDER_FILTER_PARAMS = frozenset(OrderFilter.base_filters) | {SEARCH_PARAM}
+CLIENT_FILTER_PARAMS = frozenset({SEARCH_PARAM})
+
+
+class OrderSearchFilter(filters.SearchFilter):
+    """SearchFilter de DRF (?search=) que delega en search_orders()."""
+
+    def filter_queryset(self, request, queryset, view):
+        return search_orders(queryset, request.query_params.get(self.search_param, ''))
+
+
+class ProductSearchFilter(filters.SearchFilter):
+    """SearchFilter de DRF (?search=) que delega en search_products()."""
+
+    def filter_queryset(self, request, queryset, view):
+        return search_products(queryset, request.query_params.get(self.search_param, ''))
+
+
+class ClientSearchFilter(filters.SearchFilter):
+    """SearchFilter de DRF (?search=) que delega en search_clients()."""
+
+    def filter_queryset(self, request, queryset, view):
+        return search_clients(queryset, request.query_params.get(self.search_param, ''))
@@ -1,8 +1,20 @@
 import pandas as pd
+import numpy as np
+import csv
+import hashlib
+import io
 import json
-import time
-from django.db import transaction
-from .models import CustomUser, Product, Category
+from decimal import Decimal
+from contextlib import nullcontext
+from itertools import groupby
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.text import slugify
+from .models import CustomUser, Product, Category, DataVersion, ImportStagingRow
+from .parallel import ordered_imap, parallel_map, process_pool
+from .readers import open_reader
 import logging
 
 logger = logging.getLogger(__name__)
@@ -10,557 +22,1516 @@ logger = logging.getLogger(__name__)
 class ClientImporter:
     """
     Importa clientes desde Excel optimizado para alto rendimiento (1800+ registros).
+
+    La planilla se lee en streaming por bloques; cada bloque se limpia y valida
+    por columnas (operaciones vectorizadas de pandas) y se escribe en lotes.
+    process() y process_streaming() comparten el mismo motor (_iter_events).
+
+    Las contraseñas se encriptan antes de cada escritura en un pool de
+    procesos (PBKDF2 es CPU-bound) y solo cuando cambian: si la contraseña
+    del Excel es igual a la vigente (plain_password) no se vuelve a encriptar.
+
+    Solo se escriben las filas con algún campo distinto al actual (comparación
+    normalizada campo a campo); el resto se informa como 'unchanged'.
+
+    Para jobs en segundo plano (ver jobs.py) acepta `checkpoint`, que se llama
+    dentro de la misma transacción que cada escritura, y `resume` (el último
+    checkpoint) para retomar después de la última fila confirmada.
     """
+    CHUNK_SIZE = 500
+    WRITE_BATCH = 500
+    # Con menos contraseñas que esto no vale la pena levantar procesos
+    PARALLEL_HASH_MIN = 100
+    HASH_PROGRESS_EVERY = 100
+    UPDATE_FIELDS = [
+        'client_number', 'company_name', 'contact_name', 'client_type',
+        'province', 'address', 'phone', 'email', 'tax_id',
+        'discount_rate', 'iva_condition'
+    ]
+    # Mapeo estricto por posición (13 columnas)
+    COLUMNS = [
+        'client_number', 'company_name', 'contact_name', 'client_type',
+        'province', 'address', 'phone', 'email', 'tax_id',
+        'discount', 'iva_condition', 'password', 'username'
+    ]
+    TEXT_COLUMNS = [c for c in COLUMNS if c != 'discount']
+    FIELD_LABELS = {
+        'client_number': 'N° cliente', 'company_name': 'nombre', 'contact_name': 'contacto',
+        'client_type': 'tipo', 'province': 'provincia', 'address': 'domicilio', 'phone': 'teléfono',
+        'email': 'email', 'tax_id': 'CUIT/DNI', 'discount_rate': 'descuento', 'iva_condition': 'cond. IVA',
+    }
+    # Valores de una fila validada (lo que se guarda en el staging del preview)
+    DATA_FIELDS = UPDATE_FIELDS + ['password']
+    # Columnas que se leen de los usuarios existentes para comparar y escribir
+    CURRENT_FIELDS = ['id', 'username', 'password', 'plain_password'] + UPDATE_FIELDS
 
     def __init__(self, file):
         self.file = file
 
-    def _clean_str(self, val):
-        if pd.isna(val):
-            return ""
-        s = str(val).strip()
-        if s.lower() == 'nan':
-            return ""
-        return s
+    def _flush(self, users_to_create, users_to_update, update_passwords):
+        """Escribe el lote acumulado y vacía las listas (la memoria no crece con el archivo)."""
+        if users_to_create:
+            CustomUser.objects.bulk_create(users_to_create, batch_size=self.WRITE_BATCH)
+        if users_to_update:
+            fields = list(self.UPDATE_FIELDS)
+            if update_passwords:
+                fields.extend(['password', 'plain_password'])
+            CustomUser.objects.bulk_update(users_to_update, fields, batch_size=self.WRITE_BATCH)
+        if users_to_create or users_to_update:
+            DataVersion.bump('clients')
+        users_to_create.clear()
+        users_to_update.clear()
 
-    def _clean_float(self, val):
-        if pd.isna(val):
-            return 0.0
-        try:
-            return float(val)
-        except:
-            return 0.0
+    @staticmethod
+    def _normalize(field, value):
+        """Valor comparable: el descuento llega como float del Excel y está guardado como Decimal(5, 2)."""
+        if field == 'discount_rate':
+            return str(Decimal(str(value or 0)).quantize(Decimal('0.01')))
+        return '' if value is None else str(value)
 
-    def process_streaming(self, dry_run=True, update_passwords=False):
+    @classmethod
+    def load_current(cls, queryset):
         """
-        Generador que emite eventos de progreso JSON por línea.
-        Eventos:
+        Valores actuales de los usuarios del bloque como dicts (solo las
+        columnas que se comparan y escriben), indexados por username.
+        """
+        return {row['username']: row for row in queryset.values(*cls.CURRENT_FIELDS)}
+
+    @classmethod
+    def changed_fields(cls, current, data):
+        """Campos cuyo valor del Excel difiere del actual (solo esas filas se escriben)."""
+        return [f for f in cls.UPDATE_FIELDS if cls._normalize(f, current[f]) != cls._normalize(f, data[f])]
+
+    @classmethod
+    def fingerprint(cls, current):
+        """Hash de los campos que escribe el importador (detecta cambios entre preview y confirm)."""
+        fields = cls.UPDATE_FIELDS + ['plain_password']
+        values = [cls._normalize(f, current[f]) for f in fields]
+        return hashlib.sha1(json.dumps(values).encode()).hexdigest()
+
+    @staticmethod
+    def has_new_password(current, password):
+        return bool(password) and (password != current['plain_password'] or not current['password'])
+
+    def _staged_row(self, staging, row_number, username, action, data, current=None):
+        return ImportStagingRow(
+            staging=staging,
+            row_number=row_number,
+            key=username,
+            action=action,
+            target_id=current['id'] if current else None,
+            target_fingerprint=self.fingerprint(current) if current else '',
+            data={**data, 'discount_rate': float(data['discount_rate'])},
+        )
+
+    def _update_user(self, current, data, update_passwords, dry_run, stats, pending_passwords):
+        """
+        Compara una fila validada con los valores actuales del usuario.
+        Retorna (user, changed, password_changed); `user` es None si no hay
+        nada que escribir. La instancia se arma solo para las filas que se
+        escriben (bulk_update usa el pk y los campos listados).
+        """
+        changed = self.changed_fields(current, data)
+
+        # Password: Solo si se pide explícitamente, viene dato y cambió
+        password = data['password']
+        password_changed = False
+        if update_passwords and password:
+            if not self.has_new_password(current, password):
+                stats['passwords_unchanged'] += 1
+            else:
+                stats['passwords_changed'] += 1
+                password_changed = True
+
+        if not changed and not password_changed:
+            return None, changed, False
+
+        user = CustomUser(
+            id=current['id'],
+            username=current['username'],
+            password=current['password'],
+            plain_password=password if password_changed else current['plain_password'],
+            **{field: data[field] for field in self.UPDATE_FIELDS}
+        )
+        if password_changed and not dry_run:
+            pending_passwords.append((user, password))
+        return user, changed, password_changed
+
+    def _update_message(self, changed, password_changed, company_name):
+        labels = [self.FIELD_LABELS[f] for f in changed] + (['contraseña'] if password_changed else [])
+        return f"Actualizar {', '.join(labels)} de {company_name}"
+
+    def _new_user(self, username, data, dry_run, stats, pending_passwords):
+        """Arma un cliente nuevo a partir de una fila validada (la contraseña se encripta al guardar)."""
+        new_user = CustomUser(
+            username=username,
+            role='CLIENT',
+            is_active=True,
+            plain_password=data['password'],
+            **{field: data[field] for field in self.UPDATE_FIELDS}
+        )
+        stats['passwords_changed'] += 1
+        if not dry_run:
+            pending_passwords.append((new_user, data['password']))
+        return new_user
+
+    def _save(self, users_to_create, users_to_update, update_passwords, checkpoint, state):
+        """Escribe el lote y registra el checkpoint en la misma transacción."""
+        with transaction.atomic():
+            self._flush(users_to_create, users_to_update, update_passwords)
+            if checkpoint:
+                checkpoint(state)
+
+    def _hash_passwords(self, pending, pool, progress):
+        """
+        Encripta las contraseñas pendientes [(user, password)] (en paralelo si
+        hay pool) y emite eventos de progreso de la etapa 'hashing'.
+        """
+        progress['total'] += len(pending)
+        raw_passwords = [raw for _, raw in pending]
+        for i, hashed in enumerate(parallel_map(make_password, raw_passwords, pool)):
+            pending[i][0].password = hashed
+            progress['current'] += 1
+            if (i + 1) % self.HASH_PROGRESS_EVERY == 0 or i + 1 == len(pending):
+                yield {'type': 'progress', 'stage': 'hashing', 'current': progress['current'], 'total': progress['total']}
+        pending.clear()
+
+    @classmethod
+    def clean_frame(cls, chunk, seen_usernames):
+        """
+        Limpia y valida un bloque de filas por columnas.
+
+        `chunk` es una lista de (row_number, values) del lector y
+        `seen_usernames` los usuarios ya aceptados en bloques anteriores
+        (se actualiza in-place para detectar duplicados entre bloques).
+
+        Retorna (valid, errors):
+          - valid: DataFrame con las columnas limpias + 'discount_rate',
+            indexado por número de fila del Excel.
+          - errors: DataFrame con 'row' y 'message'.
+        """
+        rows = [row_number for row_number, _ in chunk]
+        df = pd.DataFrame(
+            [values[:len(cls.COLUMNS)] for _, values in chunk],
+            columns=cls.COLUMNS, index=rows, dtype=object
+        )
+
+        # Texto: NaN/None -> '', strip, y el literal 'nan' -> ''
+        for col in cls.TEXT_COLUMNS:
+            s = df[col].astype('string').str.strip().fillna('')
+            df[col] = s.mask(s.str.lower() == 'nan', '').astype(object)
+
+        # Descuento: numérico (inválido -> 0) y normalizado a fracción (10 -> 0.10)
+        discount = pd.to_numeric(df['discount'].astype('string').str.strip(), errors='coerce').fillna(0.0).astype(float)
+        df['discount_rate'] = np.where(discount > 1, discount / 100.0, discount)
+
+        no_username = df['username'] == ''
+        no_company = ~no_username & (df['company_name'] == '')
+        candidates = ~no_username & ~no_company
+        duplicated = candidates & (
+            df['username'].where(candidates).duplicated(keep='first') | df['username'].isin(seen_usernames)
+        )
+
+        errors = pd.concat([
+            pd.DataFrame({'row': df.index[no_username], 'message': "Ignorada - Falta el 'Usuario' en columna 13."}),
+            pd.DataFrame({'row': df.index[no_company], 'message': "Ignorada - Falta el 'Nombre' en columna 2."}),
+            pd.DataFrame({
+                'row': df.index[duplicated],
+                'message': [f"Ignorada - Usuario '{u}' duplicado en el archivo." for u in df.loc[duplicated, 'username']],
+            }),
+        ], ignore_index=True)
+
+        valid = df[candidates & ~duplicated]
+        seen_usernames.update(valid['username'])
+        return valid, errors
+
+    def _iter_events(self, dry_run=True, update_passwords=False, resume=None, checkpoint=None, staging=None):
+        """
+        Motor del importador. Con `staging` (solo dry_run) además guarda cada
+        fila validada en el ImportStaging para confirmarla luego sin re-parsear.
+        Genera eventos (dicts):
+        - {"type": "start", "total": N}
         - {"type": "progress", "current": 10, "total": 100}
-        - {"type": "result", "success": true, ...}
+        - {"type": "progress", "stage": "hashing", "current": 50, "total": 80}
+        - {"type": "result", "data": {...}}  o  {"type": "error", "message": "..."}
         """
-        try:
-            df = pd.read_excel(self.file, dtype=str)
-            
-            if len(df.columns) < 13:
-                 error_msg = f"El archivo tiene pocas columnas ({len(df.columns)}). Se requieren 13 columnas en el orden específico."
-                 yield json.dumps({'type': 'error', 'message': error_msg}) + "\n"
-                 return
+        # Leer el archivo (xlsx, csv o parquet) en streaming. Asumimos fila 1 = headers.
+        # Los números enteros llegan como int (ej: CUIT sin notación científica ni ".0")
+        reader = open_reader(self.file, chunk_size=self.CHUNK_SIZE)
 
-            total_rows = len(df)
-            
-            stats = {
-                'total_rows': 0,
-                'to_create': 0,
-                'to_update': 0,
-                'errors': 0,
-                'skipped': 0
+        # Validar número de columnas
+        # El usuario especificó 13 columnas exactas en orden.
+        if len(reader.header) < 13:
+            reader.close()
+            yield {'type': 'error', 'message': f"El archivo tiene pocas columnas ({len(reader.header)}). Se requieren 13 columnas en el orden específico."}
+            return
+
+        total_rows = reader.estimated_rows
+        stats = {
+            'total_rows': 0,
+            'to_create': 0,
+            'to_update': 0,
+            'unchanged': 0,
+            'password_only': 0,
+            'errors': 0,
+            'skipped': 0,
+            'passwords_changed': 0,
+            'passwords_unchanged': 0,
+        }
+        preview_log = []
+        errors_log = []
+        # Retomar: las filas hasta resume_row ya están guardadas junto con sus stats
+        resume_row = 0
+        if resume:
+            resume_row = resume['last_row']
+            stats.update(resume['stats'])
+            preview_log = list(resume['preview'])
+            errors_log = list(resume['errors'])
+
+        def state(last_row):
+            return {
+                'last_row': last_row, 'processed': stats['total_rows'], 'total': max(total_rows, stats['total_rows']),
+                'stats': stats, 'preview': preview_log, 'errors': errors_log,
             }
-            
-            preview_log = [] 
-            errors_log = []
-            users_to_create = []
-            users_to_update = []
-            existing_users = {u.username: u for u in CustomUser.objects.all()}
-            processed_usernames = set()
-
-            # Emit initial info
-            yield json.dumps({'type': 'start', 'total': total_rows}) + "\n"
-
-            for index, row in df.iterrows():
-                # Emit progress every 10 rows or on last row
-                if index % 10 == 0 or index == total_rows - 1:
-                    yield json.dumps({'type': 'progress', 'current': index + 1, 'total': total_rows}) + "\n"
-
-                row_idx = index + 2
-                stats['total_rows'] += 1
-
-                try:
-                    raw_client_num = self._clean_str(row.iloc[0])
-                    company_name   = self._clean_str(row.iloc[1])
-                    contact_name   = self._clean_str(row.iloc[2])
-                    client_type    = self._clean_str(row.iloc[3])
-                    province       = self._clean_str(row.iloc[4])
-                    address        = self._clean_str(row.iloc[5])
-                    phone          = self._clean_str(row.iloc[6])
-                    email          = self._clean_str(row.iloc[7])
-                    tax_id         = self._clean_str(row.iloc[8])
-                    discount_raw   = self._clean_float(row.iloc[9])
-                    iva_condition  = self._clean_str(row.iloc[10])
-                    raw_password   = self._clean_str(row.iloc[11])
-                    username       = self._clean_str(row.iloc[12])
-
-                    if not username:
-                        errors_log.append(f"Fila {row_idx}: Ignorada - Falta el 'Usuario'.")
-                        stats['errors'] += 1
-                        continue
-                    
-                    if not company_name:
-                        errors_log.append(f"Fila {row_idx}: Ignorada - Falta el 'Nombre'.")
-                        stats['errors'] += 1
-                        continue
+        users_to_create = []
+        users_to_update = []
+        # Contraseñas a encriptar antes del próximo guardado: [(user, password)]
+        pending_passwords = []
+        hash_progress = {'current': 0, 'total': 0}
 
-                    if username in processed_usernames:
-                        stats['errors'] += 1
+        # Cache para evitar duplicados dentro del mismo archivo excel
+        processed_usernames = set()
+
+        yield {'type': 'start', 'total': total_rows}
+
+        # El pool solo se usa al guardar (en dry_run no se encripta nada).
+        # Si la hoja no declara su dimensión (total_rows = 0) se asume grande.
+        hash_count = 0 if dry_run else (total_rows or None)
+        with process_pool(hash_count, min_items=self.PARALLEL_HASH_MIN) as pool:
+            for chunk in reader.iter_chunks():
+                if chunk[0][0] <= resume_row:
+                    # Filas ya confirmadas: solo registrar usuarios para detectar duplicados
+                    done = [item for item in chunk if item[0] <= resume_row]
+                    self.clean_frame(done, processed_usernames)
+                    chunk = chunk[len(done):]
+                    if not chunk:
                         continue
-                    
-                    processed_usernames.add(username)
-                    discount_rate = discount_raw / 100.0 if discount_raw > 1 else discount_raw
-
-                    if username in existing_users:
-                        user = existing_users[username]
-                        user.client_number = raw_client_num
-                        user.company_name = company_name
-                        user.contact_name = contact_name
-                        user.client_type = client_type
-                        user.province = province
-                        user.address = address
-                        user.phone = phone
-                        user.email = email
-                        user.tax_id = tax_id
-                        user.discount_rate = discount_rate
-                        user.iva_condition = iva_condition
-                        
-                        if update_passwords and raw_password:
-                            if not dry_run:
-                                user.set_password(raw_password)
-                            user.plain_password = raw_password
-                        
+
+                valid, errors = self.clean_frame(chunk, processed_usernames)
+                stats['total_rows'] += len(chunk)
+                # Solo los usuarios de este bloque (la memoria no crece con la tabla)
+                existing_users = self.load_current(CustomUser.objects.filter(username__in=list(valid['username'])))
+
+                # Nuevos usuarios sin contraseña (vectorizado sobre el bloque)
+                is_existing = valid['username'].isin(existing_users.keys())
+                no_password = ~is_existing & (valid['password'] == '')
+                errors = pd.concat([errors, pd.DataFrame({
+                    'row': valid.index[no_password],
+                    'message': [f"Ignorada - Nuevo usuario '{u}' no tiene contraseña." for u in valid.loc[no_password, 'username']],
+                })], ignore_index=True)
+                valid = valid[~no_password]
+
+                stats['errors'] += len(errors)
+                errors_log.extend(f"Fila {r.row}: {r.message}" for r in errors.sort_values('row').itertuples())
+
+                staged_rows = []
+                for row in valid.itertuples():
+                    data = {field: getattr(row, field) for field in self.DATA_FIELDS}
+                    current = existing_users.get(row.username)
+                    if current is not None:
+                        # === UPDATE (solo si algún campo cambió) ===
+                        user, changed, password_changed = self._update_user(
+                            current, data, update_passwords, dry_run, stats, pending_passwords
+                        )
+                        new_password = self.has_new_password(current, data['password'])
+                        if staging is not None and (changed or new_password):
+                            # Las filas con solo contraseña nueva se guardan: update_passwords se elige al confirmar
+                            staged_rows.append(self._staged_row(staging, row.Index, row.username, 'UPDATE', data, current))
+                        if user is None:
+                            stats['unchanged'] += 1
+                            if new_password:
+                                stats['password_only'] += 1
+                            continue
                         users_to_update.append(user)
                         stats['to_update'] += 1
-                        
-                        if len(preview_log) < 20: 
-                             preview_log.append({'type': 'UPDATE', 'user': username, 'msg': f"Actualizar datos de {company_name}"})
+                        if len(preview_log) < 20:
+                            preview_log.append({'type': 'UPDATE', 'user': row.username, 'msg': self._update_message(changed, password_changed, row.company_name)})
 
                     else:
-                        if not raw_password:
-                            errors_log.append(f"Fila {row_idx}: Ignorada - Nuevo usuario sin contraseña.")
-                            stats['errors'] += 1
-                            continue
-                            
-                        new_user = CustomUser(
-                            username=username,
-                            company_name=company_name,
-                            contact_name=contact_name,
-                            client_type=client_type,
-                            province=province,
-                            address=address,
-                            phone=phone,
-                            email=email,
-                            tax_id=tax_id,
-                            discount_rate=discount_rate,
-                            iva_condition=iva_condition,
-                            client_number=raw_client_num,
-                            role='CLIENT',
-                            is_active=True,
-                            plain_password=raw_password
-                        )
-                        if not dry_run:
-                            new_user.set_password(raw_password)
-                        users_to_create.append(new_user)
+                        # === CREATE ===
+                        if staging is not None:
+                            staged_rows.append(self._staged_row(staging, row.Index, row.username, 'CREATE', data))
+                        users_to_create.append(self._new_user(row.username, data, dry_run, stats, pending_passwords))
                         stats['to_create'] += 1
                         if len(preview_log) < 20:
-                             preview_log.append({'type': 'CREATE', 'user': username, 'msg': f"Crear nuevo cliente {company_name}"})
+                            preview_log.append({'type': 'CREATE', 'user': row.username, 'msg': f"Crear nuevo cliente {row.company_name}"})
 
-                except Exception as row_e:
-                    errors_log.append(f"Fila {row_idx}: Error {str(row_e)}")
-                    stats['errors'] += 1
+                if staged_rows:
+                    ImportStagingRow.objects.bulk_create(staged_rows, batch_size=self.WRITE_BATCH)
+                if dry_run:
+                    # En el preview los objetos no se guardan: no acumularlos en memoria
+                    users_to_create.clear()
+                    users_to_update.clear()
+
+                if not dry_run and len(users_to_create) + len(users_to_update) >= self.WRITE_BATCH:
+                    yield from self._hash_passwords(pending_passwords, pool, hash_progress)
+                    self._save(users_to_create, users_to_update, update_passwords, checkpoint, state(chunk[-1][0]))
+
+                yield {'type': 'progress', 'current': stats['total_rows'], 'total': max(total_rows, stats['total_rows'])}
 
-            # --- SAVING (Atomic) ---
+            # --- SAVING (último lote) ---
             if not dry_run:
-                yield json.dumps({'type': 'progress', 'current': total_rows, 'total': total_rows, 'message': 'Guardando en base de datos...'}) + "\n"
-                
-                if users_to_create:
-                    CustomUser.objects.bulk_create(users_to_create, batch_size=500)
-                
-                if users_to_update:
-                    fields = [
-                        'client_number', 'company_name', 'contact_name', 'client_type',
-                        'province', 'address', 'phone', 'email', 'tax_id', 
-                        'discount_rate', 'iva_condition'
-                    ]
-                    if update_passwords:
-                        fields.extend(['password', 'plain_password'])
-                        
-                    CustomUser.objects.bulk_update(users_to_update, fields, batch_size=500)
-
-            result = {
-                'success': True,
-                'stats': stats,
-                'preview': preview_log,
-                'errors': errors_log
-            }
-            yield json.dumps({'type': 'result', 'data': result}) + "\n"
+                yield from self._hash_passwords(pending_passwords, pool, hash_progress)
+                yield {'type': 'progress', 'current': stats['total_rows'], 'total': stats['total_rows'], 'message': 'Guardando en base de datos...'}
+                self._save(users_to_create, users_to_update, update_passwords, checkpoint, state(reader.last_row))
+
+        result = {
+            'success': True,
+            'stats': stats,
+            'preview': preview_log,
+            'errors': errors_log
+        }
+        if staging is not None:
+            staging.result = result
+            staging.status = 'STAGED'
+            staging.save(update_fields=['result', 'status'])
+            result = {**result, 'content_hash': staging.content_hash, 'expires_at': staging.expires_at.isoformat()}
+        yield {'type': 'result', 'data': result}
+
+    def apply_staged(self, staging, update_passwords=False, resume=None, checkpoint=None):
+        """
+        Aplica las filas de un ImportStaging (confirm del preview) sin volver a
+        leer el archivo. Las filas se buscan por id; si la fila destino cambió
+        desde el preview (huella distinta, eliminada, o un usuario nuevo que ya
+        existe) se informa como conflicto y no se aplica.
+        Genera los mismos eventos que _iter_events.
+        """
+        previewed = staging.result
+        stats = {
+            'total_rows': previewed['stats']['total_rows'],
+            'to_create': 0,
+            'to_update': 0,
+            # Las filas sin cambios no se guardaron en el staging (salvo las de solo contraseña)
+            'unchanged': previewed['stats']['unchanged'] - previewed['stats']['password_only'],
+            'errors': previewed['stats']['errors'],
+            'skipped': 0,
+            'conflicts': 0,
+            'passwords_changed': 0,
+            'passwords_unchanged': 0,
+        }
+        preview_log = []
+        errors_log = list(previewed['errors'])
+        last_id = processed = 0
+        if resume:
+            last_id, processed = resume['last_row'], resume['processed']
+            stats.update(resume['stats'])
+            preview_log = list(resume['preview'])
+            errors_log = list(resume['errors'])
+
+        total = staging.rows.count()
+        pending_passwords = []
+        hash_progress = {'current': 0, 'total': 0}
+        yield {'type': 'start', 'total': total}
+
+        rows = staging.rows.filter(id__gt=last_id).order_by('id')
+        with process_pool(total - processed, min_items=self.PARALLEL_HASH_MIN) as pool:
+            batch = []
+            for staged in rows.iterator(chunk_size=self.WRITE_BATCH):
+                batch.append(staged)
+                if len(batch) < self.WRITE_BATCH:
+                    continue
+                yield from self._apply_staged_batch(batch, update_passwords, stats, preview_log, errors_log,
+                                                     pending_passwords, pool, hash_progress, checkpoint, processed)
+                processed += len(batch)
+                batch = []
+                yield {'type': 'progress', 'current': processed, 'total': total}
+            if batch:
+                yield from self._apply_staged_batch(batch, update_passwords, stats, preview_log, errors_log,
+                                                     pending_passwords, pool, hash_progress, checkpoint, processed)
+                processed += len(batch)
+                yield {'type': 'progress', 'current': processed, 'total': total}
+
+        yield {'type': 'result', 'data': {
+            'success': True,
+            'stats': stats,
+            'preview': preview_log,
+            'errors': errors_log
+        }}
+
+    def _apply_staged_batch(self, batch, update_passwords, stats, preview_log, errors_log,
+                            pending_passwords, pool, hash_progress, checkpoint, processed):
+        targets = {
+            row['id']: row
+            for row in self.load_current(CustomUser.objects.filter(id__in=[r.target_id for r in batch if r.action == 'UPDATE'])).values()
+        }
+        taken = set(CustomUser.objects.filter(
+            username__in=[r.key for r in batch if r.action == 'CREATE']
+        ).values_list('username', flat=True))
+
+        users_to_create = []
+        users_to_update = []
+        for staged in batch:
+            if staged.action == 'UPDATE':
+                current = targets.get(staged.target_id)
+                if current is None or self.fingerprint(current) != staged.target_fingerprint:
+                    stats['conflicts'] += 1
+                    errors_log.append(f"Fila {staged.row_number}: Conflicto - El cliente '{staged.key}' fue modificado o eliminado después de la previsualización. No se aplicó.")
+                    continue
+                user, changed, password_changed = self._update_user(
+                    current, staged.data, update_passwords, False, stats, pending_passwords
+                )
+                if user is None:
+                    stats['unchanged'] += 1
+                    continue
+                users_to_update.append(user)
+                stats['to_update'] += 1
+                if len(preview_log) < 20:
+                    preview_log.append({'type': 'UPDATE', 'user': staged.key, 'msg': self._update_message(changed, password_changed, staged.data['company_name'])})
+            else:
+                if staged.key in taken:
+                    stats['conflicts'] += 1
+                    errors_log.append(f"Fila {staged.row_number}: Conflicto - El usuario '{staged.key}' fue creado después de la previsualización. No se aplicó.")
+                    continue
+                users_to_create.append(self._new_user(staged.key, staged.data, False, stats, pending_passwords))
+                stats['to_create'] += 1
+                if len(preview_log) < 20:
+                    preview_log.append({'type': 'CREATE', 'user': staged.key, 'msg': f"Crear nuevo cliente {staged.data['company_name']}"})
 
+        yield from self._hash_passwords(pending_passwords, pool, hash_progress)
+        state = {
+            'last_row': batch[-1].id, 'processed': processed + len(batch), 'total': processed + len(batch),
+            'stats': stats, 'preview': preview_log, 'errors': errors_log,
+        }
+        self._save(users_to_create, users_to_update, update_passwords, checkpoint, state)
+
+    def process_streaming(self, dry_run=True, update_passwords=False, staging=None):
+        """
+        Generador que emite eventos de progreso JSON por línea.
+        Eventos:
+        - {"type": "progress", "current": 10, "total": 100}
+        - {"type": "result", "success": true, ...}
+        """
+        try:
+            for event in self._iter_events(dry_run=dry_run, update_passwords=update_passwords, staging=staging):
+                yield json.dumps(event) + "\n"
         except Exception as e:
             logger.error(f"Error crítico importador: {e}")
             yield json.dumps({'type': 'error', 'message': str(e)}) + "\n"
 
     def process(self, dry_run=True, update_passwords=False):
         try:
-            # Leer excel con pandas. Asumimos fila 1 = headers.
-            # dtype=str fuerza a leer todo como texto para evitar problemas (ej: CUIT como notación científica)
-            df = pd.read_excel(self.file, dtype=str)
-            
-            # Validar número de columnas
-            # El usuario especificó 13 columnas exactas en orden.
-            if len(df.columns) < 13:
-                 return {
-                     'success': False, 
-                     'error': f"El archivo tiene pocas columnas ({len(df.columns)}). Se requieren 13 columnas en el orden específico."
-                 }
-
-            stats = {
-                'total_rows': 0,
-                'to_create': 0,
-                'to_update': 0,
-                'errors': 0,
-                'skipped': 0
-            }
-            
-            preview_log = [] 
-            errors_log = []
-            
-            users_to_create = []
-            users_to_update = []
-            
-            # Pre-cargar usuarios existentes para optimización (O(1) lookup)
-            existing_users = {u.username: u for u in CustomUser.objects.all()}
-            # Cache para evitar duplicados dentro del mismo archivo excel
-            processed_usernames = set()
-
-            for index, row in df.iterrows():
-                row_idx = index + 2  # Excel row number (1-index + header)
-                stats['total_rows'] += 1
-
-                try:
-                    # Mapeo estricto por posición
-                    raw_client_num = self._clean_str(row.iloc[0])
-                    company_name   = self._clean_str(row.iloc[1])
-                    contact_name   = self._clean_str(row.iloc[2])
-                    client_type    = self._clean_str(row.iloc[3])
-                    province       = self._clean_str(row.iloc[4])
-                    address        = self._clean_str(row.iloc[5])
-                    phone          = self._clean_str(row.iloc[6])
-                    email          = self._clean_str(row.iloc[7])
-                    tax_id         = self._clean_str(row.iloc[8])
-                    discount_raw   = self._clean_float(row.iloc[9])
-                    iva_condition  = self._clean_str(row.iloc[10])
-                    raw_password   = self._clean_str(row.iloc[11])
-                    username       = self._clean_str(row.iloc[12])
-
-                    # --- VALIDACIONES BÁSICAS ---
-                    if not username:
-                        errors_log.append(f"Fila {row_idx}: Ignorada - Falta el 'Usuario' en columna 13.")
-                        stats['errors'] += 1
-                        continue
-                    
-                    if not company_name:
-                        errors_log.append(f"Fila {row_idx}: Ignorada - Falta el 'Nombre' en columna 2.")
-                        stats['errors'] += 1
-                        continue
+            for event in self._iter_events(dry_run=dry_run, update_passwords=update_passwords):
+                if event['type'] == 'result':
+                    return event['data']
+                if event['type'] == 'error':
+                    return {'success': False, 'error': event['message']}
+        except Exception as e:
+            logger.error(f"Error crítico importador: {e}")
+            return {'success': False, 'error': str(e)}
 
-                    if username in processed_usernames:
-                        errors_log.append(f"Fila {row_idx}: Ignorada - Usuario '{username}' duplicado en el archivo.")
-                        stats['errors'] += 1
-                        continue
-                    
-                    processed_usernames.add(username)
-
-                    # Normalizar descuento
-                    discount_rate = discount_raw / 100.0 if discount_raw > 1 else discount_raw
-
-                    # --- LÓGICA UPDATE vs CREATE ---
-                    if username in existing_users:
-                        # === UPDATE ===
-                        user = existing_users[username]
-                        
-                        # Actualizamos campos
-                        user.client_number = raw_client_num
-                        user.company_name = company_name
-                        user.contact_name = contact_name
-                        user.client_type = client_type
-                        user.province = province
-                        user.address = address
-                        user.phone = phone
-                        user.email = email
-                        user.tax_id = tax_id
-                        user.discount_rate = discount_rate
-                        user.iva_condition = iva_condition
-                        
-                        # Password: Solo si se pide explícitamente y viene dato
-                        if update_passwords and raw_password:
-                            user.set_password(raw_password)
-                            user.plain_password = raw_password
-                        
-                        users_to_update.append(user)
-                        stats['to_update'] += 1
-                        
-                        if len(preview_log) < 20: 
-                             preview_log.append({'type': 'UPDATE', 'user': username, 'msg': f"Actualizar datos de {company_name}"})
 
-                    else:
-                        # === CREATE ===
-                        if not raw_password:
-                            errors_log.append(f"Fila {row_idx}: Ignorada - Nuevo usuario '{username}' no tiene contraseña.")
-                            stats['errors'] += 1
-                            continue
-                            
-                        new_user = CustomUser(
-                            username=username,
-                            company_name=company_name,
-                            contact_name=contact_name,
-                            client_type=client_type,
-                            province=province,
-                            address=address,
-                            phone=phone,
-                            email=email,
-                            tax_id=tax_id,
-                            discount_rate=discount_rate,
-                            iva_condition=iva_condition,
-                            client_number=raw_client_num,
-                            role='CLIENT',
-                            is_active=True,
-                            plain_password=raw_password
-                        )
-                        new_user.set_password(raw_password)
-                        users_to_create.append(new_user)
-                        
-                        # Lo agregamos al diccionario para que si aparece de nuevo (caso raro) se updatee?
-                        # Mejor no, ya validamos duplicados en archivo.
-                        
-                        stats['to_create'] += 1
-                        if len(preview_log) < 20:
-                             preview_log.append({'type': 'CREATE', 'user': username, 'msg': f"Crear nuevo cliente {company_name}"})
+def normalize_columns(header, column_mapping):
+    """Normaliza encabezados (lowercase y strip) y los traduce con `column_mapping`."""
+    columns = [str(c).strip().lower() for c in header]
+    return [column_mapping.get(c, c) for c in columns]
 
-                except Exception as row_e:
-                    errors_log.append(f"Fila {row_idx}: Error procesando datos - {str(row_e)}")
-                    stats['errors'] += 1
 
-            # --- EJECUCIÓN EN DB (Solo si no es dry_run) ---
-            if not dry_run:
-                # Bulk Create
-                if users_to_create:
-                    CustomUser.objects.bulk_create(users_to_create, batch_size=500)
-                
-                # Bulk Update
-                if users_to_update:
-                    fields = [
-                        'client_number', 'company_name', 'contact_name', 'client_type',
-                        'province', 'address', 'phone', 'email', 'tax_id', 
-                        'discount_rate', 'iva_condition'
-                    ]
-                    if update_passwords:
-                        fields.extend(['password', 'plain_password'])
-                        
-                    CustomUser.objects.bulk_update(users_to_update, fields, batch_size=500)
+class CategoryImporter:
+    """
+    Importa un árbol de categorías.
 
-            return {
-                'success': True,
-                'stats': stats,
-                'preview': preview_log,
-                'errors': errors_log
-            }
+    Formatos aceptados (encabezados en español o inglés):
+      - Ruta: columna 'ruta'/'path' (o un nombre con '>') con la ruta completa,
+        ej: "Herramientas > Manuales > Martillos".
+      - Nombre + padre: 'nombre' y 'padre'/'parent'. El padre puede ser una
+        ruta ("Herramientas > Manuales") o un nombre, que se busca primero
+        entre las filas del archivo y después entre las categorías existentes.
+      - Solo nombre (formato anterior): actualiza la categoría con ese nombre
+        si existe una sola; si no, crea una categoría raíz.
 
-        except Exception as e:
-            logger.error(f"Error crítico importador: {e}")
-            return {'success': False, 'error': str(e)}
+    La ruta identifica a la categoría (no se mueven categorías existentes) y
+    los ancestros que falten se crean. El archivo completo se arma en memoria
+    como árbol, se valida (ciclos, padres ambiguos, slugs repetidos) y se
+    escribe en una sola transacción: un bulk_create por nivel del árbol y un
+    bulk_update para las existentes que cambian.
+    """
+    PATH_SEPARATOR = '>'
+
+    COLUMN_MAPPING = {
+        'nombre': 'name',
+        'categoria': 'name', # In case user puts 'Categoria' as header
+        'categoría': 'name',
+        'slug': 'slug',
+        'orden': 'sort_order',
+        'order': 'sort_order',
+        'ruta': 'path',
+        'padre': 'parent',
+        'categoria padre': 'parent',
+        'categoría padre': 'parent',
+    }
 
-class CategoryImporter:
     def __init__(self, file):
         self.file = file
 
-    def process(self, dry_run=True):
-        sid = transaction.savepoint()
+    @classmethod
+    def split_path(cls, value):
+        """'A > B > C' -> ['A', 'B', 'C'] (sin segmentos vacíos)."""
+        return [part.strip() for part in str(value).split(cls.PATH_SEPARATOR) if part.strip()]
+
+    @staticmethod
+    def _clean(value):
+        if value is None:
+            return ''
+        value = str(value).strip()
+        return '' if value.lower() == 'nan' else value
+
+    def _parse_row(self, row, has_parent_column):
+        """
+        Retorna {'segments', 'parent', 'slug', 'sort_order'} o None si la fila
+        no tiene nombre. `parent` es None (raíz o ruta completa en
+        `segments`), ('name', nombre) o ('legacy', None).
+        """
+        segments = self.split_path(self._clean(row.get('path')) or self._clean(row.get('name')))
+        if not segments:
+            return None
+        for segment in segments:
+            if len(segment) > Category._meta.get_field('name').max_length:
+                raise ValueError(f"Nombre demasiado largo: '{segment[:30]}...'")
+
+        parent = None
+        parent_value = self._clean(row.get('parent'))
+        if parent_value:
+            if self.PATH_SEPARATOR in parent_value:
+                segments = self.split_path(parent_value) + segments
+            else:
+                parent = ('name', parent_value)
+        elif len(segments) == 1 and not has_parent_column:
+            parent = ('legacy', None)
+
+        sort_order = None
+        if self._clean(row.get('sort_order')):
+            try:
+                sort_order = int(float(row['sort_order']))
+            except (TypeError, ValueError):
+                raise ValueError(f"Orden inválido: {row['sort_order']}")
+
+        return {'segments': segments, 'parent': parent, 'slug': self._clean(row.get('slug')) or None, 'sort_order': sort_order}
+
+    @staticmethod
+    def _key(path):
+        return tuple(name.lower() for name in path)
+
+    @staticmethod
+    def _existing_tree():
+        """
+        Categorías existentes como dicts y sus rutas (tupla de nombres desde la
+        raíz). Las que forman parte de un ciclo en la base quedan sin ruta.
+        """
+        existing = {c['id']: c for c in Category.objects.values('id', 'name', 'parent_id', 'slug', 'sort_order')}
+        paths = {}
+
+        def path_of(pk, visiting):
+            if pk in paths:
+                return paths[pk]
+            node = existing.get(pk)
+            if node is None or pk in visiting:
+                return None
+            visiting.add(pk)
+            if node['parent_id'] is None:
+                path = (node['name'],)
+            else:
+                parent_path = path_of(node['parent_id'], visiting)
+                path = parent_path + (node['name'],) if parent_path else None
+            paths[pk] = path
+            return path
+
+        for pk in existing:
+            path_of(pk, set())
+        return existing, paths
+
+    def _resolve_paths(self, entries, paths, stats, log):
+        """
+        Calcula la ruta completa de cada fila y arma el árbol del archivo:
+        {clave de ruta: nodo}. Las filas que no se pueden ubicar (ciclo, padre
+        ambiguo) se cuentan como error.
+        """
+        by_name = {}
+        for pk, path in paths.items():
+            if path:
+                by_name.setdefault(path[-1].lower(), []).append(pk)
+        file_by_name = {}
+        for index, (_, entry) in enumerate(entries):
+            file_by_name.setdefault(entry['segments'][-1].lower(), []).append(index)
+
+        resolved = {}
+
+        def resolve(index, visiting):
+            if index in resolved:
+                return resolved[index]
+            if index in visiting:
+                raise ValueError("la jerarquía tiene un ciclo")
+            visiting.add(index)
+            entry = entries[index][1]
+            segments = tuple(entry['segments'])
+            kind, ref = entry['parent'] or (None, None)
+
+            if kind == 'legacy':
+                matches = by_name.get(segments[-1].lower(), [])
+                path = paths[matches[0]] if len(matches) == 1 else segments
+            elif kind == 'name':
+                candidates = [i for i in file_by_name.get(ref.lower(), []) if i != index]
+                if len(candidates) > 1:
+                    raise ValueError(f"padre '{ref}' ambiguo: aparece varias veces en el archivo")
+                if candidates:
+                    path = resolve(candidates[0], visiting) + segments
+                else:
+                    matches = by_name.get(ref.lower(), [])
+                    if len(matches) > 1:
+                        raise ValueError(f"padre '{ref}' ambiguo: hay varias categorías con ese nombre")
+                    path = (paths[matches[0]] if matches else (ref,)) + segments
+            else:
+                path = segments
+            resolved[index] = path
+            return path
+
+        nodes = {}
+        for index, (row_idx, entry) in enumerate(entries):
+            try:
+                path = resolve(index, set())
+            except ValueError as e:
+                stats['errors'] += 1
+                log.append(f"Error fila {row_idx}: {e}")
+                continue
+            key = self._key(path)
+            if key in nodes:
+                log.append(f"Fila {row_idx}: categoría '{' > '.join(path)}' repetida, se usa la última fila.")
+            nodes[key] = {'row': row_idx, 'path': path, 'slug': entry['slug'], 'sort_order': entry['sort_order']}
+        return nodes
+
+    @staticmethod
+    def _unique_slug(name, used):
+        """Mismo criterio que Category.save(): slugify(name) con sufijo -N si ya existe."""
+        base_slug = slugify(name) or 'categoria'
+        slug, counter = base_slug, 1
+        while slug in used:
+            slug = f"{base_slug}-{counter}"
+            counter += 1
+        used.add(slug)
+        return slug
+
+    def process(self, dry_run=True, resume=None, checkpoint=None):
+        """
+        Lee el archivo completo, arma y valida el árbol en memoria y lo escribe
+        en una transacción. No hay bloques confirmados a mitad de camino: con
+        `checkpoint` (jobs en segundo plano) se informa el progreso de lectura
+        y un job interrumpido vuelve a empezar (la importación es idempotente).
+        """
         try:
-            df = pd.read_excel(self.file, dtype=str)
-            
-            # Normalizar columnas
-            df.columns = [c.strip().lower() for c in df.columns]
-            
-            # Mapeo de columnas
-            column_mapping = {
-                'nombre': 'name',
-                'categoria': 'name', # In case user puts 'Categoria' as header
-                'slug': 'slug',
-                'orden': 'sort_order',
-                'order': 'sort_order'
-            }
-            df.rename(columns=column_mapping, inplace=True)
+            reader = open_reader(self.file)
+            columns = normalize_columns(reader.header, self.COLUMN_MAPPING)
 
-            if 'name' not in df.columns:
-                 return {'success': False, 'error': "Falta columna 'name' (o 'Nombre')"}
+            if 'name' not in columns and 'path' not in columns:
+                reader.close()
+                return {'success': False, 'error': "Falta columna 'name' (o 'Nombre') o 'Ruta'"}
 
-            stats = {'created': 0, 'updated': 0, 'errors': 0}
+            stats = {'created': 0, 'updated': 0, 'unchanged': 0, 'errors': 0}
             log = []
+            total = reader.estimated_rows
+            has_parent_column = 'parent' in columns or 'path' in columns
 
-            for index, row in df.iterrows():
-                try:
-                    name = str(row['name']).strip()
-                    if not name or name.lower() == 'nan': continue
-                    
-                    slug = row.get('slug', '')
-                    if pd.isna(slug) or str(slug).lower() == 'nan':
-                        slug = None
-                    else:
-                        slug = str(slug).strip()
-
-                    # Handle sort_order if present
-                    sort_order = 0
-                    if 'sort_order' in row and not pd.isna(row['sort_order']):
-                        try:
-                            sort_order = int(float(row['sort_order']))
-                        except:
-                            pass
-
-                    defaults = {'sort_order': sort_order}
-                    if slug:
-                        defaults['slug'] = slug
-                    
-                    obj, created = Category.objects.update_or_create(
-                        name=name,
-                        defaults=defaults
-                    )
-                    
-                    if created:
-                        stats['created'] += 1
-                        log.append(f"Creada: {name}")
-                    else:
-                        stats['updated'] += 1
-                        log.append(f"Actualizada: {name}")
+            # 1. Leer y validar filas
+            entries = []
+            processed = 0
+            for chunk in reader.iter_chunks():
+                for row_idx, values in chunk:
+                    try:
+                        entry = self._parse_row(dict(zip(columns, values)), has_parent_column)
+                    except ValueError as e:
+                        stats['errors'] += 1
+                        log.append(f"Error fila {row_idx}: {e}")
+                        continue
+                    if entry:
+                        entries.append((row_idx, entry))
+                processed += len(chunk)
+                if checkpoint:
+                    # Solo progreso: nada quedó confirmado todavía (last_row = 0)
+                    checkpoint({'last_row': 0, 'processed': processed, 'total': max(total, processed), 'stats': {}, 'log': []})
+
+            # 2. Armar el árbol (rutas completas) contra las categorías existentes
+            existing, paths = self._existing_tree()
+            ids = {self._key(path): pk for pk, path in paths.items() if path}
+            nodes = self._resolve_paths(entries, paths, stats, log)
 
-                except Exception as e:
+            # 3. Slugs explícitos: no pueden pertenecer a otra categoría
+            slug_owner = {c['slug']: self._key(paths[pk]) if paths.get(pk) else None for pk, c in existing.items()}
+            for key, node in list(nodes.items()):
+                if node['slug'] and slug_owner.setdefault(node['slug'], key) != key:
                     stats['errors'] += 1
-                    log.append(f"Error fila {index}: {e}")
+                    log.append(f"Error fila {node['row']}: el slug '{node['slug']}' ya lo usa otra categoría.")
+                    del nodes[key]
 
-            if dry_run:
-                transaction.savepoint_rollback(sid)
-            else:
-                transaction.savepoint_commit(sid)
+            # Ancestros que no existen ni vienen en el archivo
+            for key, node in list(nodes.items()):
+                for depth in range(1, len(key)):
+                    prefix = key[:depth]
+                    if prefix not in ids and prefix not in nodes:
+                        nodes[prefix] = {'row': None, 'path': node['path'][:depth], 'slug': None, 'sort_order': None}
+
+            to_create = sorted((key for key in nodes if key not in ids), key=len)
+            to_update = []
+            for key, node in nodes.items():
+                if key not in ids or node['row'] is None:
+                    continue
+                current = existing[ids[key]]
+                changes = {
+                    field: node[field] for field in ('slug', 'sort_order')
+                    if node[field] is not None and node[field] != current[field]
+                }
+                label = ' > '.join(paths[ids[key]])
+                if changes:
+                    stats['updated'] += 1
+                    log.append(f"Actualizada: {label}")
+                    to_update.append(Category(
+                        id=ids[key], updated_at=timezone.now(),
+                        **{**{f: current[f] for f in ('slug', 'sort_order')}, **changes}
+                    ))
+                else:
+                    stats['unchanged'] += 1
+            for key in to_create:
+                stats['created'] += 1
+                suffix = '' if nodes[key]['row'] is not None else ' (ancestro)'
+                log.append(f"Creada: {' > '.join(nodes[key]['path'])}{suffix}")
+
+            # 4. Escribir nivel por nivel (cada nivel necesita los ids del anterior)
+            if not dry_run:
+                used_slugs = set(slug_owner)
+                with transaction.atomic():
+                    for depth, level in groupby(to_create, key=len):
+                        level = list(level)
+                        objs = []
+                        for key in level:
+                            node = nodes[key]
+                            objs.append(Category(
+                                name=node['path'][-1],
+                                parent_id=ids[key[:-1]] if depth > 1 else None,
+                                slug=node['slug'] or self._unique_slug(node['path'][-1], used_slugs),
+                                sort_order=node['sort_order'] or 0,
+                            ))
+                        for key, obj in zip(level, Category.objects.bulk_create(objs)):
+                            ids[key] = obj.pk
+                    if to_update:
+                        Category.objects.bulk_update(to_update, ['slug', 'sort_order', 'updated_at'])
+                    if to_create or to_update:
+                        DataVersion.bump('categories')
+                    if checkpoint:
+                        checkpoint({
+                            'last_row': reader.last_row, 'processed': processed, 'total': max(total, processed),
+                            'stats': stats, 'log': log,
+                        })
 
             return {'success': True, 'stats': stats, 'log': log}
         except Exception as e:
-            transaction.savepoint_rollback(sid)
             return {'success': False, 'error': str(e)}
 
+
 class ProductImporter:
+    """
+    Importa productos desde Excel, CSV o Parquet con upsert set-based.
+
+    El archivo se lee en streaming por bloques de BATCH_SIZE filas; cada bloque
+    se valida en memoria y se escribe con INSERT ... ON CONFLICT (sku) DO UPDATE
+    (bulk_create con update_conflicts), en lugar de un update_or_create
+    (SELECT + UPDATE/INSERT) por SKU. La memoria no crece con el archivo.
+
+    En PostgreSQL las filas se cargan con COPY en una tabla temporal y se
+    mezclan con la tabla de productos por lotes, con unas pocas sentencias
+    SQL cada uno (ver _process_copy). Solo se actualizan las columnas presentes en el archivo:
+    un archivo de SKU + stock no pisa nombres ni precios.
+
+    Lee también las columnas de la exportación del catálogo (DataExporter):
+    'categorias' (rutas "A > B" separadas por '|', reemplaza las categorías
+    M2M del producto; las rutas que no existen se informan y se ignoran),
+    'atributos' (JSON) y 'proveedor'.
+
+    La previsualización (dry_run) es de solo lectura: ver preview().
+    """
+    BATCH_SIZE = 1000
+    # Desde esta cantidad de filas el parseo se reparte en un pool de procesos
+    PARALLEL_PARSE_MIN = 20000
+    # Previsualización: SKUs por consulta del snapshot y filas de detalle por lista
+    SNAPSHOT_BATCH = 2000
+    # Carga por COPY: SKUs por lote (y checkpoint) al mezclar con la tabla de productos
+    MERGE_BATCH = 20000
+    PREVIEW_LIMIT = 200
+    UPDATE_FIELDS = ['name', 'brand', 'description', 'base_price', 'stock', 'is_active', 'category', 'supplier', 'attributes']
+    # Solo se escriben los SKUs cuyos valores difieren de los guardados
+    COMPARE_FIELDS = [
+        'name', 'brand', 'description', 'base_price', 'stock', 'is_active', 'category_id', 'supplier', 'attributes',
+    ]
+    # Columnas de la tabla temporal del COPY (PostgreSQL); los ids son bigint (BigAutoField)
+    STAGE_COLUMNS = [
+        ('file_row', 'integer'), ('sku', 'text'), ('name', 'text'), ('brand', 'text'), ('description', 'text'),
+        ('base_price', 'numeric(12,2)'), ('stock', 'integer'), ('is_active', 'boolean'),
+        ('category_name', 'text'), ('supplier', 'text'), ('attributes', 'jsonb'),
+        ('category_ids', 'bigint[]'),
+    ]
+    # Separador de varias rutas en la columna 'categorias' (el de la exportación)
+    CATEGORY_LIST_SEPARATOR = '|'
+
+    # Mapeo de columnas (Español -> Inglés)
+    COLUMN_MAPPING = {
+        'precio': 'base_price',
+        'nombre': 'name',
+        'marca': 'brand',
+        'categoria': 'category',
+        'categoría': 'category',
+        'descripcion': 'description',
+        'descripción': 'description',
+        'activo': 'is_active',
+        'categorias': 'categories',
+        'categorías': 'categories',
+        'atributos': 'attributes',
+        'proveedor': 'supplier',
+        # 'sku' y 'stock' ya coinciden en lowercase
+    }
+
     def __init__(self, file):
         self.file = file
+        # Campos presentes en el archivo (se define al leer el encabezado)
+        self.fields = list(self.UPDATE_FIELDS)
+        # Columna 'categorias' presente: se reemplazan las categorías M2M
+        self.sync_categories = False
+        self._category_paths = self._category_labels = None
+
+    def _read_columns(self, columns):
+        self.fields = [f for f in self.UPDATE_FIELDS if f in columns]
+        self.sync_categories = 'categories' in columns
+
+    def _clean_str(self, val):
+        if val is None or pd.isna(val):
+            return ""
+        s = str(val).strip()
+        if s.lower() == 'nan':
+            return ""
+        return s
 
-    def process(self, dry_run=True):
+    @staticmethod
+    def _parse_number(value, label):
+        """Número de una celda: vacío -> 0, coma decimal aceptada ('12,5'); texto inválido -> ValueError."""
+        if value is None or (isinstance(value, float) and value != value):
+            return 0.0
+        if isinstance(value, (int, float, Decimal)):
+            return float(value)
+        text = str(value).strip()
+        if not text or text.lower() == 'nan':
+            return 0.0
+        if ',' in text and '.' not in text:
+            text = text.replace(',', '.')
         try:
-            df = pd.read_excel(self.file, dtype=str)
-             
-            # Normalizar columnas (lowercase y strip)
-            df.columns = [c.strip().lower() for c in df.columns]
-            
-            # Mapeo de columnas (Español -> Inglés)
-            column_mapping = {
-                'precio': 'base_price',
-                'nombre': 'name',
-                'marca': 'brand',
-                'categoria': 'category',
-                'categoría': 'category',
-                'descripcion': 'description',
-                'descripción': 'description'
-                # 'sku' y 'stock' ya coinciden en lowercase
-            }
-            df.rename(columns=column_mapping, inplace=True)
+            return float(text)
+        except ValueError:
+            raise ValueError(f"{label} inválido: '{text}'")
+
+    def _parse_attributes(self, value):
+        """Atributos en JSON, como los exporta DataExporter ('{"peso": "500 g"}'); vacío -> {}."""
+        if isinstance(value, dict):
+            return value
+        text = self._clean_str(value)
+        if not text:
+            return {}
+        try:
+            attributes = json.loads(text)
+        except ValueError:
+            raise ValueError(f"atributos inválidos (se espera JSON): '{text[:40]}'")
+        if not isinstance(attributes, dict):
+            raise ValueError(f"atributos inválidos (se espera un objeto JSON): '{text[:40]}'")
+        return attributes
+
+    def _parse_category_paths(self, value):
+        """'A | A > B' -> [('A',), ('A', 'B')]"""
+        paths = (CategoryImporter.split_path(part) for part in self._clean_str(value).split(self.CATEGORY_LIST_SEPARATOR))
+        return [tuple(path) for path in paths if path]
+
+    def _parse_row(self, row):
+        """Convierte una fila del archivo en un dict de valores listos para Product."""
+        base_price = self._parse_number(row.get('base_price'), 'precio')
+        if base_price < 0:
+            raise ValueError(f"precio negativo: {base_price}")
+        stock = int(self._parse_number(row.get('stock'), 'stock'))
+
+        return {
+            'name': self._clean_str(row.get('name', '')),
+            'brand': self._clean_str(row.get('brand', '')),
+            'description': self._clean_str(row.get('description', '')),
+            'base_price': round(base_price, 2),
+            'stock': stock,
+            'is_active': str(row.get('is_active', '1')).lower() in ['1', 'true', 'yes', 'si'],
+            'category_name': self._clean_str(row.get('category', '')),
+            'supplier': self._clean_str(row.get('supplier', '')),
+            'attributes': self._parse_attributes(row.get('attributes')),
+            'category_paths': self._parse_category_paths(row.get('categories', '')),
+        }
+
+    def _parse_chunk(self, chunk, columns):
+        """
+        Parsea y valida un bloque de filas crudas (puede correr en el pool de
+        procesos). Retorna (last_row, count, parsed, errors) con
+        parsed = [(row_idx, sku, data)] de las filas con SKU y los mensajes de
+        error en el orden del archivo.
+        """
+        parsed, errors = [], []
+        for row_idx, values in chunk:
+            row = dict(zip(columns, values))
+            sku = self._clean_str(row.get('sku'))
+            if not sku:
+                continue
+            try:
+                parsed.append((row_idx, sku, self._parse_row(row)))
+            except Exception as e:
+                errors.append({'row': row_idx, 'sku': sku, 'message': str(e)})
+        return chunk[-1][0], len(chunk), parsed, errors
+
+    def _iter_parsed(self, chunks, columns, stats, log, pool=None, invalid=None):
+        """
+        Parsea los bloques en el pool (si hay) y los entrega en el orden del
+        archivo a la etapa de escritura, que corre en este proceso.
+        Genera (last_row, count, parsed); los errores van a stats/log (y a
+        `invalid` si se pasa una lista).
+        """
+        payloads = ((columns, chunk) for chunk in chunks)
+        for last_row, count, parsed, errors in ordered_imap(_parse_product_chunk, payloads, pool):
+            stats['errors'] += len(errors)
+            log.extend(f"Error fila {e['row']} (SKU {e['sku']}): {e['message']}" for e in errors)
+            if invalid is not None:
+                invalid.extend(errors)
+            if self.sync_categories:
+                self._resolve_category_paths(parsed, log)
+            yield last_row, count, parsed
+
+    def _resolve_category_paths(self, parsed, log):
+        """Convierte las rutas de 'categorias' en ids (data['category_ids']); el árbol se lee una sola vez."""
+        if self._category_paths is None:
+            _, tree = CategoryImporter._existing_tree()
+            self._category_paths = {CategoryImporter._key(path): pk for pk, path in tree.items() if path}
+            self._category_labels = {pk: ' > '.join(path) for pk, path in tree.items() if path}
+        for row_idx, sku, data in parsed:
+            ids = set()
+            for path in data['category_paths']:
+                pk = self._category_paths.get(CategoryImporter._key(path))
+                if pk is None:
+                    log.append(f"Fila {row_idx} (SKU {sku}): la categoría '{' > '.join(path)}' no existe, se ignora.")
+                else:
+                    ids.add(pk)
+            data['category_ids'] = frozenset(ids)
+
+    def _current_categories(self, skus):
+        """{sku: frozenset(ids de categorías M2M)} de los SKUs dados."""
+        links = {}
+        through = Product.categories.through.objects.filter(product__sku__in=skus)
+        for sku, category_id in through.values_list('product__sku', 'category_id'):
+            links.setdefault(sku, set()).add(category_id)
+        return {sku: frozenset(ids) for sku, ids in links.items()}
+
+    def _write_categories(self, rows):
+        """Reemplaza las categorías M2M de los productos del bloque por las del archivo."""
+        through = Product.categories.through
+        ids = dict(Product.objects.filter(sku__in=list(rows)).values_list('sku', 'id'))
+        through.objects.filter(product_id__in=list(ids.values())).delete()
+        through.objects.bulk_create([
+            through(product_id=ids[sku], category_id=category_id)
+            for sku, data in rows.items() for category_id in sorted(data['category_ids'])
+        ])
+
+    def _resolve_categories(self, names, categories, dry_run):
+        """Resuelve nombres de categoría (case-insensitive); crea las faltantes si no es dry_run."""
+        for cat_name in {name for name in names if name}:
+            key = cat_name.lower()
+            if key not in categories and not dry_run:
+                # Auto-create category if missing
+                categories[key] = Category.objects.create(name=cat_name, slug=cat_name.lower().replace(' ', '-')).id
+
+    def _upsert(self, rows, categories):
+        """Escribe un bloque de productos con ON CONFLICT (sku)."""
+        objs = []
+        for sku, data in rows.items():
+            objs.append(Product(
+                sku=sku,
+                name=data['name'],
+                brand=data['brand'],
+                description=data['description'],
+                base_price=data['base_price'],
+                stock=data['stock'],
+                is_active=data['is_active'],
+                category_id=categories.get(data['category_name'].lower()) if data['category_name'] else None,
+                supplier=data['supplier'] or None,
+                attributes=data['attributes'],
+            ))
+        if not self.fields:
+            # Archivo con solo SKUs: se crean los nuevos, los existentes no cambian
+            Product.objects.bulk_create(objs, ignore_conflicts=True)
+        else:
+            Product.objects.bulk_create(
+                objs,
+                update_conflicts=True,
+                unique_fields=['sku'],
+                update_fields=self.fields,
+            )
+        if self.sync_categories:
+            self._write_categories(rows)
+        DataVersion.bump('products')
+
+    def _compare_fields(self):
+        return [self.COMPARE_FIELDS[self.UPDATE_FIELDS.index(f)] for f in self.fields]
+
+    def _current_values(self, product):
+        """Valores comparables de un producto guardado (dict de .values())."""
+        return tuple((product[f] or None) if f == 'supplier' else product[f] for f in self._compare_fields())
+
+    def _incoming_values(self, data, categories):
+        """Valores comparables de una fila del archivo (misma forma que _current_values)."""
+        category_id = None
+        if data['category_name']:
+            # Una categoría que todavía no existe (se creará) siempre cuenta como cambio
+            category_id = categories.get(data['category_name'].lower(), 'NUEVA')
+        values = {
+            'name': data['name'], 'brand': data['brand'], 'description': data['description'],
+            'base_price': Decimal(str(data['base_price'])).quantize(Decimal('0.01')),
+            'stock': data['stock'], 'is_active': data['is_active'], 'category_id': category_id,
+            'supplier': data['supplier'] or None, 'attributes': data['attributes'],
+        }
+        return tuple(values[f] for f in self._compare_fields())
+
+    def _process_parsed(self, parsed, seen, categories, stats, log, dry_run):
+        """Compara un bloque ya parseado con la base y lo escribe (o solo lo cuenta en dry_run)."""
+        rows = {}
+        for row_idx, sku, data in parsed:
+            if sku in rows or sku in seen:
+                log.append(f"Fila {row_idx}: SKU {sku} duplicado en el archivo, se usa la última fila.")
+                rows.pop(sku, None)  # Reinsertar al final para respetar el orden del archivo
+            rows[sku] = data
+
+        if not rows:
+            return
+
+        current = {
+            p['sku']: self._current_values(p)
+            for p in Product.objects.filter(sku__in=list(rows)).values('sku', *self._compare_fields())
+        }
+        links = self._current_categories(list(rows)) if self.sync_categories else {}
+        to_write = {}
+        for sku, data in rows.items():
+            existing = current.get(sku)
+            if existing is None:
+                kind = 'created'
+            elif existing != self._incoming_values(data, categories) or (
+                self.sync_categories and links.get(sku, frozenset()) != data['category_ids']
+            ):
+                kind = 'updated'
+            else:
+                kind = 'unchanged'
+            if kind != 'unchanged':
+                to_write[sku] = data
+            if sku not in seen:  # Un SKU repetido ya se contó en un bloque anterior
+                stats[kind] += 1
+        seen.update(rows)
+
+        if not dry_run and to_write:
+            if 'category' in self.fields:
+                self._resolve_categories((r['category_name'] for r in to_write.values()), categories, dry_run)
+            self._upsert(to_write, categories)
+
+    def _copy_rows(self, cursor, table, rows):
+        """Envía un bloque de filas a la tabla temporal con COPY (formato CSV)."""
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        buffer.seek(0)
+        columns = ', '.join(name for name, _ in self.STAGE_COLUMNS)
+        sql = f"COPY {table} ({columns}) FROM STDIN WITH (FORMAT csv)"
+        raw = cursor.cursor
+        if hasattr(raw, 'copy_expert'):  # psycopg2
+            raw.copy_expert(sql, buffer)
+        else:  # psycopg 3
+            with raw.copy(sql) as copy:
+                copy.write(buffer.getvalue())
+
+    def _diff_sql(self):
+        """Condición SQL 'el producto guardado (p) difiere de la fila (s)', solo para las columnas del archivo."""
+        conditions = []
+        for field in self.fields:
+            if field in ('name', 'brand', 'description'):
+                conditions.append(f"p.{field} IS DISTINCT FROM COALESCE(s.{field}, '')")
+            elif field == 'category':
+                conditions.append("p.category_id IS DISTINCT FROM s.category_id")
+            elif field == 'supplier':
+                conditions.append("COALESCE(p.supplier, '') IS DISTINCT FROM COALESCE(s.supplier, '')")
+            else:
+                conditions.append(f"p.{field} IS DISTINCT FROM s.{field}")
+        if self.sync_categories:
+            through = connection.ops.quote_name(Product.categories.through._meta.db_table)
+            conditions.append(
+                f"s.category_ids IS DISTINCT FROM COALESCE((SELECT array_agg(t.category_id ORDER BY t.category_id)"
+                f" FROM {through} t WHERE t.product_id = p.id), '{{}}')"
+            )
+        return '(' + ' OR '.join(conditions) + ')' if conditions else 'FALSE'
+
+    def _process_copy(self, reader, columns, categories, stats, log, checkpoint, total, resume_row=0, pool=None):
+        """
+        Carga masiva para PostgreSQL:
+          1. Las filas validadas se envían por bloques con COPY a una tabla
+             temporal (no genera WAL, como una UNLOGGED, y es privada de la
+             conexión).
+          2. Se deduplica por SKU (gana la última fila) y recién entonces se
+             crean las categorías faltantes: solo las de filas que se escriben.
+          3. Se mezcla con la tabla de productos en lotes de MERGE_BATCH SKUs,
+             en orden de fila del archivo: por lote, un SELECT cuenta altas,
+             cambios y sin cambios, y un INSERT ... SELECT ... ON CONFLICT
+             (sku) DO UPDATE toca solo los SKUs nuevos o modificados.
+        Con `checkpoint` cada lote se confirma junto con su checkpoint
+        (last_row = última fila del archivo del lote). Al retomar se vuelve a
+        leer el archivo pero solo se cargan las filas posteriores: la última
+        aparición de cada SKU pendiente siempre está después de last_row.
+        """
+        qn = connection.ops.quote_name
+        stage, latest = qn('import_product_stage'), qn('import_product_stage_last')
+        diff = self._diff_sql()
+        processed = 0
+        # Lo ya confirmado (al retomar): es lo que guardan los checkpoints hasta el primer lote
+        confirmed = {'stats': dict(stats), 'log': list(log)}
+        # Al retomar, los errores de parseo ya están en el log restaurado
+        parse_stats, parse_log = ({'errors': 0}, []) if resume_row else (stats, log)
+
+        def pending_chunks():
+            nonlocal processed
+            for chunk in reader.iter_chunks():
+                processed += len(chunk)
+                chunk = [item for item in chunk if item[0] > resume_row]
+                if chunk:
+                    yield chunk
+
+        with connection.cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {stage}, {latest}")
+            cursor.execute(
+                f"CREATE TEMP TABLE {stage} (" + ', '.join(f"{name} {kind}" for name, kind in self.STAGE_COLUMNS) + ")"
+            )
+            try:
+                for _, _, parsed in self._iter_parsed(pending_chunks(), columns, parse_stats, parse_log, pool):
+                    rows = [
+                        (
+                            row_idx, sku, data['name'] or None, data['brand'] or None, data['description'] or None,
+                            data['base_price'], data['stock'], data['is_active'], data['category_name'] or None,
+                            data['supplier'] or None, json.dumps(data['attributes'], ensure_ascii=False),
+                            '{' + ','.join(map(str, sorted(data['category_ids']))) + '}' if self.sync_categories else None,
+                        )
+                        for row_idx, sku, data in parsed
+                    ]
+                    if rows:
+                        self._copy_rows(cursor, stage, rows)
+                    if checkpoint:
+                        # Solo progreso: no se confirmó nada nuevo
+                        checkpoint({'last_row': resume_row, 'processed': processed, 'total': max(total, processed), **confirmed})
+
+                # n numera los SKUs en orden de fila para partir la mezcla en lotes
+                cursor.execute(
+                    f"CREATE TEMP TABLE {latest} AS"
+                    f" SELECT row_number() OVER (ORDER BY file_row) AS n, d.*, NULL::bigint AS category_id"
+                    f" FROM (SELECT DISTINCT ON (sku) * FROM {stage} ORDER BY sku, file_row DESC) d"
+                )
+                cursor.execute(f"CREATE INDEX ON {latest} (n)")
+                cursor.execute(f"ANALYZE {latest}")
+                if not resume_row:
+                    cursor.execute(
+                        f"SELECT file_row, sku FROM ("
+                        f"  SELECT file_row, sku, row_number() OVER (PARTITION BY sku ORDER BY file_row) AS n FROM {stage}"
+                        f") d WHERE n > 1 ORDER BY file_row"
+                    )
+                    for row_idx, sku in cursor.fetchall():
+                        log.append(f"Fila {row_idx}: SKU {sku} duplicado en el archivo, se usa la última fila.")
+                if 'category' in self.fields:
+                    self._map_stage_categories(cursor, latest, categories)
+
+                cursor.execute(f"SELECT count(*) FROM {latest}")
+                count = cursor.fetchone()[0]
+                for first in range(1, count + 1, self.MERGE_BATCH):
+                    with transaction.atomic() if checkpoint else nullcontext():
+                        last_row = self._merge_batch(cursor, latest, diff, stats, first, first + self.MERGE_BATCH - 1)
+                        if checkpoint:
+                            checkpoint({
+                                'last_row': last_row, 'processed': processed, 'total': max(total, processed),
+                                'stats': stats, 'log': log,
+                            })
+            finally:
+                cursor.execute(f"DROP TABLE IF EXISTS {stage}, {latest}")
+
+    def _map_stage_categories(self, cursor, latest, categories):
+        """Crea las categorías que faltan de las filas deduplicadas y completa latest.category_id."""
+        cursor.execute(f"SELECT DISTINCT category_name FROM {latest} WHERE category_name IS NOT NULL")
+        names = [name for name, in cursor.fetchall()]
+        self._resolve_categories(names, categories, dry_run=False)
+        cursor.execute(
+            f"UPDATE {latest} s SET category_id = m.id FROM unnest(%s::text[], %s::bigint[]) AS m(name, id)"
+            f" WHERE s.category_name = m.name",
+            [names, [categories[name.lower()] for name in names]],
+        )
+
+    def _merge_batch(self, cursor, latest, diff, stats, first, last):
+        """Mezcla los SKUs n = first..last de latest; devuelve la última fila del archivo del lote."""
+        qn = connection.ops.quote_name
+        product_table = qn(Product._meta.db_table)
+        through = qn(Product.categories.through._meta.db_table)
+        batch = f"s.n BETWEEN {int(first)} AND {int(last)}"
+        cursor.execute(
+            f"SELECT count(*) FILTER (WHERE p.id IS NULL),"
+            f"       count(*) FILTER (WHERE p.id IS NOT NULL AND {diff}),"
+            f"       count(*) FILTER (WHERE p.id IS NOT NULL AND NOT {diff}),"
+            f"       max(s.file_row)"
+            f" FROM {latest} s LEFT JOIN {product_table} p ON p.sku = s.sku WHERE {batch}"
+        )
+        created, updated, unchanged, last_row = cursor.fetchone()
+        stats['created'] += created
+        stats['updated'] += updated
+        stats['unchanged'] += unchanged
+
+        if created or updated:
+            if self.fields:
+                conflict = "DO UPDATE SET " + ', '.join(
+                    f"{self.COMPARE_FIELDS[self.UPDATE_FIELDS.index(f)]} = EXCLUDED.{self.COMPARE_FIELDS[self.UPDATE_FIELDS.index(f)]}"
+                    for f in self.fields
+                )
+            else:
+                conflict = "DO NOTHING"
+            cursor.execute(
+                f"INSERT INTO {product_table}"
+                f" (sku, name, brand, description, base_price, stock, is_active, category_id,"
+                f"  category_old, supplier, attributes, created_at)"
+                f" SELECT s.sku, COALESCE(s.name, ''), COALESCE(s.brand, ''), COALESCE(s.description, ''),"
+                f"        s.base_price, s.stock, s.is_active, s.category_id, '', s.supplier, s.attributes, now()"
+                f" FROM {latest} s LEFT JOIN {product_table} p ON p.sku = s.sku"
+                f" WHERE {batch} AND (p.id IS NULL OR {diff})"
+                f" ON CONFLICT (sku) {conflict}"
+            )
+            if self.sync_categories:
+                # Categorías M2M: las del archivo reemplazan a las guardadas
+                cursor.execute(
+                    f"DELETE FROM {through} t USING {latest} s, {product_table} p"
+                    f" WHERE {batch} AND p.sku = s.sku AND t.product_id = p.id AND NOT t.category_id = ANY(s.category_ids)"
+                )
+                cursor.execute(
+                    f"INSERT INTO {through} (product_id, category_id)"
+                    f" SELECT p.id, unnest(s.category_ids) FROM {latest} s JOIN {product_table} p ON p.sku = s.sku"
+                    f" WHERE {batch} ON CONFLICT DO NOTHING"
+                )
+            DataVersion.bump('products')
+        return last_row
+
+    def _snapshot(self, skus):
+        """Valores actuales de los SKUs del archivo (DataFrame), en consultas de SNAPSHOT_BATCH SKUs."""
+        fields = ['sku'] + self.COMPARE_FIELDS
+        rows, links = [], {}
+        for start in range(0, len(skus), self.SNAPSHOT_BATCH):
+            batch = skus[start:start + self.SNAPSHOT_BATCH]
+            rows.extend(Product.objects.filter(sku__in=batch).values_list(*fields))
+            if self.sync_categories:
+                links.update(self._current_categories(batch))
+        snapshot = pd.DataFrame.from_records(rows, columns=fields)
+        if self.sync_categories:
+            snapshot['category_ids'] = [links.get(sku, frozenset()) for sku in snapshot['sku']]
+        return snapshot
+
+    def _field_changes(self, merged, categories):
+        """
+        Máscaras booleanas (una columna por campo del archivo) de los valores
+        que difieren del snapshot. Compara columnas enteras, no fila por fila.
+        """
+        changes = pd.DataFrame(index=merged.index)
+        for field in self.fields:
+            if field in ('name', 'brand', 'description'):
+                changes[field] = merged[field] != merged[f'{field}_actual'].fillna('')
+            elif field == 'base_price':
+                current = merged['base_price_actual'].astype(float)
+                changes[field] = (merged['base_price'].round(2) - current).abs().fillna(1) >= 0.005
+            elif field == 'stock':
+                changes[field] = merged['stock'] != merged['stock_actual']
+            elif field == 'is_active':
+                changes[field] = merged['is_active'] != merged['is_active_actual']
+            elif field == 'supplier':
+                changes[field] = merged['supplier'] != merged['supplier_actual'].fillna('')
+            elif field == 'attributes':
+                changes[field] = [
+                    incoming != (current if isinstance(current, dict) else {})
+                    for incoming, current in zip(merged['attributes'], merged['attributes_actual'])
+                ]
+            else:
+                key = merged['category_name'].str.lower()
+                incoming = key.map(categories)
+                new_category = (key != '') & incoming.isna()
+                changes[field] = new_category | (incoming.fillna(0) != merged['category_id_actual'].fillna(0))
+        if self.sync_categories:
+            changes['categories'] = [
+                incoming != (current if isinstance(current, frozenset) else frozenset())
+                for incoming, current in zip(merged['category_ids'], merged['category_ids_actual'])
+            ]
+        return changes
+
+    def preview(self):
+        """
+        Previsualización de solo lectura: no abre transacciones ni escribe.
+
+        Parsea el archivo (en el pool si es grande), toma un snapshot de los
+        productos actuales de esos SKUs y los compara por columnas con un
+        merge de pandas sobre el SKU. Informa altas, cambios (antes/después por
+        campo), sin cambios y filas inválidas; las listas de detalle se cortan
+        en PREVIEW_LIMIT filas (los totales siempre son completos).
+        """
+        reader = open_reader(self.file, chunk_size=self.BATCH_SIZE)
+        columns = normalize_columns(reader.header, self.COLUMN_MAPPING)
+        if 'sku' not in columns:
+            reader.close()
+            return {'success': False, 'error': f"Falta columna 'sku'. Columnas encontradas: {columns}"}
+        self._read_columns(columns)
+
+        stats = {'created': 0, 'updated': 0, 'unchanged': 0, 'errors': 0}
+        log, invalid, records = [], [], []
+        with process_pool(reader.estimated_rows or None, min_items=self.PARALLEL_PARSE_MIN) as pool:
+            for _, _, parsed in self._iter_parsed(reader.iter_chunks(), columns, stats, log, pool, invalid):
+                records.extend({'row': row_idx, 'sku': sku, **data} for row_idx, sku, data in parsed)
+
+        incoming = pd.DataFrame.from_records(records, columns=[
+            'row', 'sku', 'name', 'brand', 'description', 'base_price', 'stock', 'is_active', 'category_name',
+            'supplier', 'attributes', 'category_paths', *(['category_ids'] if self.sync_categories else []),
+        ])
+        for row_idx, sku in incoming.loc[incoming.duplicated('sku', keep='first'), ['row', 'sku']].itertuples(index=False):
+            log.append(f"Fila {row_idx}: SKU {sku} duplicado en el archivo, se usa la última fila.")
+        incoming = incoming.drop_duplicates('sku', keep='last')
+
+        categories = {name.lower(): pk for name, pk in Category.objects.values_list('name', 'id')}
+        current = self._snapshot(incoming['sku'].tolist()).add_suffix('_actual').rename(columns={'sku_actual': 'sku'})
+        merged = incoming.merge(current, on='sku', how='left', indicator=True)
+        is_new = merged['_merge'] == 'left_only'
+        changes = self._field_changes(merged, categories)
+        is_changed = ~is_new & changes.any(axis=1)
+
+        stats['created'] = int(is_new.sum())
+        stats['updated'] = int(is_changed.sum())
+        stats['unchanged'] = int(len(merged) - stats['created'] - stats['updated'])
+
+        category_names = {pk: name for name, pk in Category.objects.values_list('name', 'id')}
+        new_rows = [
+            {'row': int(r.row), 'sku': r.sku, 'name': r.name, 'base_price': float(r.base_price), 'stock': int(r.stock)}
+            for r in merged[is_new].head(self.PREVIEW_LIMIT).itertuples()
+        ]
+        changed_rows = []
+        for index in merged.index[is_changed][:self.PREVIEW_LIMIT]:
+            r = merged.loc[index]
+            diff = {}
+            for field in changes.columns[changes.loc[index]]:
+                if field == 'category':
+                    before = category_names.get(r['category_id_actual']) if pd.notna(r['category_id_actual']) else None
+                    diff[field] = {'before': before, 'after': r['category_name'] or None}
+                elif field == 'categories':
+                    diff[field] = {
+                        'before': sorted(self._category_labels[pk] for pk in r['category_ids_actual']),
+                        'after': sorted(' > '.join(path) for path in r['category_paths']),
+                    }
+                elif field == 'supplier':
+                    diff[field] = {'before': r['supplier_actual'] or None, 'after': r['supplier'] or None}
+                elif field == 'base_price':
+                    diff[field] = {'before': float(r['base_price_actual']), 'after': r['base_price']}
+                elif field == 'stock':
+                    diff[field] = {'before': int(r['stock_actual']), 'after': int(r['stock'])}
+                elif field == 'is_active':
+                    diff[field] = {'before': bool(r['is_active_actual']), 'after': bool(r['is_active'])}
+                else:
+                    diff[field] = {'before': r[f'{field}_actual'], 'after': r[field]}
+            changed_rows.append({'row': int(r['row']), 'sku': r['sku'], 'changes': diff})
+
+        return {
+            'success': True,
+            'dry_run': True,
+            'stats': stats,
+            'log': log,
+            'preview': {'new': new_rows, 'changed': changed_rows, 'invalid': invalid[:self.PREVIEW_LIMIT]},
+            'truncated': max(stats['created'], stats['updated'], len(invalid)) > self.PREVIEW_LIMIT,
+        }
+
+    def process(self, dry_run=True, resume=None, checkpoint=None):
+        """
+        dry_run=True delega en preview() (solo lectura).
+
+        Sin `checkpoint` el archivo completo es una sola transacción. Con
+        `checkpoint` (jobs en segundo plano) cada bloque se confirma por
+        separado junto con su checkpoint, y `resume` retoma después de la
+        última fila confirmada. En PostgreSQL se usa la carga por COPY, que
+        confirma por lotes de MERGE_BATCH SKUs (ver _process_copy).
+        """
+        if dry_run:
+            try:
+                return self.preview()
+            except Exception as e:
+                return {'success': False, 'error': str(e)}
+
+        try:
+            reader = open_reader(self.file, chunk_size=self.BATCH_SIZE)
+            columns = normalize_columns(reader.header, self.COLUMN_MAPPING)
             
-            if 'sku' not in df.columns:
-                 return {'success': False, 'error': f"Falta columna 'sku'. Columnas encontradas: {list(df.columns)}"}
+            if 'sku' not in columns:
+                 reader.close()
+                 return {'success': False, 'error': f"Falta columna 'sku'. Columnas encontradas: {columns}"}
+            self._read_columns(columns)
 
-            stats = {'created': 0, 'updated': 0, 'errors': 0}
+            stats = {'created': 0, 'updated': 0, 'unchanged': 0, 'errors': 0}
             log = []
-            
-            # Cache categories
-            categories = {c.name.lower(): c for c in Category.objects.all()}
+            seen = set()
+            total = reader.estimated_rows
+            use_copy = connection.vendor == 'postgresql' and getattr(settings, 'IMPORT_USE_COPY', True)
+            resume_row = processed = 0
+            if resume:
+                resume_row = resume['last_row']
+                stats.update(resume['stats'])
+                log = list(resume['log'])
+                if not use_copy:  # La carga por COPY vuelve a leer (y contar) el archivo completo
+                    processed = resume['processed']
+
+            def pending_chunks():
+                for chunk in reader.iter_chunks():
+                    if chunk[0][0] <= resume_row:
+                        # Filas ya confirmadas: solo registrar sus SKUs (no se vuelven a contar)
+                        done = [item for item in chunk if item[0] <= resume_row]
+                        sku_index = columns.index('sku')
+                        seen.update(filter(None, (self._clean_str(values[sku_index]) for _, values in done)))
+                        chunk = chunk[len(done):]
+                        if not chunk:
+                            continue
+                    yield chunk
 
-            sid = transaction.savepoint()
             try:
-                for index, row in df.iterrows():
-                    try:
-                        sku = str(row['sku']).strip()
-                        if not sku or sku.lower() == 'nan': continue
-                        
-                        name = str(row.get('name', '')).strip()
-                        brand = str(row.get('brand', '')).strip()
-                        description = str(row.get('description', '')).strip()
-                        
-                        try:
-                            base_price = float(row.get('base_price', 0))
-                        except:
-                            base_price = 0.0
-                            
-                        try:
-                            stock = int(float(row.get('stock', 0)))
-                        except:
-                            stock = 0
-
-                        is_active = str(row.get('is_active', '1')).lower() in ['1', 'true', 'yes', 'si']
-                        
-                        # Category resolution
-                        cat_name = str(row.get('category', '')).strip()
-                        if not cat_name:
-                             # Try 'subcategoria' if present? Optional logic
-                             pass
-                             
-                        category_obj = None
-                        if cat_name:
-                            category_obj = categories.get(cat_name.lower())
-                            if not category_obj and not dry_run:
-                                # Auto-create category if missing
-                                category_obj = Category.objects.create(name=cat_name, slug=cat_name.lower().replace(' ', '-'))
-                                categories[cat_name.lower()] = category_obj
-
-                        defaults = {
-                            'name': name,
-                            'brand': brand,
-                            'description': description,
-                            'base_price': base_price,
-                            'stock': stock,
-                            'is_active': is_active,
-                            'category': category_obj
-                        }
-                        
-                        if not dry_run:
-                            obj, created = Product.objects.update_or_create(
-                                sku=sku,
-                                defaults=defaults
-                            )
-                            if created:
-                                stats['created'] += 1
-                            else:
-                                stats['updated'] += 1
-                        else:
-                            stats['updated'] += 1 # Simulation
-                        
-                    except Exception as e:
-                        if "database is locked" in str(e):
-                             # Retry once for lock
-                             time.sleep(0.1)
-                             try:
-                                 # Retry logic duplicate mainly for lock
-                                 if not dry_run:
-                                    obj, created = Product.objects.update_or_create(sku=sku, defaults=defaults)
-                                    if created: stats['created'] += 1
-                                    else: stats['updated'] += 1
-                             except Exception as e2:
-                                stats['errors'] += 1
-                                log.append(f"Error SKU {sku}: {e2}")
-                        else:
-                            stats['errors'] += 1
-                            log.append(f"Error SKU {sku}: {e}")
-                
-                if dry_run:
-                    transaction.savepoint_rollback(sid)
-                else:
-                    transaction.savepoint_commit(sid)
-                    
+                # El parseo se reparte en procesos; la escritura queda en este (un solo escritor).
+                # Si la hoja no declara su dimensión (total = 0) se asume grande.
+                with process_pool(total - processed or None, min_items=self.PARALLEL_PARSE_MIN) as pool, \
+                        (nullcontext() if checkpoint else transaction.atomic()):
+                    categories = {name.lower(): pk for name, pk in Category.objects.values_list('name', 'id')}
+                    if use_copy:
+                        self._process_copy(reader, columns, categories, stats, log, checkpoint, total, resume_row, pool)
+                        return {'success': True, 'stats': stats, 'log': log}
+
+                    for last_row, count, parsed in self._iter_parsed(pending_chunks(), columns, stats, log, pool):
+                        with transaction.atomic() if checkpoint else nullcontext():
+                            self._process_parsed(parsed, seen, categories, stats, log, dry_run)
+                            processed += count
+                            if checkpoint:
+                                checkpoint({
+                                    'last_row': last_row, 'processed': processed, 'total': max(total, processed),
+                                    'stats': stats, 'log': log,
+                                })
             except Exception as e:
-                transaction.savepoint_rollback(sid)
                 return {'success': False, 'error': f"Error de Transacción: {str(e)}"}
 
             return {'success': True, 'stats': stats, 'log': log}
             
         except Exception as e:
              return {'success': False, 'error': str(e)}
+
+
+def _parse_product_chunk(payload):
+    """Punto de entrada del pool de procesos (función de módulo, picklable)."""
+    columns, chunk = payload
+    return ProductImporter(None)._parse_chunk(chunk, columns)
@@ -1,49 +1,406 @@
-import os
-from django.template.loader import render_to_string
-from django.core.files.base import ContentFile
-from django.conf import settings
-# from xhtml2pdf import pisa
+"""
+Facturas en PDF (reportlab).
+
+Cuando un pedido pasa a CONFIRMED o PAID se crea su Invoice (número y datos
+fiscales congelados) en estado PENDING, sin renderizar nada en el request.
+Los números son correlativos y sin huecos por punto de venta y letra
+(InvoiceSequence, ver allocate_invoice_numbers).
+El worker (`manage.py run_import_worker`) toma las pendientes, genera el PDF
+una sola vez y lo guarda en `Invoice.pdf_file`; la descarga sirve ese
+archivo guardado.
+
+Para cierres de mes, `generate_missing_invoices` (comando
+generate_invoices) genera en procesos paralelos las facturas que falten de
+un período/cliente e `iter_invoices_zip` las entrega en un único ZIP armado
+sobre la marcha. La vista del ZIP no renderiza: encola las faltantes para el
+worker y arma el ZIP recién cuando están todas generadas.
+"""
+import logging
+import zipfile
+from decimal import Decimal
 from io import BytesIO
-from .models import Invoice, Order
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.db.transaction import TransactionManagementError
+from django.db.models import F, Q
+from django.utils import timezone
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.lib.units import mm
+from reportlab.lib.utils import simpleSplit
+from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+from .jobs import STALE_AFTER
+from .models import Invoice, InvoiceSequence, Order, OrderItem
+from .parallel import ordered_imap, process_pool
+
+logger = logging.getLogger(__name__)
+
+# Estados del pedido que llevan factura
+INVOICED_STATUSES = ('CONFIRMED', 'PAID', 'SHIPPED')
+
+COMPANY_NAME = "SaaS B2B Demo"
+COMPANY_TAX_ID = "30-12345678-9"
+COMPANY_ADDRESS = "Calle Falsa 123, CABA"
+
+STYLES = getSampleStyleSheet()
+
+# Por debajo de esta cantidad de facturas el lote se renderiza inline
+PARALLEL_MIN_INVOICES = 20
+# Facturas cuyos ítems se leen juntos en el lote (una consulta por bloque)
+BATCH_CHUNK_SIZE = 200
+# Tamaño de cada bloque copiado del storage al ZIP
+ZIP_BLOCK_SIZE = 64 * 1024
+
+
+def invoice_letter(iva_condition):
+    """Factura A a Responsables Inscriptos, B al resto (monotributo, exentos, consumidor final)."""
+    return 'A' if iva_condition == 'RI' else 'B'
+
+
+def invoice_number(letter, point_of_sale, sequence):
+    """Formato fiscal: A-0001-00000123"""
+    return f"{letter}-{point_of_sale:04d}-{sequence:08d}"
+
+
+def allocate_invoice_numbers(letter, count, point_of_sale=None):
+    """
+    Reserva `count` números consecutivos de la serie (punto de venta, letra)
+    y retorna el range.
+
+    Debe llamarse dentro de la transacción que crea las facturas: el UPDATE
+    bloquea solo la fila de esa serie (no la tabla) hasta el commit, así
+    otras series y el resto de la base siguen libres, y si la transacción se
+    revierte los números vuelven a la serie (sin huecos). Un lote reserva
+    todos sus números con un solo UPDATE.
+    """
+    if not transaction.get_connection().in_atomic_block:
+        raise TransactionManagementError("allocate_invoice_numbers requiere una transacción (atomic)")
+    if point_of_sale is None:
+        point_of_sale = settings.INVOICE_POINT_OF_SALE
+    series = InvoiceSequence.objects.filter(point_of_sale=point_of_sale, letter=letter)
+    if not series.update(last_number=F('last_number') + count, updated_at=timezone.now()):
+        # Primera factura de la serie: si otra transacción la crea a la vez, el INSERT espera a esa
+        InvoiceSequence.objects.bulk_create(
+            [InvoiceSequence(point_of_sale=point_of_sale, letter=letter)], ignore_conflicts=True
+        )
+        series.update(last_number=F('last_number') + count, updated_at=timezone.now())
+    # La fila sigue bloqueada por esta transacción: el valor leído es el propio
+    last = series.values_list('last_number', flat=True).get()
+    return range(last - count + 1, last + 1)
+
+
+def queue_invoices(order_ids):
+    """
+    Crea las facturas pendientes de los pedidos que todavía no tienen una
+    (un INSERT por lote; las existentes no se tocan). El PDF lo genera el worker.
+
+    Los pedidos sin factura se bloquean (filas, en orden de id) antes de
+    numerar, así dos procesos que facturan el mismo pedido no consumen dos
+    números: el segundo espera y ya lo ve facturado.
+    """
+    point_of_sale = settings.INVOICE_POINT_OF_SALE
+    with transaction.atomic():
+        locked = list(
+            Order.objects.select_for_update(of=('self',)).filter(id__in=order_ids, invoice__isnull=True)
+            .order_by('pk').values_list('pk', flat=True)
+        )
+        if not locked:
+            return
+        orders = Order.objects.filter(pk__in=locked, invoice__isnull=True).order_by('pk').values_list(
+            'id', 'client__company_name', 'client__username', 'client__tax_id', 'client__iva_condition', 'total_amount'
+        )
+        by_letter = {}
+        for row in orders:
+            by_letter.setdefault(invoice_letter(row[4]), []).append(row)
+
+        invoices = []
+        # Series siempre en el mismo orden: dos lotes concurrentes no se bloquean en cruz
+        for letter in sorted(by_letter):
+            rows = by_letter[letter]
+            for sequence, (pk, company_name, username, tax_id, _, total) in zip(
+                allocate_invoice_numbers(letter, len(rows), point_of_sale), rows
+            ):
+                invoices.append(Invoice(
+                    order_id=pk,
+                    point_of_sale=point_of_sale,
+                    letter=letter,
+                    sequence=sequence,
+                    number=invoice_number(letter, point_of_sale, sequence),
+                    client_name=company_name or username,
+                    client_tax_id=tax_id or '',
+                    total_amount=total,
+                ))
+        Invoice.objects.bulk_create(invoices)
+
+
+def _money(value):
+    """Formato argentino: $ 1.234,50"""
+    return "$ " + f"{Decimal(value):,.2f}".replace(',', '_').replace('.', ',').replace('_', '.')
+
+
+def invoice_document(invoice, items):
+    """
+    Datos de la factura para render_invoice_pdf, en tipos simples (se pueden
+    enviar a otro proceso). `items` = [(sku, nombre, cantidad, precio unitario)].
+    Los datos fiscales salen del snapshot de la factura, no del usuario actual.
+    """
+    return {
+        'id': invoice.pk,
+        'number': invoice.number,
+        'letter': invoice.letter,
+        'date': timezone.localtime(invoice.order.created_at).date(),
+        'client_name': invoice.client_name,
+        'client_tax_id': invoice.client_tax_id,
+        'client_email': invoice.order.client.email or '',
+        'total': invoice.total_amount,
+        'items': items,
+    }
+
+
+def render_invoice_pdf(document):
+    """PDF de la factura (bytes) a partir de invoice_document()."""
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(
+        buffer, pagesize=A4, title=f"Factura {document['number']}",
+        leftMargin=15 * mm, rightMargin=15 * mm, topMargin=15 * mm, bottomMargin=15 * mm,
+    )
+    normal = STYLES['Normal']
+
+    header = Table([[
+        [Paragraph(f'<font size="18" color="#2563eb"><b>{escape(COMPANY_NAME)}</b></font>', normal), Spacer(1, 4 * mm),
+         Paragraph(f"CUIT: {COMPANY_TAX_ID}", normal), Paragraph(f"Dirección: {escape(COMPANY_ADDRESS)}", normal)],
+        [Paragraph(f'<font size="14"><b>FACTURA {document["letter"]}</b></font>', normal), Spacer(1, 4 * mm),
+         Paragraph(f"<b>N°:</b> {escape(document['number'])}", normal),
+         Paragraph(f"<b>Fecha:</b> {document['date']:%d/%m/%Y}", normal)],
+    ]], colWidths=[doc.width * 0.6, doc.width * 0.4])
+    header.setStyle(TableStyle([
+        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+        ('LINEBELOW', (0, 0), (-1, 0), 1, colors.HexColor('#eeeeee')),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+    ]))
+
+    client_info = [
+        Paragraph("<b>Cliente</b>", STYLES['Heading3']),
+        Paragraph(f"<b>Nombre/Razón Social:</b> {escape(document['client_name'])}", normal),
+        Paragraph(f"<b>CUIT/DNI:</b> {escape(document['client_tax_id'] or 'Consumidor Final')}", normal),
+        Paragraph(f"<b>Email:</b> {escape(document['client_email'])}", normal),
+    ]
+
+    # Celdas de texto plano (el nombre se corta a mano con simpleSplit): una
+    # tabla de Paragraphs se vuelve a medir entera en cada salto de página
+    widths = [doc.width * w for w in (0.16, 0.40, 0.08, 0.18, 0.18)]
+    rows = [['SKU', 'Producto', 'Cant.', 'Precio Unit.', 'Subtotal']]
+    for sku, name, quantity, unit_price in document['items']:
+        rows.append([
+            sku, '\n'.join(simpleSplit(name, 'Helvetica', 9, widths[1] - 12)),
+            str(quantity), _money(unit_price), _money(unit_price * quantity),
+        ])
+    lines = Table(rows, colWidths=widths, repeatRows=1)
+    lines.setStyle(TableStyle([
+        ('FONTSIZE', (0, 0), (-1, -1), 9),
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#f8fafc')),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('TEXTCOLOR', (0, 1), (0, -1), colors.HexColor('#666666')),
+        ('LINEBELOW', (0, 0), (-1, -1), 0.5, colors.HexColor('#eeeeee')),
+        ('ALIGN', (2, 0), (-1, -1), 'RIGHT'),
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+    ]))
+
+    story = [
+        header, Spacer(1, 8 * mm), *client_info, Spacer(1, 8 * mm), lines, Spacer(1, 6 * mm),
+        Paragraph(f'<para align="right"><font size="13"><b>Total a Pagar: '
+                  f'<font color="#2563eb">{_money(document["total"])}</font></b></font></para>', normal),
+        Spacer(1, 15 * mm),
+        Paragraph('<para align="center"><font size="8" color="#888888">'
+                  'Gracias por su compra. Documento generado electrónicamente.</font></para>', normal),
+    ]
+    doc.build(story)
+    return buffer.getvalue()
 
-def generate_invoice_pdf(order_id):
+
+def invoice_items(order_id):
+    return list(
+        OrderItem.objects.filter(order_id=order_id).order_by('pk')
+        .values_list('product__sku', 'product__name', 'quantity', 'unit_price_applied')
+    )
+
+
+def _pdf_name(number):
+    return f"invoice_{number}.pdf"
+
+
+def generate_invoice_pdf(invoice):
+    """Renderiza y guarda el PDF de una factura. Retorna la factura actualizada."""
     try:
-        order = Order.objects.get(id=order_id)
-        
-        # Verificar si ya existe factura
-        if hasattr(order, 'invoice'):
-            return order.invoice
-
-        # Datos para el template
-        context = {
-            'order': order,
-            'client': order.client,
-            'items': order.items.all(),
-            'total': order.total_amount,
-            'company_name': "SaaS B2B Demo",
-            'company_tax_id': "30-12345678-9",
-            'invoice_number': f"A-{str(order.id).zfill(8)}"
-        }
-
-        # Renderizar HTML
-        html_string = render_to_string('invoice_template.html', context)
-        
-        # Generar PDF con xhtml2pdf (DISABLED FOR DEPLOYMENT)
-        # result = BytesIO()
-        # pdf = pisa.pisaDocument(BytesIO(html_string.encode("UTF-8")), result)
-        # if pdf.err:
-        #    print(f"Error generando PDF: {pdf.err}")
-        #    return None
-
-        print("PDF Generation is temporarily disabled for deployment.")
+        pdf = render_invoice_pdf(invoice_document(invoice, invoice_items(invoice.order_id)))
+        invoice.pdf_file.save(_pdf_name(invoice.number), ContentFile(pdf), save=False)
+        invoice.status = 'COMPLETED'
+        invoice.error = ''
+    except Exception as e:
+        logger.exception(f"Error generando factura {invoice.number}")
+        invoice.status = 'FAILED'
+        invoice.error = str(e)
+    invoice.rendered_at = timezone.now()
+    invoice.save(update_fields=['pdf_file', 'status', 'error', 'rendered_at'])
+    return invoice
+
+
+def _claimable():
+    return Q(status='PENDING') | Q(status='RUNNING', render_started_at__lt=timezone.now() - STALE_AFTER)
+
+
+def claim_next_invoice():
+    """Toma la próxima factura pendiente con un UPDATE condicional (varios workers no la duplican)."""
+    for pk in Invoice.objects.filter(_claimable()).order_by('pk').values_list('pk', flat=True)[:10]:
+        if Invoice.objects.filter(_claimable(), pk=pk).update(status='RUNNING', render_started_at=timezone.now()):
+            return Invoice.objects.select_related('order__client').get(pk=pk)
+    return None
+
+
+def run_next_invoice():
+    """Genera una factura pendiente. Retorna la factura o None si no hay."""
+    invoice = claim_next_invoice()
+    if invoice is None:
         return None
+    try:
+        return generate_invoice_pdf(invoice)
+    except (KeyboardInterrupt, SystemExit):
+        Invoice.objects.filter(pk=invoice.pk, status='RUNNING').update(status='PENDING')
+        raise
+
+
+# =============================================================================
+# Lotes (cierre de mes)
+
+def invoice_orders(date_from=None, date_to=None, client_id=None):
+    """Pedidos facturables del período (fechas inclusive, en hora local) y/o de un cliente."""
+    orders = Order.objects.filter(status__in=INVOICED_STATUSES)
+    if date_from:
+        orders = orders.filter(created_at__date__gte=date_from)
+    if date_to:
+        orders = orders.filter(created_at__date__lte=date_to)
+    if client_id:
+        orders = orders.filter(client_id=client_id)
+    return orders
+
 
-        # Guardar en Modelo
-        # invoice = Invoice.objects.create(...)
-        # ...
+def _batch_documents(invoices):
+    """invoice_document() de cada factura, con los ítems de cada bloque en una sola consulta."""
+    invoices = iter(invoices)
+    while True:
+        chunk = [invoice for _, invoice in zip(range(BATCH_CHUNK_SIZE), invoices)]
+        if not chunk:
+            return
+        items = {invoice.order_id: [] for invoice in chunk}
+        lines = OrderItem.objects.filter(order_id__in=list(items)).order_by('order_id', 'pk').values_list(
+            'order_id', 'product__sku', 'product__name', 'quantity', 'unit_price_applied'
+        )
+        for order_id, *line in lines:
+            items[order_id].append(tuple(line))
+        for invoice in chunk:
+            yield invoice_document(invoice, items[invoice.order_id])
 
-        return invoice
 
+def _render_document(document):
+    """Render en un proceso del pool: recibe y devuelve tipos simples, sin tocar la base."""
+    try:
+        return document['id'], document['number'], render_invoice_pdf(document), ''
     except Exception as e:
-        print(f"Error generando factura: {e}")
-        return None
+        return document['id'], document['number'], None, str(e) or e.__class__.__name__
+
+
+def generate_missing_invoices(orders):
+    """
+    Crea y renderiza las facturas que falten de `orders` (queryset de
+    pedidos). Las pendientes se toman de una vez con un UPDATE condicional
+    (las que ya está generando el worker no se duplican) y los PDFs se
+    renderizan en procesos paralelos (store/parallel.py); cada uno se guarda
+    en el storage apenas llega, así nunca hay más de unos pocos en memoria.
+
+    Retorna {'completed': n, 'failed': n}.
+    """
+    order_ids = orders.order_by().values('pk')
+    queue_invoices(order_ids)
+
+    started = timezone.now()
+    claimed = Invoice.objects.filter(_claimable(), order__in=order_ids).update(
+        status='RUNNING', render_started_at=started
+    )
+    stats = {'completed': 0, 'failed': 0}
+    if not claimed:
+        return stats
+
+    invoices = Invoice.objects.filter(
+        order__in=order_ids, status='RUNNING', render_started_at=started
+    ).select_related('order__client').order_by('pk')
+    storage = Invoice.pdf_file.field.storage
+    try:
+        with process_pool(claimed, min_items=PARALLEL_MIN_INVOICES) as pool:
+            documents = _batch_documents(invoices.iterator(chunk_size=BATCH_CHUNK_SIZE))
+            for pk, number, pdf, error in ordered_imap(_render_document, documents, pool):
+                fields = {'rendered_at': timezone.now()}
+                if pdf is None:
+                    logger.error(f"Error generando factura {number}: {error}")
+                    fields.update(status='FAILED', error=error)
+                else:
+                    name = Invoice.pdf_file.field.generate_filename(None, _pdf_name(number))
+                    fields.update(status='COMPLETED', error='', pdf_file=storage.save(name, ContentFile(pdf)))
+                Invoice.objects.filter(pk=pk).update(**fields)
+                stats['completed' if pdf is not None else 'failed'] += 1
+    except (KeyboardInterrupt, SystemExit):
+        invoices.update(status='PENDING')
+        raise
+    return stats
+
+
+class _ZipStream:
+    """Destino de escritura sin seek para zipfile: acumula lo escrito hasta que se retira."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def pop(self):
+        data = b''.join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def iter_invoices_zip(invoices):
+    """
+    ZIP de los PDFs de `invoices` (queryset) como generador de bytes para
+    StreamingHttpResponse: cada PDF se copia desde el storage en bloques de
+    ZIP_BLOCK_SIZE y el ZIP se escribe en modo streaming (sin seek), así en
+    memoria hay a lo sumo un bloque. Los PDFs ya vienen comprimidos y se
+    guardan sin volver a comprimir. Las facturas fallidas se listan en
+    errores.txt.
+    """
+    stream = _ZipStream()
+    failed = []
+    with zipfile.ZipFile(stream, 'w', zipfile.ZIP_STORED) as archive:
+        for invoice in invoices.select_related('order').order_by('number').iterator():
+            if invoice.status != 'COMPLETED' or not invoice.pdf_file:
+                failed.append(f"{invoice.number}: {invoice.error or invoice.status}")
+                continue
+            info = zipfile.ZipInfo(
+                f"{invoice.number}.pdf", timezone.localtime(invoice.order.created_at).timetuple()[:6]
+            )
+            with invoice.pdf_file.open('rb') as source, archive.open(info, 'w') as target:
+                for block in iter(lambda: source.read(ZIP_BLOCK_SIZE), b''):
+                    target.write(block)
+                    yield stream.pop()
+            yield stream.pop()
+        if failed:
+            archive.writestr('errores.txt', '\n'.join(failed) + '\n')
+    yield stream.pop()
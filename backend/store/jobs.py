@@ -0,0 +1,372 @@
+"""
+Jobs de importación en segundo plano.
+
+La vista guarda el archivo en un ImportJob (PENDING) y responde enseguida; el
+worker (`manage.py run_import_worker`) toma los jobs pendientes, corre el
+importador y va registrando progreso, stats y errores en la base.
+
+Cada bloque escrito guarda su checkpoint en la misma transacción que los
+datos. Si el worker muere (deploy, OOM), el job queda RUNNING sin heartbeat y
+otro worker lo retoma desde el último bloque confirmado.
+
+El heartbeat lo renueva un hilo aparte mientras corre el importador, así las
+fases largas sin checkpoint no hacen parecer interrumpido a un job vivo.
+Todas las escrituras del job se filtran por el worker que lo tomó: si otro lo
+retomó igual, el primero deja de escribir (JobLost) y su bloque en curso se
+revierte.
+
+Previsualización -> confirm: el preview guarda las filas validadas en un
+ImportStaging (clave: hash del contenido) y el confirm encola un job que
+aplica ese staging por id, sin volver a subir ni parsear el archivo.
+"""
+import hashlib
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from contextlib import closing
+from datetime import timedelta
+from io import BytesIO
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .importer import CategoryImporter, ClientImporter, ProductImporter
+from .models import ImportJob, ImportStaging
+
+logger = logging.getLogger(__name__)
+
+# Un job RUNNING sin heartbeat en este lapso se considera interrumpido
+STALE_AFTER = timedelta(minutes=5)
+# Cada cuánto renueva el heartbeat el hilo de un job en curso (bastante menos que STALE_AFTER)
+HEARTBEAT_INTERVAL = timedelta(seconds=60)
+MAX_ATTEMPTS = 3
+# Vigencia de una previsualización (segundos)
+STAGING_TTL = timedelta(seconds=getattr(settings, 'IMPORT_STAGING_TTL', 3600))
+# Duración máxima de un stream de progreso: después se pide reconectar, así
+# un job largo no retiene un worker de gunicorn
+EVENTS_MAX_DURATION = timedelta(seconds=25)
+
+
+class StagingError(Exception):
+    """Previsualización inexistente, vencida o ya confirmada (`status` = código HTTP)."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+class JobLost(Exception):
+    """Otro worker retomó el job (lo dio por interrumpido): este ya no puede escribirlo."""
+
+
+def worker_name():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def create_import_job(kind, upload, user=None, options=None):
+    """Encola una importación guardando el archivo subido en la base."""
+    return ImportJob.objects.create(
+        kind=kind,
+        created_by=user if user is not None and user.is_authenticated else None,
+        file_name=upload.name,
+        file_data=upload.read(),
+        options=options or {},
+    )
+
+
+def content_hash(upload):
+    """SHA-256 del archivo subido (lo deja rebobinado para leerlo de nuevo)."""
+    digest = hashlib.sha256()
+    for chunk in upload.chunks():
+        digest.update(chunk)
+    upload.seek(0)
+    return digest.hexdigest()
+
+
+def purge_expired_stagings():
+    """Borra previsualizaciones vencidas que no tengan un job en curso."""
+    ImportStaging.objects.filter(expires_at__lt=timezone.now()).exclude(
+        job__status__in=['PENDING', 'RUNNING']
+    ).delete()
+
+
+def _owner(user):
+    return user if user is not None and user.is_authenticated else None
+
+
+def create_staging(kind, upload, user=None):
+    """
+    Crea el staging de una previsualización. Cada usuario tiene el suyo: si
+    el mismo usuario ya había previsualizado el archivo, su staging anterior
+    se reemplaza (se re-valida contra la base actual), salvo que su confirm
+    esté en curso. Las previsualizaciones de otros usuarios no se tocan.
+    """
+    purge_expired_stagings()
+    digest = content_hash(upload)
+    previous = ImportStaging.objects.filter(
+        kind=kind, content_hash=digest, created_by=_owner(user)
+    ).select_related('job').first()
+    if previous is not None:
+        if previous.job is not None and not previous.job.is_finished:
+            raise StagingError('Ya hay una importación en curso para este archivo.', status=409)
+        previous.delete()
+
+    return ImportStaging.objects.create(
+        kind=kind,
+        content_hash=digest,
+        file_name=upload.name,
+        created_by=_owner(user),
+        expires_at=timezone.now() + STAGING_TTL,
+    )
+
+
+def confirm_staging(kind, digest, user=None, options=None):
+    """
+    Encola el job que aplica una previsualización propia de `user` (no se
+    puede confirmar la de otro usuario). Cada staging se confirma una sola vez.
+    """
+    staging = ImportStaging.objects.filter(kind=kind, content_hash=digest, created_by=_owner(user)).first()
+    if staging is None:
+        raise StagingError('No se encontró la previsualización. Vuelva a analizar el archivo.', status=404)
+    if staging.expires_at < timezone.now():
+        raise StagingError('La previsualización venció. Vuelva a analizar el archivo.', status=410)
+    if staging.status != 'STAGED':
+        raise StagingError('La previsualización no está lista o ya fue confirmada.', status=409)
+
+    job = ImportJob.objects.create(
+        kind=kind,
+        created_by=_owner(user),
+        file_name=staging.file_name,
+        file_data=b'',
+        options={**(options or {}), 'staging_id': staging.pk},
+    )
+    # UPDATE condicional: dos confirms simultáneos no pueden encolar dos jobs
+    if not ImportStaging.objects.filter(pk=staging.pk, status='STAGED').update(status='CONFIRMED', job=job):
+        job.delete()
+        raise StagingError('La previsualización ya fue confirmada.', status=409)
+    return job
+
+
+def _claimable():
+    stale = timezone.now() - STALE_AFTER
+    return Q(status='PENDING') | Q(status='RUNNING', heartbeat_at__lt=stale)
+
+
+def claim_next_job(worker=None):
+    """
+    Toma el próximo job pendiente (o interrumpido) con un UPDATE condicional,
+    así dos workers nunca toman el mismo job. Retorna None si no hay ninguno.
+    """
+    now = timezone.now()
+    # Jobs que ya tiraron abajo al worker varias veces: no reintentar para siempre
+    ImportJob.objects.filter(
+        status='RUNNING', heartbeat_at__lt=now - STALE_AFTER, attempts__gte=MAX_ATTEMPTS
+    ).update(status='FAILED', error='Interrumpido demasiadas veces', finished_at=now)
+
+    candidates = ImportJob.objects.filter(_claimable()).order_by('created_at').values_list('id', flat=True)[:10]
+    for pk in candidates:
+        claimed = ImportJob.objects.filter(_claimable(), pk=pk).update(
+            status='RUNNING',
+            worker=worker or worker_name(),
+            heartbeat_at=now,
+            attempts=F('attempts') + 1,
+        )
+        if claimed:
+            job = ImportJob.objects.get(pk=pk)
+            if job.started_at is None:
+                job.started_at = now
+                job.save(update_fields=['started_at'])
+            return job
+    return None
+
+
+def release_job(job):
+    """Devuelve un job RUNNING a PENDING (apagado ordenado del worker) para retomarlo enseguida."""
+    _owned(job).filter(status='RUNNING').update(status='PENDING', worker='')
+
+
+def _owned(job):
+    """El job, mientras siga siendo del worker que lo tomó."""
+    return ImportJob.objects.filter(pk=job.pk, worker=job.worker)
+
+
+def _update(job, **fields):
+    fields['heartbeat_at'] = timezone.now()
+    if not _owned(job).update(**fields):
+        raise JobLost(f"La importación #{job.pk} la retomó otro worker")
+
+
+class _Heartbeat:
+    """
+    Renueva heartbeat_at del job cada HEARTBEAT_INTERVAL desde un hilo propio
+    (con su propia conexión, en autocommit), independiente del importador:
+    el merge del COPY, el árbol de categorías o un lote grande de contraseñas
+    pueden tardar más que STALE_AFTER sin pasar por un checkpoint.
+    """
+
+    def __init__(self, job, interval=None):
+        self.job = job
+        self.interval = (interval or HEARTBEAT_INTERVAL).total_seconds()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f'heartbeat-import-{job.pk}', daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        try:
+            while not self._stop.wait(self.interval):
+                try:
+                    if not _owned(self.job).update(heartbeat_at=timezone.now()):
+                        return  # Lo retomó otro worker: la próxima escritura del job lo detecta
+                except Exception:
+                    logger.exception(f"Error renovando el heartbeat de la importación #{self.job.pk}")
+        finally:
+            connection.close()
+
+
+def run_import_job(job):
+    """
+    Ejecuta un job ya tomado por claim_next_job(). El checkpoint se escribe
+    dentro de la transacción de cada bloque del importador.
+    """
+    upload = BytesIO(bytes(job.file_data))
+    upload.name = job.file_name
+    resume = job.state or None
+    if resume:
+        logger.info(f"Retomando importación #{job.pk} desde la fila {resume['last_row']}")
+
+    def checkpoint(state):
+        _update(job, state=state, processed_rows=state['processed'], total_rows=state['total'])
+
+    try:
+        with _Heartbeat(job):
+            result = _run_importer(job, upload, resume, checkpoint)
+    except JobLost:
+        logger.warning(f"Importación #{job.pk}: la retomó otro worker, se descarta esta ejecución")
+        job.refresh_from_db()
+        return job
+    except Exception as e:
+        logger.exception(f"Error en importación #{job.pk}")
+        result = {'success': False, 'error': str(e)}
+
+    now = timezone.now()
+    try:
+        if result and result.get('success'):
+            # El archivo y el staging ya no hacen falta (no se va a retomar)
+            _update(job, status='COMPLETED', result=result, error='', file_data=b'', finished_at=now)
+            ImportStaging.objects.filter(job=job).delete()
+        else:
+            # Se conserva archivo y checkpoint: un reintento retoma desde el último bloque
+            _update(job, status='FAILED', result=result, error=(result or {}).get('error', 'Error desconocido'), finished_at=now)
+    except JobLost:
+        # El importador atrapa sus errores: el JobLost de un checkpoint llega acá como resultado fallido
+        logger.warning(f"Importación #{job.pk}: la retomó otro worker, se descarta este resultado")
+    job.refresh_from_db()
+    return job
+
+
+def _run_importer(job, upload, resume, checkpoint):
+    """Corre el importador del job y retorna su resultado."""
+    if job.kind == 'CLIENTS':
+        result = None
+        staging_id = job.options.get('staging_id')
+        if staging_id:
+            # Confirm de una previsualización: se aplican las filas guardadas
+            events = ClientImporter(None).apply_staged(
+                ImportStaging.objects.get(pk=staging_id),
+                update_passwords=job.options.get('update_passwords', False),
+                resume=resume,
+                checkpoint=checkpoint,
+            )
+        else:
+            events = ClientImporter(upload)._iter_events(
+                dry_run=False,
+                update_passwords=job.options.get('update_passwords', False),
+                resume=resume,
+                checkpoint=checkpoint,
+            )
+        # closing(): si una escritura del job falla, el generador se cierra ya (revierte su bloque en curso)
+        with closing(events):
+            for event in events:
+                if event['type'] == 'start':
+                    _update(job, total_rows=event['total'])
+                elif event['type'] == 'progress':
+                    fields = {'progress': event}
+                    if event.get('stage') != 'hashing':
+                        fields.update(processed_rows=event['current'], total_rows=event['total'])
+                    _update(job, **fields)
+                elif event['type'] == 'result':
+                    result = event['data']
+                elif event['type'] == 'error':
+                    result = {'success': False, 'error': event['message']}
+    else:
+        importer_class = ProductImporter if job.kind == 'PRODUCTS' else CategoryImporter
+        result = importer_class(upload).process(dry_run=False, resume=resume, checkpoint=checkpoint)
+    return result
+
+
+def run_next_job(worker=None):
+    """Toma y ejecuta un job. Retorna el job procesado o None si la cola está vacía."""
+    job = claim_next_job(worker)
+    if job is None:
+        return None
+    try:
+        return run_import_job(job)
+    except (KeyboardInterrupt, SystemExit):
+        release_job(job)
+        raise
+
+
+def retry_job(job):
+    """Reencola un job fallido; conserva el checkpoint para retomar desde el último bloque."""
+    return ImportJob.objects.filter(pk=job.pk, status='FAILED').update(
+        status='PENDING', error='', result=None, finished_at=None, attempts=0
+    )
+
+
+def iter_job_events(job_id, poll_interval=1.0, max_duration=EVENTS_MAX_DURATION):
+    """
+    Eventos NDJSON del job (mismo formato que el importador en streaming) leyendo
+    el estado persistido. Cortar la conexión no afecta al job.
+
+    Si el job sigue en curso después de `max_duration`, el stream termina con
+    {'type': 'reconnect'}: el cliente vuelve a pedir /events/ (o consulta el
+    job con GET) y retoma desde el estado actual.
+    """
+    deadline = time.monotonic() + max_duration.total_seconds()
+    sent = None
+    yield_start = True
+    while True:
+        job = ImportJob.objects.defer('file_data').get(pk=job_id)
+        if yield_start:
+            yield json.dumps({'type': 'start', 'total': job.total_rows, 'job': job.pk}) + "\n"
+            yield_start = False
+
+        snapshot = (job.processed_rows, job.total_rows, json.dumps(job.progress, sort_keys=True))
+        if snapshot != sent:
+            sent = snapshot
+            if job.progress.get('stage') == 'hashing':
+                yield json.dumps(job.progress) + "\n"
+            yield json.dumps({'type': 'progress', 'current': job.processed_rows, 'total': job.total_rows}) + "\n"
+
+        if job.status == 'COMPLETED':
+            yield json.dumps({'type': 'result', 'data': job.result}) + "\n"
+            return
+        if job.status == 'FAILED':
+            yield json.dumps({'type': 'error', 'message': job.error}) + "\n"
+            return
+        if time.monotonic() >= deadline:
+            yield json.dumps({'type': 'reconnect', 'job': job.pk, 'status': job.status}) + "\n"
+            return
+        time.sleep(poll_interval)
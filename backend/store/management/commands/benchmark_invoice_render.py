@@ -0,0 +1,81 @@
+"""
+Benchmark de generación de facturas PDF (facturas/seg).
+
+Crea N pedidos sintéticos de M líneas y mide, por separado:
+  - render: solo reportlab (render_invoice_pdf, sin base ni storage)
+  - completo: el ciclo del worker (claim + ítems + render + guardar en el storage)
+
+Todo corre dentro de una transacción que se revierte al final; los PDFs se
+guardan en un MEDIA_ROOT temporal que se borra al terminar.
+
+Usage: python manage.py benchmark_invoice_render --invoices 200 --items 20
+"""
+import tempfile
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test.utils import override_settings
+
+from store.invoicing import invoice_document, invoice_items, queue_invoices, render_invoice_pdf, run_next_invoice
+from store.models import CustomUser, Invoice, Order, OrderItem, Product
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Mide facturas/seg de la generación de PDFs (reportlab)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--invoices', type=int, default=200, help='Cantidad de facturas')
+        parser.add_argument('--items', type=int, default=20, help='Líneas por factura')
+
+    def _build_orders(self, invoices, items):
+        client = CustomUser.objects.create(username='bench-invoice', company_name='Cliente Benchmark SA')
+        products = Product.objects.bulk_create([
+            Product(sku=f'BENCH-INV-{i:05d}', name=f'Producto de prueba {i}', base_price=Decimal('1234.50'))
+            for i in range(items)
+        ])
+        orders = Order.objects.bulk_create([
+            Order(client=client, status='CONFIRMED', total_amount=Decimal('1234.50') * items * 2)
+            for _ in range(invoices)
+        ])
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=product, quantity=2, unit_price_applied=Decimal('1234.50'))
+            for order in orders for product in products
+        ], batch_size=2000)
+        queue_invoices([order.pk for order in orders])
+
+    def _report(self, label, count, elapsed, size=None):
+        line = f'  {label:<10} {elapsed:8.2f}s  {count / elapsed:8.1f} facturas/seg'
+        if size is not None:
+            line += f'  ({size / 1024:.1f} KB por PDF)'
+        self.stdout.write(line)
+
+    def handle(self, *args, **options):
+        invoices, items = options['invoices'], options['items']
+        self.stdout.write(f'Benchmark facturas PDF: {invoices} facturas de {items} líneas')
+
+        with tempfile.TemporaryDirectory() as media, override_settings(MEDIA_ROOT=media):
+            try:
+                with transaction.atomic():
+                    self._build_orders(invoices, items)
+                    pending = list(Invoice.objects.select_related('order__client').filter(status='PENDING'))
+
+                    start = time.perf_counter()
+                    size = 0
+                    for invoice in pending:
+                        size = len(render_invoice_pdf(invoice_document(invoice, invoice_items(invoice.order_id))))
+                    self._report('render', len(pending), time.perf_counter() - start, size)
+
+                    start = time.perf_counter()
+                    done = 0
+                    while run_next_invoice() is not None:
+                        done += 1
+                    self._report('completo', done, time.perf_counter() - start)
+                    raise _Rollback()
+            except _Rollback:
+                pass
@@ -0,0 +1,113 @@
+"""
+Benchmark del importador de productos (filas/seg).
+
+Genera un Excel sintético de N filas y mide:
+  - legacy: un update_or_create por fila (comportamiento anterior)
+  - set-based: ProductImporter.process (INSERT ... ON CONFLICT por lotes)
+
+Cada corrida se ejecuta dos veces (alta inicial + re-import de actualización)
+dentro de una transacción que se revierte al final, sin dejar datos.
+
+Con --workers 1,2,4 el modo set-based se repite con esa cantidad de procesos
+para el parseo (PARALLEL_WORKERS), para ver cómo escala con los núcleos.
+
+Usage: python manage.py benchmark_product_import --rows 20000 [--format csv] [--workers 1,2,4]
+"""
+import csv
+import time
+from unittest import mock
+from io import BytesIO, StringIO
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test.utils import override_settings
+from openpyxl import Workbook
+
+from store.importer import ProductImporter
+from store.models import Product
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Mide filas/seg del importador de productos (legacy vs set-based)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000, help='Cantidad de filas del archivo sintético')
+        parser.add_argument('--skip-legacy', action='store_true', help='No correr el modo legacy (lento)')
+        parser.add_argument('--format', choices=['xlsx', 'csv'], default='xlsx', help='Formato del archivo sintético')
+        parser.add_argument('--workers', default='', help='Procesos de parseo a comparar, ej: 1,2,4')
+
+    def _build_file(self, rows, price_offset=0, file_format='xlsx'):
+        header = ['SKU', 'Nombre', 'Precio', 'Stock', 'Marca', 'Categoria', 'Descripcion']
+        data = (
+            [f'BENCH-{i:07d}', f'Producto {i}', 100 + i % 50 + price_offset, i % 300, f'Marca {i % 20}', '', '']
+            for i in range(rows)
+        )
+        if file_format == 'csv':
+            text = StringIO()
+            writer = csv.writer(text)
+            writer.writerow(header)
+            writer.writerows(data)
+            output = BytesIO(text.getvalue().encode())
+        else:
+            wb = Workbook(write_only=True)
+            ws = wb.create_sheet('Productos')
+            ws.append(header)
+            for row in data:
+                ws.append(row)
+            output = BytesIO()
+            wb.save(output)
+        output.seek(0)
+        output.name = f'bench.{file_format}'
+        return output
+
+    def _legacy(self, rows):
+        for i in range(rows):
+            Product.objects.update_or_create(
+                sku=f'BENCH-{i:07d}',
+                defaults={'name': f'Producto {i}', 'base_price': 100 + i % 50, 'stock': i % 300, 'brand': f'Marca {i % 20}'},
+            )
+
+    def _run(self, label, rows, func):
+        timings = []
+        try:
+            with transaction.atomic():
+                for step in ('alta', 'actualización'):
+                    start = time.perf_counter()
+                    func(step)
+                    elapsed = time.perf_counter() - start
+                    timings.append(elapsed)
+                    self.stdout.write(f'  {label:<10} {step:<14} {elapsed:8.2f}s  {rows / elapsed:10.0f} filas/seg')
+                raise _Rollback()
+        except _Rollback:
+            pass
+        return sum(timings)
+
+    def handle(self, *args, **options):
+        rows = options['rows']
+        self.stdout.write(f'Benchmark importador de productos: {rows} filas')
+
+        files = {
+            'alta': self._build_file(rows, file_format=options['format']),
+            'actualización': self._build_file(rows, price_offset=1, file_format=options['format']),
+        }
+
+        def set_based(step):
+            files[step].seek(0)
+            result = ProductImporter(files[step]).process(dry_run=False)
+            if not result.get('success'):
+                raise RuntimeError(result.get('error'))
+
+        total_new = self._run('set-based', rows, set_based)
+
+        for workers in filter(None, options['workers'].split(',')):
+            with override_settings(PARALLEL_WORKERS=int(workers)), \
+                    mock.patch.object(ProductImporter, 'PARALLEL_PARSE_MIN', 1):
+                self._run(f'{workers} proc', rows, set_based)
+
+        if not options['skip_legacy']:
+            total_legacy = self._run('legacy', rows, lambda step: self._legacy(rows))
+            self.stdout.write(self.style.SUCCESS(f'Mejora: x{total_legacy / total_new:.1f} más rápido'))
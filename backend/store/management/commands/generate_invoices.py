@@ -0,0 +1,52 @@
+"""
+Genera las facturas que falten de un período y/o cliente (cierre de mes) y,
+opcionalmente, las guarda todas en un ZIP.
+
+Los PDFs se renderizan en procesos paralelos (PARALLEL_WORKERS o los núcleos
+disponibles); el ZIP se escribe en streaming, sin cargar los PDFs en memoria.
+
+Usage: python manage.py generate_invoices --from 2026-09-01 --to 2026-09-30 [--client 12] [--zip facturas.zip]
+"""
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from store.invoicing import generate_missing_invoices, invoice_orders, iter_invoices_zip
+from store.models import Invoice
+
+
+def _date(value):
+    try:
+        parsed = parse_date(value)
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise CommandError(f'Fecha inválida: {value} (YYYY-MM-DD)')
+    return parsed
+
+
+class Command(BaseCommand):
+    help = 'Genera las facturas faltantes de un período/cliente y opcionalmente las guarda en un ZIP'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='date_from', type=_date, help='Desde (YYYY-MM-DD, inclusive)')
+        parser.add_argument('--to', dest='date_to', type=_date, help='Hasta (YYYY-MM-DD, inclusive)')
+        parser.add_argument('--client', type=int, help='Id del cliente')
+        parser.add_argument('--zip', dest='zip_path', help='Archivo ZIP de salida con todas las facturas')
+
+    def handle(self, *args, **options):
+        orders = invoice_orders(options['date_from'], options['date_to'], options['client'])
+        total = orders.count()
+        if not total:
+            self.stdout.write(self.style.WARNING('No hay pedidos facturados con esos filtros'))
+            return
+
+        self.stdout.write(f'{total} pedidos facturados; generando las facturas faltantes...')
+        stats = generate_missing_invoices(orders)
+        self.stdout.write(f"  generadas: {stats['completed']}  con error: {stats['failed']}")
+
+        if options['zip_path']:
+            invoices = Invoice.objects.filter(order__in=orders.order_by().values('pk'))
+            with open(options['zip_path'], 'wb') as output:
+                for chunk in iter_invoices_zip(invoices):
+                    output.write(chunk)
+            self.stdout.write(self.style.SUCCESS(f"ZIP guardado en {options['zip_path']}"))
@@ -0,0 +1,59 @@
+"""
+Worker de importaciones, exportaciones y facturas en segundo plano.
+
+Toma ImportJobs, ExportArtifacts y facturas pendientes (o interrumpidos) de
+la base y los ejecuta. Se pueden correr varios en paralelo: cada uno se toma con un
+UPDATE condicional.
+
+Usage:
+    python manage.py run_import_worker            # loop infinito (Procfile: worker)
+    python manage.py run_import_worker --once     # procesa la cola y termina
+"""
+import signal
+import sys
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from store.exports import purge_export_artifacts, run_next_export
+from store.invoicing import run_next_invoice
+from store.jobs import purge_expired_stagings, run_next_job, worker_name
+
+
+class Command(BaseCommand):
+    help = 'Ejecuta las importaciones (clientes, productos, categorías), exportaciones y facturas encoladas'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Procesar los jobs pendientes y terminar')
+        parser.add_argument('--poll-interval', type=float, default=2.0, help='Segundos entre consultas a la cola')
+
+    def handle(self, *args, **options):
+        # SIGTERM (deploy/restart) -> SystemExit: el job en curso vuelve a PENDING
+        # y su último bloque confirmado queda como punto de retome.
+        signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+        worker = worker_name()
+        self.stdout.write(f'Worker de importaciones iniciado ({worker})')
+
+        while True:
+            close_old_connections()
+            job = run_next_job(worker)
+            if job is not None:
+                style = self.style.SUCCESS if job.status == 'COMPLETED' else self.style.ERROR
+                self.stdout.write(style(f'Importación #{job.pk} ({job.kind}): {job.status} {job.error}'.rstrip()))
+                continue
+            export = run_next_export(worker)
+            if export is not None:
+                style = self.style.SUCCESS if export.status == 'COMPLETED' else self.style.ERROR
+                self.stdout.write(style(f'Exportación #{export.pk} ({export.export_type}.{export.format}): {export.status} {export.error}'.rstrip()))
+                continue
+            invoice = run_next_invoice()
+            if invoice is not None:
+                style = self.style.SUCCESS if invoice.status == 'COMPLETED' else self.style.ERROR
+                self.stdout.write(style(f'Factura {invoice.number}: {invoice.status} {invoice.error}'.rstrip()))
+                continue
+            if options['once']:
+                break
+            purge_expired_stagings()
+            purge_export_artifacts()
+            time.sleep(options['poll_interval'])
@@ -0,0 +1,98 @@
+"""
+Prueba de carga de la numeración de facturas (invoicing.allocate_invoice_numbers).
+
+Varios hilos, cada uno con su propia conexión, reservan números de la misma
+serie a la vez (lotes de 1 a --batch números); una de cada --rollback-every
+transacciones se revierte a propósito. Al final verifica que los números
+confirmados sean únicos y correlativos, sin huecos, y que la serie quede en
+el último entregado.
+
+Usa un punto de venta propio (--point-of-sale) que se borra al terminar.
+Pensado para correr contra la base de producción (PostgreSQL), donde las
+transacciones realmente compiten por la fila de la serie.
+
+Usage: python manage.py stress_invoice_numbering --threads 16 --allocations 200
+"""
+import random
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from store.invoicing import allocate_invoice_numbers
+from store.models import InvoiceSequence
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Reserva números de factura en paralelo y verifica que no haya huecos ni duplicados'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8, help='Hilos concurrentes')
+        parser.add_argument('--allocations', type=int, default=100, help='Reservas por hilo')
+        parser.add_argument('--batch', type=int, default=3, help='Máximo de números por reserva')
+        parser.add_argument('--rollback-every', type=int, default=7, help='Una de cada N transacciones se revierte')
+        parser.add_argument('--point-of-sale', type=int, default=9999, help='Punto de venta de la prueba')
+        parser.add_argument('--letter', default='A')
+
+    def _work(self, options, seed, committed, errors, start):
+        rng = random.Random(seed)
+        try:
+            start.wait()
+            for i in range(options['allocations']):
+                count = rng.randint(1, options['batch'])
+                try:
+                    with transaction.atomic():
+                        numbers = allocate_invoice_numbers(options['letter'], count, options['point_of_sale'])
+                        if options['rollback_every'] and i % options['rollback_every'] == 0:
+                            raise _Rollback()
+                except _Rollback:
+                    continue
+                committed.extend(numbers)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            connection.close()
+
+    def handle(self, *args, **options):
+        pos, letter = options['point_of_sale'], options['letter']
+        series = InvoiceSequence.objects.filter(point_of_sale=pos, letter=letter)
+        if series.exists():
+            raise CommandError(f'La serie {letter}-{pos:04d} ya existe; usá otro --point-of-sale')
+
+        committed, errors = [], []
+        start = threading.Barrier(options['threads'] + 1)
+        threads = [
+            threading.Thread(target=self._work, args=(options, seed, committed, errors, start))
+            for seed in range(options['threads'])
+        ]
+        for thread in threads:
+            thread.start()
+        start.wait()
+        began = time.perf_counter()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - began
+
+        try:
+            last = series.values_list('last_number', flat=True).first() or 0
+        finally:
+            series.delete()
+
+        if errors:
+            raise CommandError(f'{len(errors)} hilos fallaron: {errors[0]!r}')
+        numbers = sorted(committed)
+        if len(set(numbers)) != len(numbers):
+            raise CommandError('Números duplicados')
+        if numbers != list(range(1, last + 1)):
+            missing = sorted(set(range(1, last + 1)) - set(numbers))
+            raise CommandError(f'Huecos en la numeración: {missing[:10]} (último {last})')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(numbers)} números correlativos sin huecos ni duplicados, '
+            f"{options['threads']} hilos en {elapsed:.2f}s ({len(numbers) / elapsed:.0f} números/seg)"
+        ))
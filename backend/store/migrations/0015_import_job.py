@@ -0,0 +1,42 @@
+# Generated by Django 6.0.1 on 2026-10-19 00:50
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0014_order_search_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('CLIENTS', 'Clientes'), ('PRODUCTS', 'Productos'), ('CATEGORIES', 'Categorías')], max_length=20)),
+                ('status', models.CharField(choices=[('PENDING', 'Pendiente'), ('RUNNING', 'En proceso'), ('COMPLETED', 'Completado'), ('FAILED', 'Fallido')], db_index=True, default='PENDING', max_length=20)),
+                ('file_name', models.CharField(max_length=255)),
+                ('file_data', models.BinaryField()),
+                ('options', models.JSONField(blank=True, default=dict, help_text="Ej: {'update_passwords': true}")),
+                ('total_rows', models.IntegerField(default=0)),
+                ('processed_rows', models.IntegerField(default=0)),
+                ('progress', models.JSONField(blank=True, default=dict, help_text='Último evento de progreso')),
+                ('state', models.JSONField(blank=True, default=dict, help_text='Checkpoint del último bloque confirmado')),
+                ('result', models.JSONField(blank=True, null=True)),
+                ('error', models.TextField(blank=True)),
+                ('attempts', models.IntegerField(default=0)),
+                ('worker', models.CharField(blank=True, max_length=100)),
+                ('heartbeat_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='import_jobs', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
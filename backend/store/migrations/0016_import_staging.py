@@ -0,0 +1,50 @@
+# Generated by Django 6.0.1 on 2026-10-19 00:54
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0015_import_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportStaging',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('CLIENTS', 'Clientes'), ('PRODUCTS', 'Productos'), ('CATEGORIES', 'Categorías')], default='CLIENTS', max_length=20)),
+                ('content_hash', models.CharField(help_text='SHA-256 del archivo', max_length=64)),
+                ('file_name', models.CharField(max_length=255)),
+                ('status', models.CharField(choices=[('PARSING', 'Analizando'), ('STAGED', 'Listo para confirmar'), ('CONFIRMED', 'Confirmado')], default='PARSING', max_length=20)),
+                ('result', models.JSONField(blank=True, help_text='Resultado de la previsualización (stats, errores)', null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('expires_at', models.DateTimeField(db_index=True)),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='import_stagings', to=settings.AUTH_USER_MODEL)),
+                ('job', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='stagings', to='store.importjob')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ImportStagingRow',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('row_number', models.IntegerField()),
+                ('key', models.CharField(help_text='Usuario (clientes) o SKU (productos)', max_length=150)),
+                ('action', models.CharField(choices=[('CREATE', 'Crear'), ('UPDATE', 'Actualizar')], max_length=10)),
+                ('target_id', models.BigIntegerField(blank=True, null=True)),
+                ('target_fingerprint', models.CharField(blank=True, max_length=40)),
+                ('data', models.JSONField()),
+                ('staging', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rows', to='store.importstaging')),
+            ],
+            options={
+                'ordering': ['id'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='importstaging',
+            constraint=models.UniqueConstraint(fields=('kind', 'content_hash'), name='unique_staging_per_content'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 6.0.1 on 2026-10-19 01:31
+
+from django.db import migrations, models
+
+
+def mark_rendered(apps, schema_editor):
+    # Las facturas que ya tienen PDF no vuelven a la cola del worker
+    Invoice = apps.get_model('store', 'Invoice')
+    Invoice.objects.exclude(pdf_file='').exclude(pdf_file__isnull=True).update(status='COMPLETED')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0017_export_artifacts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='invoice',
+            name='error',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='invoice',
+            name='render_started_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='invoice',
+            name='rendered_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='invoice',
+            name='status',
+            field=models.CharField(choices=[('PENDING', 'Pendiente'), ('RUNNING', 'Generando'), ('COMPLETED', 'Generada'), ('FAILED', 'Fallida')], db_index=True, default='PENDING', max_length=20),
+        ),
+        migrations.RunPython(mark_rendered, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,88 @@
+# Generated by Django 6.0.1 on 2026-10-19 03:12
+
+from django.conf import settings
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+FIELDS = ['point_of_sale', 'letter', 'sequence', 'number', 'status']
+
+
+def number_existing_invoices(apps, schema_editor):
+    # Cada factura anterior se asigna a la serie que le corresponde como hace
+    # allocate_invoice_numbers: punto de venta de settings y letra según la
+    # condición de IVA del cliente (invoicing.invoice_letter). Dentro de cada
+    # serie se numeran 1..n por antigüedad y la serie sigue desde n, sin huecos.
+    # El número impreso (antes A-{id de pedido}) se reescribe con el formato de
+    # las series (invoicing.invoice_number) y el PDF vuelve a la cola del worker
+    # para que muestre el número nuevo.
+    Invoice = apps.get_model('store', 'Invoice')
+    InvoiceSequence = apps.get_model('store', 'InvoiceSequence')
+    point_of_sale = settings.INVOICE_POINT_OF_SALE
+
+    last = {}
+    pending = []
+    invoices = Invoice.objects.order_by('created_at', 'pk').values_list('pk', 'order__client__iva_condition')
+    for pk, iva_condition in invoices.iterator(chunk_size=BATCH_SIZE):
+        letter = 'A' if iva_condition == 'RI' else 'B'
+        last[letter] = last.get(letter, 0) + 1
+        pending.append(Invoice(
+            pk=pk, point_of_sale=point_of_sale, letter=letter, sequence=last[letter],
+            number=f"{letter}-{point_of_sale:04d}-{last[letter]:08d}", status='PENDING',
+        ))
+        if len(pending) >= BATCH_SIZE:
+            Invoice.objects.bulk_update(pending, FIELDS)
+            pending = []
+    Invoice.objects.bulk_update(pending, FIELDS)
+
+    InvoiceSequence.objects.bulk_create([
+        InvoiceSequence(point_of_sale=point_of_sale, letter=letter, last_number=count)
+        for letter, count in sorted(last.items())
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0018_invoice_render_status'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InvoiceSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('point_of_sale', models.PositiveIntegerField()),
+                ('letter', models.CharField(max_length=1)),
+                ('last_number', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('point_of_sale', 'letter'), name='unique_invoice_sequence')],
+            },
+        ),
+        migrations.AddField(
+            model_name='invoice',
+            name='point_of_sale',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name='invoice',
+            name='letter',
+            field=models.CharField(default='A', max_length=1),
+        ),
+        migrations.AddField(
+            model_name='invoice',
+            name='sequence',
+            field=models.PositiveIntegerField(null=True),
+        ),
+        migrations.RunPython(number_existing_invoices, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='invoice',
+            name='sequence',
+            field=models.PositiveIntegerField(),
+        ),
+        migrations.AddConstraint(
+            model_name='invoice',
+            constraint=models.UniqueConstraint(fields=('point_of_sale', 'letter', 'sequence'), name='unique_invoice_sequence_number'),
+        ),
+    ]
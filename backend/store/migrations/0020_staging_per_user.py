@@ -0,0 +1,21 @@
+# Generated by Django 6.0.1 on 2026-10-19 04:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0019_invoice_sequences'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='importstaging',
+            name='unique_staging_per_content',
+        ),
+        migrations.AddConstraint(
+            model_name='importstaging',
+            constraint=models.UniqueConstraint(fields=('kind', 'content_hash', 'created_by'), name='unique_staging_per_user_content'),
+        ),
+    ]
@@ -62,25 +62,70 @@ class CustomUser(AbstractUser):
         help_text="Contraseña en texto plano (solo para uso administrativo)"
     )
 
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # Trigram (pg_trgm) sobre la columna: los usa la búsqueda de pedidos (trgm_icontains -> ILIKE, ver filters.py)
+            GinIndex(fields=['company_name'], name='user_company_trgm', opclasses=['gin_trgm_ops']),
+            GinIndex(fields=['client_number'], name='user_client_number_trgm', opclasses=['gin_trgm_ops']),
+            GinIndex(fields=['email'], name='user_email_trgm', opclasses=['gin_trgm_ops']),
+        ]
+
     def __str__(self):
         return f"{self.username} ({self.company_name or self.role})"
 
 # ... (Category and Product models remain unchanged)
 
 class Invoice(models.Model):
+    # El PDF lo genera el worker (store/invoicing.py) después de crear la factura
+    STATUS_CHOICES = (
+        ('PENDING', 'Pendiente'),
+        ('RUNNING', 'Generando'),
+        ('COMPLETED', 'Generada'),
+        ('FAILED', 'Fallida'),
+    )
+
     order = models.OneToOneField('Order', on_delete=models.CASCADE, related_name='invoice')
+    # Numeración fiscal: correlativa y sin huecos por punto de venta y letra (InvoiceSequence)
+    point_of_sale = models.PositiveIntegerField(default=1)
+    letter = models.CharField(max_length=1, default='A')
+    sequence = models.PositiveIntegerField()
     number = models.CharField(max_length=50, unique=True)
     created_at = models.DateTimeField(auto_now_add=True)
     pdf_file = models.FileField(upload_to='invoices/', blank=True, null=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='PENDING', db_index=True)
+    error = models.TextField(blank=True)
+    render_started_at = models.DateTimeField(null=True, blank=True)
+    rendered_at = models.DateTimeField(null=True, blank=True)
     
     # Snapshot de datos fiscales al momento de la factura
     client_name = models.CharField(max_length=100)
     client_tax_id = models.CharField(max_length=20, blank=True)
     total_amount = models.DecimalField(max_digits=12, decimal_places=2)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['point_of_sale', 'letter', 'sequence'], name='unique_invoice_sequence_number'),
+        ]
+
     def __str__(self):
         return f"Factura {self.number}"
 
+
+class InvoiceSequence(models.Model):
+    """Último número de factura entregado por punto de venta y letra (ver invoicing.allocate_invoice_numbers)."""
+    point_of_sale = models.PositiveIntegerField()
+    letter = models.CharField(max_length=1)
+    last_number = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['point_of_sale', 'letter'], name='unique_invoice_sequence'),
+        ]
+
+    def __str__(self):
+        return f"{self.letter}-{self.point_of_sale:04d}: {self.last_number}"
+
 class Category(models.Model):
     """Categoría jerárquica para productos. Soporta árbol de subcategorías."""
     name = models.CharField(max_length=100)
@@ -213,6 +258,8 @@ class Product(models.Model):
             models.Index(fields=['brand']),
             models.Index(fields=['base_price']),
             GinIndex(fields=['attributes'], name='product_attributes_gin'),
+            # Trigram: búsqueda de pedidos por SKU (trgm_icontains, ver filters.search_orders)
+            GinIndex(fields=['sku'], name='product_sku_trgm', opclasses=['gin_trgm_ops']),
         ]
 
     def __str__(self):
@@ -226,6 +273,15 @@ class Order(models.Model):
         ('SHIPPED', 'Enviado'),
         ('CANCELED', 'Cancelado'),
     )
+
+    # Transiciones válidas para cambios de estado masivos (estado actual -> destinos)
+    ALLOWED_TRANSITIONS = {
+        'PENDING': {'CONFIRMED', 'PAID', 'CANCELED'},
+        'CONFIRMED': {'PAID', 'SHIPPED', 'CANCELED'},
+        'PAID': {'SHIPPED'},
+        'SHIPPED': set(),
+        'CANCELED': set(),
+    }
     
     client = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='orders')
     created_at = models.DateTimeField(auto_now_add=True)
@@ -271,3 +327,219 @@ class Transaction(models.Model):
 
     def __str__(self):
         return f"Tx en {self.created_at}"
+
+class ImportJob(models.Model):
+    """
+    Importación persistida (clientes, productos o categorías) ejecutada por el
+    worker (`manage.py run_import_worker`) fuera del request.
+
+    El archivo se guarda en la base (file_data) porque web y worker pueden
+    correr en máquinas distintas sin disco compartido. Cada bloque confirmado
+    guarda su checkpoint en `state` dentro de la misma transacción que los
+    datos, así un job interrumpido retoma desde el último bloque escrito.
+    """
+    KIND_CHOICES = (
+        ('CLIENTS', 'Clientes'),
+        ('PRODUCTS', 'Productos'),
+        ('CATEGORIES', 'Categorías'),
+    )
+    STATUS_CHOICES = (
+        ('PENDING', 'Pendiente'),
+        ('RUNNING', 'En proceso'),
+        ('COMPLETED', 'Completado'),
+        ('FAILED', 'Fallido'),
+    )
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='PENDING', db_index=True)
+    created_by = models.ForeignKey(CustomUser, on_delete=models.SET_NULL, null=True, blank=True, related_name='import_jobs')
+
+    file_name = models.CharField(max_length=255)
+    file_data = models.BinaryField()
+    options = models.JSONField(default=dict, blank=True, help_text="Ej: {'update_passwords': true}")
+
+    # Progreso (para polling) y checkpoint para retomar
+    total_rows = models.IntegerField(default=0)
+    processed_rows = models.IntegerField(default=0)
+    progress = models.JSONField(default=dict, blank=True, help_text="Último evento de progreso")
+    state = models.JSONField(default=dict, blank=True, help_text="Checkpoint del último bloque confirmado")
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+
+    attempts = models.IntegerField(default=0)
+    worker = models.CharField(max_length=100, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    @property
+    def is_finished(self):
+        return self.status in ('COMPLETED', 'FAILED')
+
+    def __str__(self):
+        return f"Importación {self.get_kind_display()} #{self.id} ({self.status})"
+
+
+class ImportStaging(models.Model):
+    """
+    Resultado de una previsualización de importación, identificado por el hash
+    del contenido del archivo y el usuario que la hizo. Guarda las filas ya
+    parseadas y validadas (ImportStagingRow) para que el confirm aplique
+    exactamente ese diff sin volver a subir ni parsear el archivo. Vence a
+    las IMPORT_STAGING_TTL.
+    """
+    STATUS_CHOICES = (
+        ('PARSING', 'Analizando'),
+        ('STAGED', 'Listo para confirmar'),
+        ('CONFIRMED', 'Confirmado'),
+    )
+
+    kind = models.CharField(max_length=20, choices=ImportJob.KIND_CHOICES, default='CLIENTS')
+    content_hash = models.CharField(max_length=64, help_text="SHA-256 del archivo")
+    file_name = models.CharField(max_length=255)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='PARSING')
+    created_by = models.ForeignKey(CustomUser, on_delete=models.SET_NULL, null=True, blank=True, related_name='import_stagings')
+    result = models.JSONField(null=True, blank=True, help_text="Resultado de la previsualización (stats, errores)")
+    job = models.ForeignKey(ImportJob, on_delete=models.SET_NULL, null=True, blank=True, related_name='stagings')
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'content_hash', 'created_by'], name='unique_staging_per_user_content')
+        ]
+
+    def __str__(self):
+        return f"Previsualización {self.kind} {self.content_hash[:12]} ({self.status})"
+
+
+class ImportStagingRow(models.Model):
+    """
+    Fila validada de una previsualización. `target_fingerprint` es la huella de
+    la fila destino al momento del preview: si cambia antes del confirm, la
+    fila se informa como conflicto en lugar de pisar los cambios.
+    """
+    ACTION_CHOICES = (
+        ('CREATE', 'Crear'),
+        ('UPDATE', 'Actualizar'),
+    )
+
+    staging = models.ForeignKey(ImportStaging, on_delete=models.CASCADE, related_name='rows')
+    row_number = models.IntegerField()
+    key = models.CharField(max_length=150, help_text="Usuario (clientes) o SKU (productos)")
+    action = models.CharField(max_length=10, choices=ACTION_CHOICES)
+    target_id = models.BigIntegerField(null=True, blank=True)
+    target_fingerprint = models.CharField(max_length=40, blank=True)
+    data = models.JSONField()
+
+    class Meta:
+        ordering = ['id']
+
+    def __str__(self):
+        return f"{self.action} {self.key} (fila {self.row_number})"
+
+
+class DataVersion(models.Model):
+    """
+    Contador de cambios por conjunto de datos ('products', 'categories',
+    'orders', 'clients'). Se incrementa con cada escritura (signals para los
+    save/delete y llamadas explícitas en las escrituras masivas) y etiqueta
+    los archivos de exportación: mismo contador = mismos datos.
+
+    bump() no escribe en la transacción de quien guarda: anota el conjunto y
+    lo incrementa una sola vez al confirmar (on_commit), con un UPDATE corto
+    en autocommit. Así los checkouts y ediciones concurrentes no se bloquean
+    en la fila del contador, y mil save() en una transacción son un UPDATE.
+    Entre el commit y el incremento una exportación puede reutilizar el
+    archivo anterior; el pedido siguiente ya ve la versión nueva.
+    """
+    name = models.CharField(max_length=30, unique=True)
+    version = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @classmethod
+    def bump(cls, *names, using='default'):
+        from django.db import transaction
+        connection = transaction.get_connection(using)
+        pending = getattr(connection, '_data_versions_pending', None)
+        if pending is None:
+            pending = connection._data_versions_pending = set()
+        pending.update(names)
+        # Un callback por llamada, pero solo el primero que corre encuentra
+        # conjuntos pendientes. Si la transacción se revierte, lo anotado se
+        # incrementa igual en el próximo commit (de más nunca es incorrecto).
+        transaction.on_commit(lambda: cls._flush(connection), using=using)
+
+    @classmethod
+    def _flush(cls, connection):
+        from django.db.models import F
+        pending = getattr(connection, '_data_versions_pending', None)
+        if not pending:
+            return
+        names = sorted(pending)
+        pending.clear()
+        for name in names:
+            if not cls.objects.filter(name=name).update(version=F('version') + 1):
+                cls.objects.get_or_create(name=name, defaults={'version': 1})
+
+    @classmethod
+    def current(cls, names):
+        """Versión combinada de varios conjuntos, ej: 'categories:3|products:12'."""
+        versions = dict(cls.objects.filter(name__in=names).values_list('name', 'version'))
+        return '|'.join(f"{name}:{versions.get(name, 0)}" for name in sorted(names))
+
+    def __str__(self):
+        return f"{self.name} v{self.version}"
+
+
+class ExportArtifact(models.Model):
+    """
+    Archivo de exportación generado por el worker y guardado en el storage.
+
+    `key` identifica la exportación pedida (tipo, formato, gzip y filtros) y
+    `data_version` los datos con los que se generó (DataVersion.current). Un
+    pedido igual con la misma versión reutiliza el archivo (o el que se está
+    generando); si los datos cambiaron se genera uno nuevo y el anterior se
+    borra en la limpieza periódica.
+    """
+    STATUS_CHOICES = ImportJob.STATUS_CHOICES
+
+    key = models.CharField(max_length=64, help_text="SHA-256 de tipo, formato y filtros")
+    data_version = models.CharField(max_length=200)
+    export_type = models.CharField(max_length=30)
+    format = models.CharField(max_length=10)
+    compress = models.BooleanField(default=False)
+    params = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='PENDING', db_index=True)
+    created_by = models.ForeignKey(CustomUser, on_delete=models.SET_NULL, null=True, blank=True, related_name='exports')
+
+    file = models.FileField(upload_to='exports/', blank=True)
+    file_name = models.CharField(max_length=255, blank=True)
+    size = models.BigIntegerField(default=0)
+    error = models.TextField(blank=True)
+
+    worker = models.CharField(max_length=100, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    last_used_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        constraints = [
+            # Dos pedidos simultáneos iguales comparten el mismo artefacto
+            models.UniqueConstraint(
+                fields=['key', 'data_version'], condition=~models.Q(status='FAILED'), name='unique_export_artifact'
+            ),
+        ]
+
+    @property
+    def is_finished(self):
+        return self.status in ('COMPLETED', 'FAILED')
+
+    def __str__(self):
+        return f"Exportación {self.export_type}.{self.format} #{self.id} ({self.status})"
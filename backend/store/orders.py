@@ -0,0 +1,83 @@
+from django.db import transaction
+from .invoicing import INVOICED_STATUSES, queue_invoices
+from .models import DataVersion, Order, Payment
+
+
+def allowed_sources(target):
+    """Estados desde los que se puede pasar a `target`."""
+    return {source for source, targets in Order.ALLOWED_TRANSITIONS.items() if target in targets}
+
+
+def transition_orders(order_ids, target):
+    """
+    Cambia el estado de un conjunto de pedidos con un único UPDATE condicional.
+
+    Bloquea las filas seleccionadas (select_for_update), valida cada transición
+    contra Order.ALLOWED_TRANSITIONS y actualiza en una sola sentencia solo los
+    pedidos cuyo estado actual lo permite. Los efectos colaterales se aplican en
+    bloque sobre los pedidos efectivamente movidos.
+
+    Retorna (results, moved_ids); results trae una entrada por id pedido con
+    'from', 'to', 'success' y 'error'.
+    """
+    if target not in dict(Order.STATUS_CHOICES):
+        raise ValueError(f"Estado inválido: {target}")
+
+    order_ids = list(dict.fromkeys(order_ids))
+    sources = allowed_sources(target)
+
+    with transaction.atomic():
+        current = dict(
+            Order.objects.select_for_update()
+            .filter(id__in=order_ids)
+            .values_list('id', 'status')
+        )
+        movable = [pk for pk, status in current.items() if status in sources]
+
+        if movable:
+            Order.objects.filter(id__in=movable, status__in=sources).update(status=target)
+            DataVersion.bump('orders')
+            _apply_side_effects(movable, target)
+
+    moved = set(movable)
+    results = []
+    for pk in order_ids:
+        status = current.get(pk)
+        result = {'id': pk, 'from': status, 'to': target, 'success': pk in moved, 'error': None}
+        if status is None:
+            result['error'] = "Pedido no encontrado"
+        elif status == target:
+            result['error'] = f"El pedido ya está en estado {target}"
+        elif pk not in moved:
+            result['error'] = f"Transición no permitida: {status} -> {target}"
+        results.append(result)
+
+    return results, movable
+
+
+def _apply_side_effects(order_ids, target):
+    """
+    Mantiene la consistencia de pagos para los pedidos movidos, en bloque.
+
+    - CANCELED: los pagos pendientes quedan rechazados.
+    - PAID: los pagos existentes se aprueban y se registra un pago MANUAL para
+      los pedidos que no tenían ninguno (ej: transferencia confirmada a mano).
+    - CONFIRMED/PAID/SHIPPED: se encolan las facturas que falten (el PDF lo
+      genera el worker).
+
+    El stock no se descuenta al crear pedidos, por lo que cancelar no tiene
+    stock reservado que liberar.
+    """
+    if target == 'CANCELED':
+        Payment.objects.filter(order_id__in=order_ids, status='PENDING').update(status='REJECTED')
+
+    elif target == 'PAID':
+        Payment.objects.filter(order_id__in=order_ids).exclude(status='APPROVED').update(status='APPROVED')
+        with_payment = set(Payment.objects.filter(order_id__in=order_ids).values_list('order_id', flat=True))
+        Payment.objects.bulk_create([
+            Payment(order_id=pk, provider='MANUAL', status='APPROVED')
+            for pk in order_ids if pk not in with_payment
+        ], batch_size=500)
+
+    if target in INVOICED_STATUSES:
+        queue_invoices(order_ids)
@@ -0,0 +1,89 @@
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+
+import django
+from django.conf import settings
+
+
+def worker_count():
+    """
+    Cantidad de procesos para trabajo CPU-bound: los núcleos disponibles para
+    este proceso (respeta cgroups/affinity en contenedores). Se puede fijar con
+    el setting PARALLEL_WORKERS.
+    """
+    configured = getattr(settings, 'PARALLEL_WORKERS', None)
+    if configured:
+        return max(int(configured), 1)
+    try:
+        return max(len(os.sched_getaffinity(0)), 1)
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def _init_worker():
+    # Con 'spawn'/'forkserver' el proceso hijo arranca sin Django configurado
+    django.setup()
+
+
+@contextmanager
+def process_pool(items_count=None, min_items=1):
+    """
+    Pool de procesos para tareas CPU-bound (hash de contraseñas, parseo, PDFs).
+
+    Entrega None (ejecutar inline) si hay un solo núcleo o si la cantidad de
+    ítems no justifica el costo de levantar procesos.
+
+        with process_pool(len(items), min_items=50) as pool:
+            for result in parallel_map(func, items, pool):
+                ...
+    """
+    workers = worker_count()
+    if items_count is not None:
+        workers = min(workers, items_count)
+    if workers <= 1 or (items_count is not None and items_count < min_items):
+        yield None
+        return
+
+    executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker)
+    try:
+        yield executor
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def parallel_map(func, items, pool=None):
+    """
+    Aplica `func` a cada ítem y genera los resultados en el mismo orden.
+    `func` debe ser una función de módulo (picklable). Sin pool corre inline.
+    """
+    if pool is None:
+        for item in items:
+            yield func(item)
+        return
+    items = list(items)
+    workers = getattr(pool, '_max_workers', 1)
+    chunksize = max(len(items) // (workers * 4), 1)
+    yield from pool.map(func, items, chunksize=chunksize)
+
+
+def ordered_imap(func, items, pool=None, ahead=None):
+    """
+    Como parallel_map pero perezoso: consume `items` a medida que avanza y
+    mantiene a lo sumo `ahead` tareas en vuelo (por defecto 2 por proceso),
+    así un archivo grande no se carga entero en memoria. Los resultados se
+    generan en el orden de `items`.
+    """
+    if pool is None:
+        for item in items:
+            yield func(item)
+        return
+    ahead = ahead or getattr(pool, '_max_workers', 1) * 2
+    pending = deque()
+    for item in items:
+        pending.append(pool.submit(func, item))
+        if len(pending) >= ahead:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
@@ -0,0 +1,167 @@
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+
+from .models import Product
+
+# Columnas de producto que usa la cotización
+PRICE_COLUMNS = ['id', 'sku', 'name', 'base_price', 'stock', 'is_active']
+
+
+def get_discount_rate(user):
+    """Devuelve el descuento del cliente como Decimal (0 si no tiene o no está logueado)."""
+    if user is None or not getattr(user, 'is_authenticated', False):
+        return Decimal('0')
+    rate = getattr(user, 'discount_rate', None) or Decimal('0')
+    return Decimal(str(rate))
+
+
+def discounted_price(base_price, discount_rate):
+    """Precio unitario con descuento, redondeado a 2 decimales (mismo criterio que ProductSerializer)."""
+    base = Decimal(str(base_price))
+    return round(base * (1 - discount_rate), 2)
+
+
+def discounted_cents(base_cents, discount_rate):
+    """
+    discounted_price() sobre un lote: recibe precios en centavos (enteros) y
+    calcula todos juntos con aritmética entera de numpy, exacta y con el mismo
+    redondeo (half-even, el de round() sobre Decimal). Retorna un array de centavos.
+    """
+    numerator, denominator = Decimal(discount_rate).as_integer_ratio()
+    scaled = np.asarray(base_cents, dtype='int64') * (denominator - numerator)
+    quotient, remainder = np.divmod(scaled, denominator)
+    round_up = (2 * remainder > denominator) | ((2 * remainder == denominator) & (quotient % 2 == 1))
+    return quotient + round_up
+
+
+def _money(cents):
+    """Centavos (entero) -> '1234.50', el formato de str() de un Decimal de 2 decimales."""
+    return str(Decimal(int(cents)).scaleb(-2))
+
+
+def price_lines(user, lines, key='sku'):
+    """
+    Cotiza una lista de líneas de pedido para un cliente.
+
+    `lines` es una lista de dicts con 'line', 'quantity' y la clave de búsqueda
+    (`key`: 'sku' o 'product_id'). Todos los productos se resuelven en UNA sola
+    consulta indexada (sku es unique, id es PK). Los precios se calculan por
+    columnas sobre el lote completo (discounted_cents): primero el precio
+    unitario de todos los productos y, una vez validadas las líneas, los
+    totales de todas las líneas OK.
+
+    El stock se valida contra la cantidad acumulada por producto, así un SKU
+    repetido en varias líneas no puede superar el disponible.
+
+    Retorna {'lines': [...], 'totals': {...}}. Cada línea trae 'status'
+    ('OK' o 'ERROR') y 'error' con el motivo; solo las líneas OK suman al total.
+    Las líneas con producto existente informan el precio vigente aunque tengan error.
+    """
+    field = 'sku' if key == 'sku' else 'id'
+    keys = {line[key] for line in lines if line.get(key) not in (None, '')}
+
+    products = pd.DataFrame.from_records(
+        Product.objects.filter(**{f'{field}__in': keys}).values_list(*PRICE_COLUMNS), columns=PRICE_COLUMNS
+    )
+    discount_rate = get_discount_rate(user)
+    products['base_cents'] = (products['base_price'] * 100).astype('int64')
+    products['unit_cents'] = discounted_cents(products['base_cents'], discount_rate)
+    products = dict(zip(products[field], products.to_dict('records')))
+
+    reserved = {}
+    priced = []
+    ok_lines = []  # (resultado, producto, cantidad) de las líneas válidas
+
+    for line in lines:
+        result = {
+            'line': line.get('line'),
+            'sku': line.get('sku'),
+            'product_id': line.get('product_id'),
+            'quantity': line.get('quantity'),
+            'name': None,
+            'base_price': None,
+            'unit_price': None,
+            'line_total': None,
+            'stock': None,
+            'status': 'ERROR',
+            'error': None,
+        }
+        priced.append(result)
+
+        quantity = line.get('quantity')
+        product = products.get(line.get(key))
+
+        if product is None:
+            result['error'] = f"Producto '{line.get(key)}' no encontrado"
+            continue
+
+        result.update({
+            'sku': product['sku'],
+            'product_id': product['id'],
+            'name': product['name'],
+            'base_price': str(product['base_price']),
+            'unit_price': _money(product['unit_cents']),
+            'stock': product['stock'],
+        })
+
+        if not product['is_active']:
+            result['error'] = "Producto inactivo"
+            continue
+
+        if not isinstance(quantity, int) or quantity <= 0:
+            result['error'] = "Cantidad inválida"
+            continue
+
+        already_reserved = reserved.get(product['id'], 0)
+        if already_reserved + quantity > product['stock']:
+            available = max(product['stock'] - already_reserved, 0)
+            result['error'] = f"Stock insuficiente (disponible: {available})"
+            continue
+
+        reserved[product['id']] = already_reserved + quantity
+        result['status'] = 'OK'
+        ok_lines.append((result, product, quantity))
+
+    # Totales de todas las líneas válidas en una operación por columna
+    quantities = np.array([quantity for _, _, quantity in ok_lines], dtype='int64')
+    line_cents = np.array([product['unit_cents'] for _, product, _ in ok_lines], dtype='int64') * quantities
+    base_cents = np.array([product['base_cents'] for _, product, _ in ok_lines], dtype='int64') * quantities
+    for (result, _, _), cents in zip(ok_lines, line_cents):
+        result['line_total'] = _money(cents)
+
+    return {
+        'lines': priced,
+        'totals': {
+            'lines': len(priced),
+            'valid_lines': len(ok_lines),
+            'error_lines': len(priced) - len(ok_lines),
+            'units': int(quantities.sum()),
+            'subtotal': _money(base_cents.sum()),
+            'discount_percent': int(discount_rate * 100),
+            'total': _money(line_cents.sum()),
+        }
+    }
+
+
+def iter_product_prices(user, field, keys, chunk_size=1000):
+    """
+    Generador de filas de precio/stock para una lista de SKUs o ids (`field`).
+    Una sola consulta indexada recorrida con iterator() para no materializar
+    el resultado completo; el descuento del cliente se aplica por fila.
+    """
+    discount_rate = get_discount_rate(user)
+    queryset = Product.objects.filter(**{f'{field}__in': keys}).order_by(field).values_list(
+        'id', 'sku', 'name', 'base_price', 'stock', 'is_active'
+    )
+    for pk, sku, name, base_price, stock, is_active in queryset.iterator(chunk_size=chunk_size):
+        yield {
+            'id': pk,
+            'sku': sku,
+            'name': name,
+            'base_price': str(base_price),
+            'discounted_price': str(discounted_price(base_price, discount_rate)),
+            'stock': stock,
+            'is_active': is_active,
+        }
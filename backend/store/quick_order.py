@@ -0,0 +1,125 @@
+import csv
+import io
+import re
+from openpyxl import load_workbook
+
+MAX_QUICK_ORDER_LINES = 5000
+
+# Separadores aceptados al pegar "SKU,cantidad" desde una planilla. El
+# espacio solo separa si la línea no tiene ninguno de estos (hay SKUs con espacios)
+_DELIMITERS = re.compile(r'[;,\t]')
+
+# Palabras de una fila de encabezado ("SKU;Cantidad", "Código", ...)
+HEADER_WORDS = {
+    'sku', 'codigo', 'código', 'cod', 'articulo', 'artículo', 'producto',
+    'cantidad', 'cant', 'qty', 'quantity', 'unidades',
+}
+
+
+def parse_quantity(raw):
+    """Convierte la cantidad a int. Retorna None si no es un entero válido."""
+    if raw is None:
+        return None
+    if isinstance(raw, (int, float)):
+        return int(raw) if float(raw).is_integer() else None
+    s = str(raw).strip().replace(',', '.')
+    if not s:
+        return None
+    try:
+        value = float(s)
+    except ValueError:
+        return None
+    return int(value) if value.is_integer() else None
+
+
+def _cell(row, index):
+    """Celda `index` de la fila, o None si falta o está vacía."""
+    value = row[index] if len(row) > index else None
+    return None if value is None or str(value).strip() == '' else value
+
+
+def _is_header(sku, raw_qty):
+    if raw_qty is not None and parse_quantity(raw_qty) is None:
+        return True
+    words = set(re.split(r'[^\wáéíóú]+', str(sku).lower())) - {''}
+    return bool(words) and words <= HEADER_WORDS
+
+
+def _to_lines(rows):
+    """
+    Normaliza filas crudas [sku, cantidad, ...] a líneas de pedido, por
+    posición de columna (una celda vacía no corre las demás).
+    Omite filas vacías y una fila de encabezado inicial (cantidad no numérica
+    o títulos conocidos, aunque sea de una sola columna). Sin cantidad se
+    pide 1. El número de 'line' es la posición en el archivo/texto (1-index).
+    """
+    lines = []
+    first = True
+    for number, row in enumerate(rows, start=1):
+        row = list(row)
+        sku_cell, raw_qty = _cell(row, 0), _cell(row, 1)
+        if sku_cell is None and raw_qty is None:
+            continue
+        if first:
+            first = False
+            if sku_cell is not None and _is_header(sku_cell, raw_qty):
+                continue
+
+        sku = '' if sku_cell is None else str(sku_cell).strip()
+        if isinstance(sku_cell, float) and sku_cell.is_integer():
+            sku = str(int(sku_cell))
+        quantity = 1 if raw_qty is None else parse_quantity(raw_qty)
+
+        lines.append({'line': number, 'sku': sku, 'quantity': quantity})
+        if len(lines) > MAX_QUICK_ORDER_LINES:
+            raise ValueError(f"Se permiten hasta {MAX_QUICK_ORDER_LINES} líneas por pedido rápido.")
+    return lines
+
+
+def _split_line(raw):
+    if _DELIMITERS.search(raw):
+        return [part.strip() for part in _DELIMITERS.split(raw)]
+    # Solo espacios: la última palabra es la cantidad si es numérica ("CAJA 10 UN 5")
+    parts = raw.rsplit(None, 1)
+    if len(parts) == 2 and parse_quantity(parts[1]) is not None:
+        return parts
+    return [raw]
+
+
+def parse_text(text):
+    """
+    Parsea texto pegado: una línea por producto, 'SKU,cantidad' (también ;
+    o tab). Si la línea no tiene ninguno, la cantidad es la última palabra
+    separada por espacio.
+    """
+    rows = []
+    for raw in text.splitlines():
+        raw = raw.strip()
+        rows.append(_split_line(raw) if raw else [])
+    return _to_lines(rows)
+
+
+def parse_file(file_obj):
+    """Parsea un archivo .csv o .xlsx con SKU en la columna 1 y cantidad en la 2."""
+    name = (getattr(file_obj, 'name', '') or '').lower()
+
+    if name.endswith('.xlsx'):
+        wb = load_workbook(file_obj, read_only=True, data_only=True)
+        try:
+            ws = wb.worksheets[0]
+            return _to_lines(ws.iter_rows(max_col=2, values_only=True))
+        finally:
+            wb.close()
+
+    if name.endswith('.csv') or name.endswith('.txt'):
+        content = file_obj.read()
+        if isinstance(content, bytes):
+            content = content.decode('utf-8-sig', errors='replace')
+        sample = content[:2048]
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=',;\t')
+        except csv.Error:
+            dialect = csv.excel
+        return _to_lines(csv.reader(io.StringIO(content), dialect))
+
+    raise ValueError("Formato no soportado. Usá .csv, .xlsx o pegá el listado como texto.")
@@ -0,0 +1,279 @@
+import codecs
+import csv
+import io
+import os
+
+from openpyxl import load_workbook
+
+# Formatos de importación aceptados (extensión -> lector)
+IMPORT_EXTENSIONS = ('.xlsx', '.csv', '.txt', '.parquet')
+
+
+class ChunkedReader:
+    """
+    Interfaz común de los lectores en streaming: `header`, `estimated_rows`,
+    `last_row`, `iter_rows()` y los bloques/registros armados a partir de ella.
+    Las subclases implementan `iter_rows()` y `close()`.
+    """
+
+    def __init__(self, file, chunk_size=1000):
+        self.file = file
+        self.chunk_size = chunk_size
+        self.header = []
+        self._row_number = 0
+
+    @property
+    def estimated_rows(self):
+        return 0
+
+    @property
+    def last_row(self):
+        """Número de fila del archivo de la última fila leída."""
+        return self._row_number
+
+    @staticmethod
+    def clean_value(value):
+        if isinstance(value, str):
+            value = value.strip()
+            return value or None
+        if isinstance(value, float) and value.is_integer():
+            return int(value)
+        return value
+
+    def _complete(self, values):
+        """Limpia una fila y la completa al ancho del encabezado (None si está vacía)."""
+        cleaned = [self.clean_value(v) for v in values]
+        if all(v is None for v in cleaned):
+            return None
+        width = len(self.header)
+        if len(cleaned) < width:
+            cleaned.extend([None] * (width - len(cleaned)))
+        return cleaned
+
+    def iter_rows(self):
+        raise NotImplementedError
+
+    def iter_chunks(self):
+        """Genera listas de hasta `chunk_size` filas (row_number, values)."""
+        chunk = []
+        for item in self.iter_rows():
+            chunk.append(item)
+            if len(chunk) >= self.chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def iter_records(self, columns):
+        """Genera (row_number, dict) usando `columns` como claves (encabezados ya normalizados)."""
+        for chunk in self.iter_chunks():
+            for row_number, values in chunk:
+                yield row_number, dict(zip(columns, values))
+
+    def close(self):
+        pass
+
+
+class SheetReader(ChunkedReader):
+    """
+    Lector de planillas .xlsx en streaming (openpyxl read_only).
+
+    No carga el libro completo: recorre las filas a medida que se leen del
+    archivo y las entrega en bloques de `chunk_size`, así la memoria se
+    mantiene constante sin importar la cantidad de filas.
+
+    Los valores se entregan tipados (str sin espacios, int, float, datetime o
+    None). Los float enteros se convierten a int, igual que pandas, para que
+    un CUIT o N° de cliente numérico no termine como "1001.0".
+
+    Uso:
+        reader = SheetReader(file)
+        reader.header            # ['SKU', 'Nombre', ...]
+        reader.estimated_rows    # filas de datos según la dimensión de la hoja
+        for chunk in reader.iter_chunks():
+            for row_number, values in chunk:   # row_number = fila real del Excel
+                ...
+    """
+
+    def __init__(self, file, chunk_size=1000):
+        super().__init__(file, chunk_size)
+        if hasattr(file, 'seek'):
+            file.seek(0)
+        self.workbook = load_workbook(file, read_only=True, data_only=True)
+        self.sheet = self.workbook.worksheets[0]
+        self._rows = self.sheet.iter_rows(values_only=True)
+        # Número de fila real del Excel (read_only arranca en la primera fila con datos)
+        self._row_number = (self.sheet.min_row or 1) - 1
+        self.header = self._read_header()
+
+    def _read_header(self):
+        # El encabezado es la primera fila no vacía
+        for values in self._rows:
+            self._row_number += 1
+            if any(v is not None and str(v).strip() != '' for v in values):
+                return [str(v).strip() if v is not None else '' for v in values]
+        return []
+
+    @property
+    def estimated_rows(self):
+        """Cantidad estimada de filas de datos (la dimensión declarada puede no existir)."""
+        try:
+            max_row = self.sheet.max_row
+        except Exception:
+            max_row = None
+        return max(max_row - 1, 0) if max_row else 0
+
+    def iter_rows(self):
+        """Genera (row_number, values) omitiendo filas vacías. Cada fila se completa al ancho del encabezado."""
+        try:
+            for values in self._rows:
+                self._row_number += 1
+                cleaned = self._complete(values)
+                if cleaned is not None:
+                    yield self._row_number, cleaned
+        finally:
+            self.close()
+
+    def close(self):
+        self.workbook.close()
+
+
+class CsvReader(ChunkedReader):
+    """
+    Lector de CSV en streaming (módulo csv, sin pandas). Detecta el
+    separador (`,` `;` tab o `|`) en el encabezado y la codificación (UTF-8
+    con o sin BOM; si no decodifica, Windows-1252 como exportan los ERP).
+
+    Los valores se entregan como texto sin espacios (o None): un CUIT o
+    código con ceros a la izquierda no se convierte a número.
+    """
+    DELIMITERS = ',;\t|'
+    SNIFF_BYTES = 64 * 1024
+
+    def __init__(self, file, chunk_size=1000):
+        super().__init__(file, chunk_size)
+        file.seek(0)
+        sample = file.read(self.SNIFF_BYTES)
+        file.seek(0)
+        self.encoding = self._detect_encoding(sample)
+        first_line = sample.decode(self.encoding, errors='ignore').splitlines()[:1]
+        delimiter = max(self.DELIMITERS, key=lambda d: first_line[0].count(d) if first_line else 0)
+
+        try:
+            # TextIOWrapper es varias veces más rápido que codecs.StreamReader
+            self._text = io.TextIOWrapper(file, encoding=self.encoding, newline='')
+        except (AttributeError, TypeError, ValueError):
+            self._text = codecs.getreader(self.encoding)(file)
+        self._reader = csv.reader(self._text, delimiter=delimiter)
+        lines = self._count_lines(file)
+        self.header = self._read_header()
+        self._estimated = max(lines - self._row_number, 0)
+
+    @staticmethod
+    def _detect_encoding(sample):
+        try:
+            # final=False: la muestra puede cortar un carácter multibyte al final
+            codecs.getincrementaldecoder('utf-8-sig')().decode(sample, final=False)
+            return 'utf-8-sig'
+        except UnicodeDecodeError:
+            return 'cp1252'
+
+    @staticmethod
+    def _count_lines(file):
+        """Cuenta saltos de línea por bloques (rápido incluso con millones de filas)."""
+        lines = 0
+        last = b''
+        for block in iter(lambda: file.read(1024 * 1024), b''):
+            lines += block.count(b'\n')
+            last = block
+        file.seek(0)
+        return lines + (1 if last and not last.endswith(b'\n') else 0)
+
+    def _read_header(self):
+        for values in self._reader:
+            self._row_number = self._reader.line_num
+            if any(v.strip() for v in values):
+                return [v.strip() for v in values]
+        return []
+
+    @property
+    def estimated_rows(self):
+        return self._estimated
+
+    def iter_rows(self):
+        """Genera (row_number, values); row_number es la línea del archivo donde termina el registro."""
+        try:
+            for values in self._reader:
+                self._row_number = self._reader.line_num
+                cleaned = self._complete(values)
+                if cleaned is not None:
+                    yield self._row_number, cleaned
+        finally:
+            self.close()
+
+    def close(self):
+        # Soltar el archivo sin cerrarlo (el job o la vista lo siguen usando)
+        if isinstance(self._text, io.TextIOWrapper):
+            try:
+                self._text.detach()
+            except ValueError:
+                pass
+
+
+class ParquetReader(ChunkedReader):
+    """
+    Lector de Parquet por row groups (pyarrow, dependencia opcional). Las filas
+    se numeran como en una planilla con encabezado: la primera es la fila 2.
+    """
+
+    def __init__(self, file, chunk_size=1000):
+        super().__init__(file, chunk_size)
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ValueError("Para importar archivos Parquet se requiere el paquete 'pyarrow'.")
+        file.seek(0)
+        self._parquet = pq.ParquetFile(file)
+        self.header = [str(name).strip() for name in self._parquet.schema_arrow.names]
+        self._row_number = 1
+
+    @property
+    def estimated_rows(self):
+        return self._parquet.metadata.num_rows
+
+    def iter_rows(self):
+        for batch in self._parquet.iter_batches(batch_size=self.chunk_size):
+            columns = [column.to_pylist() for column in batch.columns]
+            for values in zip(*columns):
+                self._row_number += 1
+                cleaned = self._complete(values)
+                if cleaned is not None:
+                    yield self._row_number, cleaned
+
+    def close(self):
+        close = getattr(self._parquet, 'close', None)
+        if close:
+            close()
+
+
+def open_reader(file, chunk_size=1000):
+    """
+    Lector adecuado según la extensión del archivo (o su firma si no tiene una
+    conocida): .xlsx, .csv/.txt o .parquet.
+    """
+    extension = os.path.splitext(getattr(file, 'name', '') or '')[1].lower()
+    if extension not in IMPORT_EXTENSIONS:
+        file.seek(0)
+        signature = file.read(4)
+        file.seek(0)
+        extension = {b'PK\x03\x04': '.xlsx', b'PAR1': '.parquet'}.get(signature, '.csv')
+
+    if extension == '.xlsx':
+        return SheetReader(file, chunk_size=chunk_size)
+    if extension == '.parquet':
+        return ParquetReader(file, chunk_size=chunk_size)
+    return CsvReader(file, chunk_size=chunk_size)
+
+
+def is_supported_import(name):
+    return os.path.splitext(name or '')[1].lower() in IMPORT_EXTENSIONS
@@ -1,7 +1,8 @@
 from rest_framework import serializers
-from .models import Product, Order, OrderItem, Category, CustomUser
+from .models import Product, Order, OrderItem, Category, CustomUser, ImportJob, ExportArtifact
 from django.contrib.auth.hashers import make_password
 from decimal import Decimal
+from .pricing import discounted_price, get_discount_rate
 
 
 class CategorySerializer(serializers.ModelSerializer):
@@ -138,10 +139,7 @@ class ProductSerializer(serializers.ModelSerializer):
         """Calculate the price with user's discount applied."""
         request = self.context.get('request')
         if request and hasattr(request, 'user') and request.user.is_authenticated:
-            discount_rate = getattr(request.user, 'discount_rate', None) or Decimal('0')
-            base = Decimal(str(obj.base_price))
-            discounted = base * (1 - discount_rate)
-            return str(round(discounted, 2))
+            return str(discounted_price(obj.base_price, get_discount_rate(request.user)))
         return str(obj.base_price)
 
     def get_discount_percent(self, obj):
@@ -207,3 +205,41 @@ class AdminOrderSerializer(serializers.ModelSerializer):
             'id', 'status', 'total_amount', 'created_at', 'items',
             'client_id', 'client_name', 'client_number', 'client_email', 'client_phone'
         ]
+
+
+class ImportJobSerializer(serializers.ModelSerializer):
+    """Estado de una importación en segundo plano (sin el archivo)."""
+    kind_display = serializers.CharField(source='get_kind_display', read_only=True)
+    status_display = serializers.CharField(source='get_status_display', read_only=True)
+    is_finished = serializers.BooleanField(read_only=True)
+
+    class Meta:
+        model = ImportJob
+        fields = [
+            'id', 'kind', 'kind_display', 'status', 'status_display', 'is_finished',
+            'file_name', 'options', 'total_rows', 'processed_rows', 'progress',
+            'result', 'error', 'attempts', 'created_at', 'started_at', 'finished_at'
+        ]
+        read_only_fields = fields
+
+
+class ExportArtifactSerializer(serializers.ModelSerializer):
+    """Estado de una exportación en segundo plano; `download_url` cuando el archivo está listo."""
+    status_display = serializers.CharField(source='get_status_display', read_only=True)
+    is_finished = serializers.BooleanField(read_only=True)
+    download_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ExportArtifact
+        fields = [
+            'id', 'export_type', 'format', 'compress', 'params', 'status', 'status_display', 'is_finished',
+            'data_version', 'file_name', 'size', 'error', 'created_at', 'finished_at', 'download_url'
+        ]
+        read_only_fields = fields
+
+    def get_download_url(self, obj):
+        if obj.status != 'COMPLETED':
+            return None
+        path = f"/api/admin/exports/{obj.pk}/download/"
+        request = self.context.get('request')
+        return request.build_absolute_uri(path) if request else path
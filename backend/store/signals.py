@@ -0,0 +1,47 @@
+"""
+Signals del store:
+  - DataVersion: cada save/delete de los modelos exportables anota su
+    conjunto de datos, que se incrementa una vez al confirmar la transacción
+    (ver DataVersion.bump). Las escrituras masivas (bulk_create, update(),
+    COPY) no disparan signals y llaman a DataVersion.bump() explícitamente.
+  - Facturas: un pedido guardado como CONFIRMED/PAID/SHIPPED encola su factura
+    (los cambios masivos de estado lo hacen en orders.transition_orders).
+"""
+from django.db.models.signals import m2m_changed, post_delete, post_save
+
+from .invoicing import INVOICED_STATUSES, queue_invoices
+from .models import Category, CustomUser, DataVersion, Order, OrderItem, Product
+
+# modelo -> conjunto de datos
+TRACKED_MODELS = {
+    Product: 'products',
+    Category: 'categories',
+    Order: 'orders',
+    OrderItem: 'orders',
+    CustomUser: 'clients',
+}
+
+
+def _changed(sender, update_fields=None, **kwargs):
+    # El login solo actualiza last_login: no cambia ninguna exportación
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    DataVersion.bump(TRACKED_MODELS[sender])
+
+
+def _categories_changed(sender, action, **kwargs):
+    if action.startswith('post_'):
+        DataVersion.bump('products')
+
+
+def _order_saved(sender, instance, **kwargs):
+    if instance.status in INVOICED_STATUSES:
+        queue_invoices([instance.pk])
+
+
+def connect():
+    for model in TRACKED_MODELS:
+        post_save.connect(_changed, sender=model, dispatch_uid=f'data_version_save_{model.__name__}')
+        post_delete.connect(_changed, sender=model, dispatch_uid=f'data_version_delete_{model.__name__}')
+    post_save.connect(_order_saved, sender=Order, dispatch_uid='queue_invoice')
+    m2m_changed.connect(_categories_changed, sender=Product.categories.through, dispatch_uid='data_version_categories')
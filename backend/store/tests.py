@@ -1,4 +1,8 @@
-from django.test import TestCase
+import importlib.util
+from unittest import skipUnless
+
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
 from django.contrib.auth import get_user_model
 from rest_framework.test import APIClient
 from .models import Category, Product
@@ -93,3 +97,1229 @@ class AdminCategoryTests(TestCase):
         response = self.client.get(f'/api/admin/products/{p.id}/')
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.data['supplier'], 'Visible')
+
+class QuickOrderTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='buyer', password='password', discount_rate=0.10)
+        self.client.force_authenticate(user=self.user)
+
+        Product.objects.create(sku='A1', name='Tornillo', base_price=100, stock=50)
+        Product.objects.create(sku='B2', name='Tuerca', base_price=10, stock=5)
+        Product.objects.create(sku='C3', name='Arandela', base_price=1, stock=100, is_active=False)
+
+    def test_quote_from_pasted_text(self):
+        """Pasted SKU,qty lines are priced with the client discount and errors are per line."""
+        text = "SKU;Cantidad\nA1;2\nB2,10\nC3 1\nZZ9,1\nA1;abc"
+        response = self.client.post('/api/orders/quick/', {'text': text}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+        lines = response.data['lines']
+        self.assertEqual(len(lines), 5)
+        self.assertEqual(lines[0]['status'], 'OK')
+        self.assertEqual(lines[0]['unit_price'], '90.00')
+        self.assertIn('Stock insuficiente', lines[1]['error'])
+        self.assertEqual(lines[2]['error'], 'Producto inactivo')
+        self.assertIn('no encontrado', lines[3]['error'])
+        self.assertEqual(lines[4]['error'], 'Cantidad inválida')
+        self.assertEqual(response.data['totals']['total'], '180.00')
+        self.assertIsNone(response.data['order_id'])
+
+    def test_parsing_keeps_columns_and_skus_with_spaces(self):
+        from .quick_order import _to_lines, parse_text
+        self.assertEqual(_to_lines([['SKU'], ['A1'], ['', 5], ['B2', None]]), [
+            {'line': 2, 'sku': 'A1', 'quantity': 1},
+            {'line': 3, 'sku': '', 'quantity': 5},
+            {'line': 4, 'sku': 'B2', 'quantity': 1},
+        ])
+        self.assertEqual(
+            [(line['sku'], line['quantity']) for line in parse_text("SKU Cantidad\nCAJA 10 UN;3\nCAJA 10 UN 4\nA1")],
+            [('CAJA 10 UN', 3), ('CAJA 10 UN', 4), ('A1', 1)],
+        )
+
+    def test_create_order_from_csv(self):
+        """create_order=true persists only the valid lines."""
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from .models import Order
+        upload = SimpleUploadedFile('pedido.csv', b"sku,cantidad\nA1,1\nB2,3\nNOPE,2\n")
+        response = self.client.post('/api/orders/quick/', {'file': upload, 'create_order': 'true'})
+        self.assertEqual(response.status_code, 201)
+
+        order = Order.objects.get(pk=response.data['order_id'])
+        self.assertEqual(order.items.count(), 2)
+        self.assertEqual(str(order.total_amount), '117.00')
+
+
+class CartQuoteTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='buyer', password='password', discount_rate=0.25)
+        self.client.force_authenticate(user=self.user)
+        self.p1 = Product.objects.create(sku='Q1', name='Caja', base_price=40, stock=3)
+        self.p2 = Product.objects.create(sku='Q2', name='Cinta', base_price=8, stock=10)
+
+    def test_quote_reprices_cart_in_one_query(self):
+        payload = {'items': [
+            {'product_id': self.p1.id, 'quantity': 5},
+            {'product_id': self.p2.id, 'quantity': 2},
+            {'product_id': 999999, 'quantity': 1},
+        ]}
+        with self.assertNumQueries(1):
+            response = self.client.post('/api/cart/quote/', payload, format='json')
+        self.assertEqual(response.status_code, 200)
+
+        lines = response.data['lines']
+        self.assertEqual(lines[0]['status'], 'ERROR')
+        self.assertEqual(lines[0]['unit_price'], '30.00')  # Precio vigente aun con error de stock
+        self.assertEqual(lines[1]['line_total'], '12.00')
+        self.assertEqual(lines[2]['product_id'], 999999)
+        self.assertEqual(response.data['totals']['total'], '12.00')
+
+    def test_batch_pricing_matches_the_per_product_price(self):
+        from decimal import Decimal
+        from .pricing import discounted_cents, discounted_price
+        prices = [Decimal(cents) / 100 for cents in range(0, 5000, 7)] + [Decimal('10.05'), Decimal('0.01')]
+        for rate in (Decimal('0'), Decimal('0.25'), Decimal('0.5'), Decimal('0.15'), Decimal('0.33')):
+            batch = discounted_cents([int(price * 100) for price in prices], rate)
+            self.assertEqual([Decimal(int(c)) / 100 for c in batch], [discounted_price(p, rate) for p in prices])
+
+    def test_quote_without_products(self):
+        response = self.client.post('/api/cart/quote/', {'items': [{'product_id': 999999, 'quantity': 1}]}, format='json')
+        self.assertEqual(response.data['totals'], {
+            'lines': 1, 'valid_lines': 0, 'error_lines': 1, 'units': 0,
+            'subtotal': '0.00', 'discount_percent': 25, 'total': '0.00',
+        })
+
+
+class ProductLookupTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='erp', password='password', discount_rate=0.5)
+        self.client.force_authenticate(user=self.user)
+        self.products = [
+            Product.objects.create(sku=f'SKU{i}', name=f'P{i}', base_price=10 * (i + 1), stock=i, is_active=i != 2)
+            for i in range(4)
+        ]
+
+    def test_lookup_by_skus_streams_rows_and_missing_keys(self):
+        import json
+        response = self.client.post('/api/products/lookup/', {'skus': ['SKU1', 'SKU2', 'NOPE']}, format='json')
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(b''.join(response.streaming_content))
+
+        by_sku = {row['sku']: row for row in data['results']}
+        self.assertEqual(set(by_sku), {'SKU1', 'SKU2'})
+        self.assertEqual(by_sku['SKU1']['discounted_price'], '10.00')
+        self.assertFalse(by_sku['SKU2']['is_active'])
+        self.assertEqual(data['not_found'], ['NOPE'])
+
+    def test_lookup_by_ids(self):
+        import json
+        ids = [p.id for p in self.products[:2]]
+        response = self.client.post('/api/products/lookup/', {'ids': ids}, format='json')
+        data = json.loads(b''.join(response.streaming_content))
+        self.assertEqual([row['id'] for row in data['results']], ids)
+        self.assertEqual(data['not_found'], [])
+
+
+class BulkOrderStatusTests(TestCase):
+    def setUp(self):
+        from .models import Order, Payment
+        self.client = APIClient()
+        self.admin = User.objects.create_superuser(username='admin', password='password')
+        self.client.force_authenticate(user=self.admin)
+        buyer = User.objects.create_user(username='buyer', password='password')
+
+        self.pending = Order.objects.create(client=buyer, status='PENDING')
+        self.paid = Order.objects.create(client=buyer, status='PAID')
+        self.shipped = Order.objects.create(client=buyer, status='SHIPPED')
+        Payment.objects.create(order=self.pending, status='PENDING')
+
+    def test_bulk_transition_reports_per_order_results(self):
+        from .models import Order
+        ids = [self.pending.id, self.paid.id, self.shipped.id, 999999]
+        response = self.client.post('/api/admin/orders/bulk-status/', {'status': 'SHIPPED', 'ids': ids}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['updated_count'], 1)
+
+        results = {r['id']: r for r in response.data['results']}
+        self.assertTrue(results[self.paid.id]['success'])
+        self.assertIn('no permitida', results[self.pending.id]['error'])
+        self.assertIn('ya está', results[self.shipped.id]['error'])
+        self.assertEqual(results[999999]['error'], 'Pedido no encontrado')
+        self.assertEqual(Order.objects.get(pk=self.paid.id).status, 'SHIPPED')
+
+    def test_cancel_matching_rejects_pending_payments(self):
+        from .models import Payment
+        response = self.client.post(
+            '/api/admin/orders/bulk-status/?status=PENDING',
+            {'status': 'CANCELED', 'select_all_matching': True},
+            format='json'
+        )
+        self.assertEqual(response.data['updated_count'], 1)
+        self.assertEqual(Payment.objects.get(order=self.pending).status, 'REJECTED')
+
+    def test_mark_paid_keeps_payments_consistent(self):
+        from .models import Order, Payment
+        no_payment = Order.objects.create(client=self.pending.client, status='CONFIRMED')
+        ids = [self.pending.id, no_payment.id]
+        self.client.post('/api/admin/orders/bulk-status/', {'status': 'PAID', 'ids': ids}, format='json')
+        self.assertEqual(Payment.objects.get(order=self.pending).status, 'APPROVED')
+        self.assertEqual(Payment.objects.get(order=no_payment).provider, 'MANUAL')
+
+
+class AdminOrderSearchTests(TestCase):
+    def setUp(self):
+        from .models import Order, OrderItem
+        self.client = APIClient()
+        self.admin = User.objects.create_superuser(username='admin', password='password')
+        self.client.force_authenticate(user=self.admin)
+
+        acme = User.objects.create_user(username='acme', password='x', company_name='Acme SA', client_number='C-100', email='compras@acme.com')
+        other = User.objects.create_user(username='other', password='x', company_name='Ferretería Sur', email='sur@mail.com')
+        product = Product.objects.create(sku='BULON-M8', name='Bulón', base_price=5)
+
+        self.acme_order = Order.objects.create(client=acme)
+        self.other_order = Order.objects.create(client=other)
+        OrderItem.objects.create(order=self.other_order, product=product, quantity=3, unit_price_applied=5)
+
+    def search(self, term):
+        response = self.client.get('/api/admin/orders/', {'search': term})
+        self.assertEqual(response.status_code, 200)
+        return {row['id'] for row in response.data['results']}
+
+    def test_search_by_client_fields(self):
+        self.assertEqual(self.search('acme'), {self.acme_order.id})
+        self.assertEqual(self.search('C-100'), {self.acme_order.id})
+        self.assertEqual(self.search('sur@mail'), {self.other_order.id})
+
+    def test_search_by_sku_and_order_id(self):
+        self.assertEqual(self.search('bulon-m8'), {self.other_order.id})
+        self.assertIn(self.acme_order.id, self.search(f'#{self.acme_order.id}'))
+
+    def test_text_criteria_use_a_lookup_the_trigram_indexes_serve(self):
+        from django.db import connection
+        from .filters import search_orders
+        from .models import Order
+        self.assertEqual(self.search('ACME sa'), {self.acme_order.id})
+        self.assertEqual(self.search('acme%'), set())  # comodines literales
+        sql = str(search_orders(Order.objects.all(), 'acme').query)
+        if connection.vendor == 'postgresql':
+            # UPPER(col::text) LIKE no puede usar los índices gin_trgm_ops de la columna
+            self.assertIn('"company_name" ILIKE', sql)
+            self.assertNotIn('UPPER(', sql)
+
+
+def build_xlsx(rows, name='data.xlsx'):
+    """Arma un .xlsx en memoria (primera fila = encabezados) para los tests de importadores."""
+    from io import BytesIO
+    from openpyxl import Workbook
+    wb = Workbook()
+    ws = wb.active
+    for row in rows:
+        ws.append(row)
+    output = BytesIO()
+    wb.save(output)
+    output.seek(0)
+    output.name = name
+    return output
+
+
+class ProductImporterTests(TestCase):
+    def setUp(self):
+        Product.objects.create(sku='OLD-1', name='Viejo', base_price=10, stock=1)
+
+    def test_upsert_reports_created_and_updated(self):
+        from .importer import ProductImporter
+        upload = build_xlsx([
+            ['SKU', 'Nombre', 'Precio', 'Stock', 'Marca', 'Categoria'],
+            ['OLD-1', 'Viejo renovado', '12.5', '4', 'Acme', 'Herramientas'],
+            ['NEW-1', 'Nuevo', '99', '7', '', ''],
+            ['NEW-1', 'Nuevo (corregido)', '98', '7', '', ''],
+        ])
+        result = ProductImporter(upload).process(dry_run=False)
+
+        self.assertTrue(result['success'])
+        self.assertEqual(result['stats'], {'created': 1, 'updated': 1, 'unchanged': 0, 'errors': 0})
+        old = Product.objects.get(sku='OLD-1')
+        self.assertEqual(str(old.base_price), '12.50')
+        self.assertEqual(old.category.name, 'Herramientas')
+        self.assertEqual(Product.objects.get(sku='NEW-1').name, 'Nuevo (corregido)')
+
+    @override_settings(IMPORT_USE_COPY=False)  # Camino ORM; la carga por COPY se prueba aparte
+    def test_reimport_writes_only_changed_rows(self):
+        from .importer import ProductImporter
+        header = ['SKU', 'Nombre', 'Precio', 'Stock', 'Marca', 'Categoria']
+        rows = [['A-1', 'Uno', '10', '1', 'Acme', 'Herramientas'], ['A-2', 'Dos', '20', '2', '', '']]
+        ProductImporter(build_xlsx([header] + rows)).process(dry_run=False)
+
+        rows[1][2] = '21.5'
+        with self.assertNumQueries(5):  # savepoint + categorías + SELECT de actuales + 1 upsert + release
+            result = ProductImporter(build_xlsx([header] + rows)).process(dry_run=False)
+
+        self.assertEqual(result['stats'], {'created': 0, 'updated': 1, 'unchanged': 1, 'errors': 0})
+        self.assertEqual(str(Product.objects.get(sku='A-2').base_price), '21.50')
+
+    def test_dry_run_is_a_read_only_diff(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from .importer import ProductImporter
+        Product.objects.create(sku='SAME-1', name='Igual', base_price=5, stock=2)
+        upload = build_xlsx([
+            ['SKU', 'Nombre', 'Precio', 'Stock'],
+            ['OLD-1', 'Viejo', '12,5', '1'],
+            ['SAME-1', 'Igual', '5', '2'],
+            ['NEW-1', 'Nuevo', '3', '4'],
+            ['BAD-1', 'Malo', 'abc', '1'],
+        ])
+        with CaptureQueriesContext(connection) as ctx:
+            result = ProductImporter(upload).process(dry_run=True)
+
+        self.assertTrue(all(q['sql'].startswith('SELECT') for q in ctx.captured_queries))
+        self.assertEqual(result['stats'], {'created': 1, 'updated': 1, 'unchanged': 1, 'errors': 1})
+        self.assertEqual(result['preview']['changed'], [
+            {'row': 2, 'sku': 'OLD-1', 'changes': {'base_price': {'before': 10.0, 'after': 12.5}}},
+        ])
+        self.assertEqual(result['preview']['new'][0]['sku'], 'NEW-1')
+        self.assertEqual(result['preview']['invalid'], [{'row': 5, 'sku': 'BAD-1', 'message': "precio inválido: 'abc'"}])
+        self.assertFalse(Product.objects.filter(sku='NEW-1').exists())
+
+    @override_settings(PARALLEL_WORKERS=2)
+    def test_parallel_parsing_keeps_file_order(self):
+        from unittest import mock
+        from . import importer
+        rows = [['SKU', 'Nombre', 'Precio', 'Stock']] + [[f'S-{i}', f'P{i}', str(i), str(i)] for i in range(10)]
+        rows[4][0] = 'S-1'  # Fila 5 del Excel repite el SKU de la fila 3
+
+        with mock.patch.object(importer.ProductImporter, 'PARALLEL_PARSE_MIN', 1), \
+                mock.patch.object(importer.ProductImporter, 'BATCH_SIZE', 3), \
+                mock.patch.object(importer, 'ordered_imap', wraps=importer.ordered_imap) as imap:
+            result = importer.ProductImporter(build_xlsx(rows)).process(dry_run=False)
+
+        self.assertIsNotNone(imap.call_args.args[2])  # Se parseó en el pool
+        self.assertEqual(result['stats'], {'created': 9, 'updated': 0, 'unchanged': 0, 'errors': 0})
+        self.assertEqual(result['log'], ['Fila 5: SKU S-1 duplicado en el archivo, se usa la última fila.'])
+        self.assertEqual(Product.objects.get(sku='S-1').name, 'P3')
+
+    def test_csv_stock_file_updates_only_its_columns(self):
+        from io import BytesIO
+        from .importer import ProductImporter
+        # Separador ';' y Windows-1252, como exportan los ERP
+        upload = BytesIO('SKU;Stock\nOLD-1;25\nÑ-2;3\n'.encode('cp1252'))
+        upload.name = 'stock.csv'
+        result = ProductImporter(upload).process(dry_run=False)
+
+        self.assertEqual(result['stats'], {'created': 1, 'updated': 1, 'unchanged': 0, 'errors': 0})
+        old = Product.objects.get(sku='OLD-1')
+        self.assertEqual((old.name, old.stock, str(old.base_price)), ('Viejo', 25, '10.00'))
+        self.assertEqual(Product.objects.get(sku='Ñ-2').stock, 3)
+
+    @skipUnless(importlib.util.find_spec('pyarrow'), 'pyarrow no instalado')
+    def test_parquet_import(self):
+        from io import BytesIO
+        import pandas as pd
+        from .importer import ProductImporter
+        upload = BytesIO()
+        pd.DataFrame({'SKU': ['OLD-1', 'P-1'], 'Nombre': ['Viejo', 'Parquet'], 'Precio': [10.0, 5.5], 'Stock': [1, 2]}).to_parquet(upload)
+        upload.name = 'productos.parquet'
+        result = ProductImporter(upload).process(dry_run=False)
+
+        self.assertEqual(result['stats'], {'created': 1, 'updated': 0, 'unchanged': 1, 'errors': 0})
+        self.assertEqual(str(Product.objects.get(sku='P-1').base_price), '5.50')
+
+
+    @skipUnless(connection.vendor == 'postgresql', 'la carga por COPY requiere PostgreSQL')
+    def test_copy_import_creates_categories_only_for_the_last_row_of_each_sku(self):
+        from io import BytesIO
+        from unittest import mock
+        from .importer import ProductImporter
+        tools = Category.objects.create(name='Herramientas', slug='herramientas')
+        content = (
+            'SKU,Nombre,Precio,Stock,Categoria,Categorias\n'
+            'OLD-1,Viejo,10,1,Descartada,\n'
+            'NEW-1,Nuevo,5,2,,Herramientas\n'
+            'OLD-1,Viejo,10,1,herramientas,Herramientas\n'
+        ).encode()
+
+        def run():
+            upload = BytesIO(content)
+            upload.name = 'productos.csv'
+            with mock.patch.object(ProductImporter, 'MERGE_BATCH', 1):
+                return ProductImporter(upload).process(dry_run=False)
+
+        result = run()
+        self.assertEqual(result['stats'], {'created': 1, 'updated': 1, 'unchanged': 0, 'errors': 0})
+        self.assertEqual(result['log'], ['Fila 4: SKU OLD-1 duplicado en el archivo, se usa la última fila.'])
+        # La fila 2 quedó descartada por la 4: su categoría no se crea
+        self.assertFalse(Category.objects.filter(name='Descartada').exists())
+        old = Product.objects.get(sku='OLD-1')
+        self.assertEqual((old.category, list(old.categories.all())), (tools, [tools]))
+        self.assertEqual(list(Product.objects.get(sku='NEW-1').categories.all()), [tools])
+
+        # Mismo archivo otra vez: nada difiere (tampoco las categorías M2M)
+        self.assertEqual(run()['stats'], {'created': 0, 'updated': 0, 'unchanged': 2, 'errors': 0})
+
+
+class CategoryImporterTests(TestCase):
+    def setUp(self):
+        tools = Category.objects.create(name='Herramientas', slug='herramientas')
+        paint = Category.objects.create(name='Pintura', slug='pintura')
+        self.tools_manual = Category.objects.create(name='Manuales', slug='manuales', parent=tools)
+        self.paint_manual = Category.objects.create(name='Manuales', slug='manuales-pintura', parent=paint)
+
+    def test_paths_build_tree_level_by_level(self):
+        from .importer import CategoryImporter
+        upload = build_xlsx([
+            ['Ruta', 'Orden'],
+            ['Pintura > Manuales', '5'],
+            ['Herramientas > Eléctricas > Taladros', '1'],
+            ['Jardín > Riego', ''],
+        ])
+        # 1 SELECT de existentes + savepoint/release + 1 INSERT por nivel + 1 UPDATE
+        with self.assertNumQueries(7):
+            result = CategoryImporter(upload).process(dry_run=False)
+
+        self.assertEqual(result['stats'], {'created': 4, 'updated': 1, 'unchanged': 0, 'errors': 0})
+        self.paint_manual.refresh_from_db()
+        self.tools_manual.refresh_from_db()
+        self.assertEqual((self.paint_manual.sort_order, self.tools_manual.sort_order), (5, 0))
+        drills = Category.objects.get(name='Taladros')
+        self.assertEqual(str(drills), 'Herramientas → Eléctricas → Taladros')
+        self.assertEqual(drills.slug, 'taladros')
+        self.assertEqual(str(Category.objects.get(name='Riego').parent), 'Jardín')
+
+    def test_parent_names_are_validated_for_cycles_and_ambiguity(self):
+        from .importer import CategoryImporter
+        upload = build_xlsx([
+            ['Nombre', 'Padre'],
+            ['A', 'B'],
+            ['B', 'A'],
+            ['Destornilladores', 'Manuales'],
+            ['Pinceles', 'Pintura > Manuales'],
+            ['Lijas', 'Pinceles'],
+        ])
+        result = CategoryImporter(upload).process(dry_run=False)
+
+        self.assertEqual(result['stats'], {'created': 2, 'updated': 0, 'unchanged': 0, 'errors': 3})
+        self.assertEqual(sum('ciclo' in line for line in result['log']), 2)
+        self.assertTrue(any("padre 'Manuales' ambiguo" in line for line in result['log']))
+        self.assertEqual(str(Category.objects.get(name='Lijas')), 'Pintura → Manuales → Pinceles → Lijas')
+        self.assertFalse(Category.objects.filter(name__in=['A', 'B']).exists())
+
+
+CLIENT_HEADER = ['N°', 'Nombre', 'Contacto', 'Tipo', 'Provincia', 'Domicilio', 'Telefonos',
+                 'Email', 'CUIT/DNI', 'Descuento', 'Cond.IVA', 'Contraseña', 'Usuario']
+
+
+def client_row(username, company='Empresa', password='secreta', discount=10, **overrides):
+    row = ['', company, 'Contacto', 'MAYORISTA', 'CABA', 'Calle 1', '111',
+           f'{username}@mail.com', 20304050607, discount, 'RI', password, username]
+    for index, value in overrides.items():
+        row[int(index.lstrip('c'))] = value
+    return row
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class ClientImporterTests(TestCase):
+    def test_sheet_reader_streams_typed_rows(self):
+        from .readers import SheetReader
+        upload = build_xlsx([CLIENT_HEADER, client_row('ana'), [None] * 13, client_row('beto', c0=1001.0)])
+        reader = SheetReader(upload, chunk_size=1)
+
+        chunks = list(reader.iter_chunks())
+        self.assertEqual(len(chunks), 2)
+        (row_number, values), = chunks[1]
+        self.assertEqual(row_number, 4)  # La fila vacía se omite pero se respeta la numeración del Excel
+        self.assertEqual(values[0], 1001)
+        self.assertEqual(values[8], 20304050607)
+
+    def test_streaming_import_creates_and_updates(self):
+        import json
+        from .importer import ClientImporter
+        User.objects.create_user(username='ana', password='x', company_name='Vieja')
+        upload = build_xlsx([
+            CLIENT_HEADER,
+            client_row('ana', company='Ana SRL', c0='C1'),
+            client_row('beto', c0='C2'),
+            client_row('beto', c0='C3'),
+            client_row('', c0='C4'),
+        ])
+        events = [json.loads(line) for line in ClientImporter(upload).process_streaming(dry_run=False)]
+
+        self.assertEqual(events[0]['type'], 'start')
+        result = events[-1]['data']
+        self.assertEqual(result['stats']['to_create'], 1)
+        self.assertEqual(result['stats']['to_update'], 1)
+        self.assertEqual(result['stats']['errors'], 2)
+        self.assertEqual(User.objects.get(username='ana').company_name, 'Ana SRL')
+        beto = User.objects.get(username='beto')
+        self.assertTrue(beto.check_password('secreta'))
+        self.assertEqual(str(beto.discount_rate), '0.10')
+
+    @override_settings(PARALLEL_WORKERS=2)
+    def test_csv_import_keeps_codes_as_text(self):
+        import csv
+        from io import BytesIO, StringIO
+        from .importer import ClientImporter
+        text = StringIO()
+        csv.writer(text).writerows([CLIENT_HEADER, client_row('ana', c0='007', c8='0203040506')])
+        upload = BytesIO(text.getvalue().encode('utf-8-sig'))
+        upload.name = 'clientes.csv'
+        result = ClientImporter(upload).process(dry_run=False)
+
+        self.assertTrue(result['success'], result)
+        self.assertEqual(result['stats']['to_create'], 1)
+        ana = User.objects.get(username='ana')
+        self.assertEqual((ana.client_number, ana.tax_id), ('007', '0203040506'))
+
+    def test_passwords_hashed_in_pool_only_when_changed(self):
+        import json
+        from unittest import mock
+        from .importer import ClientImporter
+        ana = User.objects.create_user(username='ana', password='secreta', plain_password='secreta')
+        User.objects.create_user(username='carla', password='vieja', plain_password='vieja')
+        upload = build_xlsx([CLIENT_HEADER, client_row('ana', c0='C1'), client_row('carla', password='nueva', c0='C2')]
+                            + [client_row(f'nuevo{i}', c0=f'N{i}') for i in range(4)])
+
+        with mock.patch.object(ClientImporter, 'PARALLEL_HASH_MIN', 1):
+            events = [json.loads(line) for line in
+                      ClientImporter(upload).process_streaming(dry_run=False, update_passwords=True)]
+
+        stats = events[-1]['data']['stats']
+        self.assertEqual((stats['passwords_changed'], stats['passwords_unchanged']), (5, 1))
+        hashing = [e for e in events if e.get('stage') == 'hashing']
+        self.assertEqual((hashing[-1]['current'], hashing[-1]['total']), (5, 5))
+        self.assertEqual(User.objects.get(username='ana').password, ana.password)
+        self.assertTrue(User.objects.get(username='carla').check_password('nueva'))
+        self.assertTrue(User.objects.get(username='nuevo3').check_password('secreta'))
+
+    def test_unchanged_clients_are_not_rewritten(self):
+        from unittest import mock
+        from .importer import ClientImporter
+        rows = [client_row('ana', c0='C1'), client_row('beto', c0='C2')]
+        ClientImporter(build_xlsx([CLIENT_HEADER] + rows)).process(dry_run=False)
+
+        rows[1][6] = '222-333'
+        preview = ClientImporter(build_xlsx([CLIENT_HEADER] + rows)).process(dry_run=True)
+        self.assertEqual((preview['stats']['to_create'], preview['stats']['to_update'], preview['stats']['unchanged']), (0, 1, 1))
+        self.assertEqual(preview['preview'][0]['msg'], 'Actualizar teléfono de Empresa')
+
+        written = []
+        original = User.objects.bulk_update
+        with mock.patch.object(User.objects, 'bulk_update',
+                               side_effect=lambda objs, *args, **kw: written.extend(u.username for u in objs) or original(objs, *args, **kw)):
+            ClientImporter(build_xlsx([CLIENT_HEADER] + rows)).process(dry_run=False)
+        self.assertEqual(written, ['beto'])
+        self.assertEqual(User.objects.get(username='beto').phone, '222-333')
+
+    def test_only_rows_in_chunk_are_loaded_for_matching(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from .importer import ClientImporter
+        User.objects.bulk_create([User(username=f'otro{i}', client_number=f'X{i}') for i in range(30)])
+        rows = [client_row('ana', c0='C1'), client_row('beto', c0='C2')]
+        ClientImporter(build_xlsx([CLIENT_HEADER] + rows)).process(dry_run=False)
+
+        rows[0][6] = '999'
+        with CaptureQueriesContext(connection) as ctx:
+            result = ClientImporter(build_xlsx([CLIENT_HEADER] + rows)).process(dry_run=False)
+        self.assertEqual((result['stats']['to_update'], result['stats']['unchanged']), (1, 1))
+        lookups = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('SELECT') and 'store_customuser' in q['sql']]
+        # Una consulta por bloque, filtrada por los usernames del archivo y sin columnas de más
+        self.assertEqual(len(lookups), 1)
+        self.assertIn('IN', lookups[0])
+        self.assertNotIn('last_login', lookups[0])
+        self.assertEqual(User.objects.get(username='ana').phone, '999')
+
+    def test_vectorized_cleaning_matches_row_by_row(self):
+        """clean_frame() must produce the same values and errors as the previous per-row cleaning."""
+        import random
+        import pandas as pd
+        from .importer import ClientImporter
+
+        def clean_str(val):
+            if pd.isna(val):
+                return ""
+            s = str(val).strip()
+            return "" if s.lower() == 'nan' else s
+
+        def clean_float(val):
+            if pd.isna(val):
+                return 0.0
+            try:
+                number = float(val)
+            except (TypeError, ValueError):
+                return 0.0
+            # El texto 'nan' se toma como vacío (antes terminaba como NaN en el descuento)
+            return 0.0 if number != number else number
+
+        def reference(chunk):
+            valid, errors, seen = {}, [], set()
+            for row_idx, values in chunk:
+                cleaned = [clean_str(v) for v in values]
+                discount = clean_float(values[9])
+                username, company = cleaned[12], cleaned[1]
+                if not username:
+                    errors.append((row_idx, "Ignorada - Falta el 'Usuario' en columna 13."))
+                elif not company:
+                    errors.append((row_idx, "Ignorada - Falta el 'Nombre' en columna 2."))
+                elif username in seen:
+                    errors.append((row_idx, f"Ignorada - Usuario '{username}' duplicado en el archivo."))
+                else:
+                    seen.add(username)
+                    cleaned[9] = discount / 100.0 if discount > 1 else discount
+                    valid[row_idx] = cleaned
+            return valid, sorted(errors)
+
+        random.seed(7)
+        choices = [None, '', ' x ', 'nan', 'NaN', 'abc', 12, 12.5, 1001, '15', 0.2, 'José']
+        for _ in range(5):
+            chunk = []
+            for row_idx in range(2, 200):
+                values = [random.choice(choices) for _ in range(13)]
+                values[12] = random.choice([None, 'nan', ' u1 ', 'u2', f'user{random.randint(0, 60)}'])
+                chunk.append((row_idx, values))
+
+            valid, errors = ClientImporter.clean_frame(chunk, set())
+            expected_valid, expected_errors = reference(chunk)
+
+            self.assertEqual(sorted(errors.itertuples(index=False, name=None)), expected_errors)
+            self.assertEqual(list(valid.index), list(expected_valid))
+            for row_idx, expected in expected_valid.items():
+                got = valid.loc[row_idx]
+                self.assertEqual([got[c] for c in ClientImporter.TEXT_COLUMNS],
+                                 [v for i, v in enumerate(expected) if i != 9])
+                self.assertAlmostEqual(got['discount_rate'], expected[9])
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class ImportJobTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin', password='x', is_staff=True)
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def test_product_import_is_queued_and_run_by_worker(self):
+        import json
+        from .jobs import run_next_job
+        upload = build_xlsx([['SKU', 'Nombre', 'Precio'], ['JOB-1', 'Producto', '10']], name='productos.xlsx')
+        response = self.client.post('/api/admin/products/import/', {'file': upload}, format='multipart')
+
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data['status'], 'PENDING')
+        self.assertFalse(Product.objects.filter(sku='JOB-1').exists())
+
+        run_next_job()
+        job = self.client.get(f"/api/admin/imports/{response.data['id']}/").data
+        self.assertEqual(job['status'], 'COMPLETED')
+        self.assertEqual((job['processed_rows'], job['result']['stats']['created']), (1, 1))
+        self.assertTrue(Product.objects.filter(sku='JOB-1').exists())
+        self.assertIsNone(run_next_job())
+
+        events = self.client.get(f"/api/admin/imports/{response.data['id']}/events/")
+        types = [json.loads(line)['type'] for line in b''.join(events.streaming_content).decode().splitlines()]
+        self.assertEqual(types, ['start', 'progress', 'result'])
+
+        # Un job en curso no retiene la conexión más de max_duration
+        from datetime import timedelta
+        from .jobs import iter_job_events
+        from .models import ImportJob
+        ImportJob.objects.filter(pk=response.data['id']).update(status='RUNNING')
+        events = [json.loads(line) for line in iter_job_events(response.data['id'], max_duration=timedelta(0))]
+        self.assertEqual(events[-1], {'type': 'reconnect', 'job': response.data['id'], 'status': 'RUNNING'})
+
+    def test_interrupted_client_import_resumes_from_last_chunk(self):
+        from unittest import mock
+        from .importer import ClientImporter
+        from .jobs import run_next_job
+        from .models import ImportJob
+        rows = [client_row(f'cli{i}', c0=f'C{i}') for i in range(6)] + [client_row('cli0', c0='C9')]
+        upload = build_xlsx([CLIENT_HEADER] + rows, name='clientes.xlsx')
+        job_id = self.client.post('/api/admin/users/import/confirm/', {'file': upload}, format='multipart').data['id']
+
+        original_save = ClientImporter._save
+        saves = []
+
+        def crash_on_second_batch(importer, *args):
+            saves.append(1)
+            if len(saves) == 2:
+                raise SystemExit()  # El worker muere antes de escribir el segundo bloque
+            return original_save(importer, *args)
+
+        with mock.patch.object(ClientImporter, 'CHUNK_SIZE', 2), mock.patch.object(ClientImporter, 'WRITE_BATCH', 2):
+            with mock.patch.object(ClientImporter, '_save', crash_on_second_batch), self.assertRaises(SystemExit):
+                run_next_job()
+
+            job = ImportJob.objects.get(pk=job_id)
+            self.assertEqual((job.status, job.state['last_row']), ('PENDING', 3))
+            self.assertEqual(User.objects.filter(username__startswith='cli').count(), 2)
+
+            job = run_next_job()
+
+        self.assertEqual((job.status, job.attempts), ('COMPLETED', 2))
+        stats = job.result['stats']
+        self.assertEqual((stats['total_rows'], stats['to_create'], stats['errors']), (7, 6, 1))
+        self.assertIn("Usuario 'cli0' duplicado", job.result['errors'][0])
+        self.assertEqual(User.objects.filter(username__startswith='cli').count(), 6)
+
+    @skipUnless(connection.vendor == 'postgresql', 'la carga por COPY requiere PostgreSQL')
+    def test_interrupted_copy_import_resumes_from_last_merged_batch(self):
+        from unittest import mock
+        from .importer import ProductImporter
+        from .jobs import run_next_job
+        from .models import ImportJob
+        rows = [['SKU', 'Nombre', 'Precio', 'Categoria']] + [[f'C-{i}', f'P{i}', '10', f'Cat {i}'] for i in range(6)]
+        rows += [['C-0', 'P0 bis', '11', 'Cat 0'], ['BAD-1', 'Malo', 'abc', '']]
+        upload = build_xlsx(rows, name='productos.xlsx')
+        job_id = self.client.post('/api/admin/products/import/', {'file': upload}, format='multipart').data['id']
+
+        original_merge = ProductImporter._merge_batch
+        merges = []
+
+        def crash_on_second_batch(importer, *args):
+            merges.append(1)
+            if len(merges) == 2:
+                raise SystemExit()  # El worker muere antes de mezclar el segundo lote
+            return original_merge(importer, *args)
+
+        with mock.patch.object(ProductImporter, 'MERGE_BATCH', 2):
+            with mock.patch.object(ProductImporter, '_merge_batch', crash_on_second_batch), self.assertRaises(SystemExit):
+                run_next_job()
+
+            # Lotes en orden de fila: C-0 se mezcla al final (su última fila es la 8)
+            job = ImportJob.objects.get(pk=job_id)
+            self.assertEqual((job.status, job.state['last_row']), ('PENDING', 4))
+            self.assertEqual(sorted(Product.objects.values_list('sku', flat=True)), ['C-1', 'C-2'])
+
+            job = run_next_job()
+
+        self.assertEqual((job.status, job.attempts), ('COMPLETED', 2))
+        # Ni el duplicado ni el error de la primera pasada se cuentan dos veces
+        self.assertEqual(job.result['stats'], {'created': 6, 'updated': 0, 'unchanged': 0, 'errors': 1})
+        self.assertEqual(len(job.result['log']), 2)
+        self.assertEqual(Product.objects.get(sku='C-0').name, 'P0 bis')
+        self.assertEqual(Category.objects.filter(name__startswith='Cat ').count(), 6)
+
+    def test_stale_reclaim_during_a_run_stops_the_first_worker(self):
+        from datetime import timedelta
+        from unittest import mock
+        from django.utils import timezone
+        from .importer import ClientImporter
+        from .jobs import STALE_AFTER, claim_next_job, run_import_job
+        from .models import ImportJob
+        rows = [client_row(f'cli{i}', c0=f'C{i}') for i in range(6)]
+        upload = build_xlsx([CLIENT_HEADER] + rows, name='clientes.xlsx')
+        job_id = self.client.post('/api/admin/users/import/confirm/', {'file': upload}, format='multipart').data['id']
+
+        original_save = ClientImporter._save
+        reclaimed = []
+
+        def reclaim_on_second_batch(importer, *args):
+            if not reclaimed:
+                reclaimed.append(None)
+            elif len(reclaimed) == 1:
+                # El primer worker sigue en el bloque 2 pero su job parece interrumpido: otro lo toma
+                ImportJob.objects.filter(pk=job_id).update(heartbeat_at=timezone.now() - STALE_AFTER * 2)
+                reclaimed.append(claim_next_job('worker-b'))
+            return original_save(importer, *args)
+
+        with mock.patch.object(ClientImporter, 'CHUNK_SIZE', 2), mock.patch.object(ClientImporter, 'WRITE_BATCH', 2):
+            with mock.patch.object(ClientImporter, '_save', reclaim_on_second_batch):
+                first = run_import_job(claim_next_job('worker-a'))
+
+            # El primero no pisa el estado del job y su bloque en curso se revirtió
+            self.assertEqual((first.status, first.worker, first.state['last_row']), ('RUNNING', 'worker-b', 3))
+            self.assertEqual(User.objects.filter(username__startswith='cli').count(), 2)
+
+            job = run_import_job(reclaimed[1])
+
+        self.assertEqual((job.status, job.worker, job.attempts), ('COMPLETED', 'worker-b', 2))
+        self.assertEqual(User.objects.filter(username__startswith='cli').count(), 6)
+
+
+class ImportHeartbeatTests(TransactionTestCase):
+    def test_heartbeat_is_renewed_from_its_own_thread_while_the_job_is_owned(self):
+        import time
+        from datetime import timedelta
+        from django.utils import timezone
+        from .jobs import _Heartbeat
+        from .models import ImportJob
+        stale = timezone.now() - timedelta(minutes=10)
+        job = ImportJob.objects.create(kind='PRODUCTS', file_name='p.csv', file_data=b'', status='RUNNING',
+                                       worker='worker-a', heartbeat_at=stale)
+
+        # El hilo escribe con su propia conexión, aunque este esté ocupado (fase larga sin checkpoint)
+        with _Heartbeat(job, interval=timedelta(seconds=0.05)):
+            time.sleep(0.3)
+        job.refresh_from_db()
+        self.assertGreater(job.heartbeat_at, stale)
+
+        # Si otro worker lo retomó, el hilo no le renueva el heartbeat
+        ImportJob.objects.filter(pk=job.pk).update(worker='worker-b', heartbeat_at=stale)
+        with _Heartbeat(job, interval=timedelta(seconds=0.05)):
+            time.sleep(0.2)
+        job.refresh_from_db()
+        self.assertEqual(job.heartbeat_at, stale)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class StagedClientImportTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin', password='x', is_staff=True)
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+        User.objects.create_user(username='ana', password='x', company_name='Ana', client_number='C1')
+
+    def preview(self, rows, upload=None):
+        import json
+        upload = upload or build_xlsx([CLIENT_HEADER] + rows, name='clientes.xlsx')
+        response = self.client.post('/api/admin/users/import/preview/', {'file': upload}, format='multipart')
+        return json.loads(b''.join(response.streaming_content).decode().splitlines()[-1])['data']
+
+    def confirm(self, digest):
+        return self.client.post('/api/admin/users/import/confirm/', {'content_hash': digest}, format='json')
+
+    def test_confirm_applies_staged_rows_without_reupload(self):
+        from .jobs import run_next_job
+        from .models import ImportStaging
+        preview = self.preview([client_row('ana', company='Ana SRL', c0='C1'), client_row('beto', c0='C2')])
+        self.assertEqual((preview['stats']['to_create'], preview['stats']['to_update']), (1, 1))
+
+        response = self.confirm(preview['content_hash'])
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(self.confirm(preview['content_hash']).status_code, 409)
+
+        job = run_next_job()
+        self.assertEqual(job.status, 'COMPLETED')
+        self.assertEqual(User.objects.get(username='ana').company_name, 'Ana SRL')
+        self.assertTrue(User.objects.get(username='beto').check_password('secreta'))
+        self.assertFalse(ImportStaging.objects.exists())
+        self.assertEqual(self.confirm(preview['content_hash']).status_code, 404)
+
+    def test_rows_changed_after_preview_are_reported_as_conflicts(self):
+        from .jobs import run_next_job
+        preview = self.preview([client_row('ana', company='Ana SRL', c0='C1'), client_row('beto', c0='C2')])
+        User.objects.filter(username='ana').update(phone='555-0000')
+        User.objects.create_user(username='beto', password='x', client_number='C3')
+
+        self.confirm(preview['content_hash'])
+        job = run_next_job()
+
+        stats = job.result['stats']
+        self.assertEqual((stats['conflicts'], stats['to_update'], stats['to_create']), (2, 0, 0))
+        self.assertEqual(User.objects.get(username='ana').company_name, 'Ana')
+        self.assertIn('Conflicto', job.result['errors'][0])
+
+    def test_previews_of_the_same_file_are_kept_per_admin(self):
+        from io import BytesIO
+        from .models import ImportStaging
+        # Mismos bytes: el .xlsx guarda la hora de creación y dos armados pueden diferir
+        content = build_xlsx([CLIENT_HEADER, client_row('beto', c0='C2')]).getvalue()
+
+        def upload():
+            file = BytesIO(content)
+            file.name = 'clientes.xlsx'
+            return file
+
+        preview = self.preview([], upload())
+        self.client.force_authenticate(User.objects.create_user(username='otro', password='x', is_staff=True))
+        other = self.preview([], upload())
+
+        self.assertEqual(preview['content_hash'], other['content_hash'])
+        self.assertEqual(ImportStaging.objects.count(), 2)
+        self.assertEqual(self.confirm(other['content_hash']).status_code, 202)
+        # La del primer admin sigue pendiente y solo la puede confirmar él
+        self.assertEqual(ImportStaging.objects.get(created_by=self.admin).status, 'STAGED')
+        self.client.force_authenticate(self.admin)
+        self.assertEqual(self.confirm(preview['content_hash']).status_code, 202)
+
+    def test_expired_preview_cannot_be_confirmed(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        from .models import ImportStaging
+        preview = self.preview([client_row('beto', c0='C2')])
+        ImportStaging.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+
+        self.assertEqual(self.confirm(preview['content_hash']).status_code, 410)
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        from .models import Order
+        self.client = APIClient()
+        self.admin = User.objects.create_superuser(username='admin', password='password', role='ADMIN')
+        self.client.force_authenticate(user=self.admin)
+        tools = Category.objects.create(name='Herramientas', slug='herramientas')
+        Product.objects.create(sku='A-1', name='Martillo', base_price=10, stock=3, brand='Acme', category=tools)
+        Product.objects.create(sku='A-2', name='Pinza', base_price='7.50', stock=0, is_active=False)
+        Order.objects.create(client=User.objects.create_user(username='acme', password='x', company_name='Acme SA'))
+
+    def download(self, type_, **params):
+        response = self.client.get(f'/api/export/{type_}/', params)
+        self.assertEqual(response.status_code, 200)
+        return response, b''.join(response.streaming_content)
+
+    def test_products_xlsx_is_streamed_in_chunks(self):
+        from io import BytesIO
+        from unittest import mock
+        from openpyxl import load_workbook
+        from .exporter import DataExporter
+        with mock.patch.object(DataExporter, 'CHUNK_SIZE', 1):
+            response, content = self.download('products')
+
+        self.assertIn('productos.xlsx', response['Content-Disposition'])
+        rows = list(load_workbook(BytesIO(content)).active.iter_rows(values_only=True))
+        self.assertEqual(rows[0], ('SKU', 'Nombre', 'Marca', 'Descripcion', 'Precio', 'Stock', 'Categoria',
+                                   'Categorias', 'Atributos', 'Proveedor', 'Activo'))
+        self.assertEqual(rows[1:], [('A-1', 'Martillo', 'Acme', None, 10, 3, 'Herramientas', None, None, None, True),
+                                    ('A-2', 'Pinza', None, None, 7.5, 0, None, None, None, None, False)])
+
+    def test_catalog_export_round_trips_through_importer(self):
+        import json
+        from decimal import Decimal
+        from io import BytesIO
+        from .importer import ProductImporter
+        tools = Category.objects.get(name='Herramientas')
+        manual = Category.objects.create(name='Manuales', slug='manuales', parent=tools)
+        hammers = Category.objects.create(name='Martillos', slug='martillos', parent=manual)
+        hammer = Product.objects.get(sku='A-1')
+        hammer.categories.set([hammers, tools])
+        Product.objects.filter(sku='A-1').update(attributes={'peso': '500 g'}, supplier='Prov SA')
+
+        # exists() + árbol de categorías + vínculos M2M + productos, sin importar la cantidad de filas
+        with self.assertNumQueries(4):
+            _, content = self.download('products', format='ndjson')
+        record = json.loads(content.decode().splitlines()[0])
+        self.assertEqual(record['categories'], ['Herramientas', 'Herramientas > Manuales > Martillos'])
+        self.assertEqual((record['attributes'], record['supplier']), ({'peso': '500 g'}, 'Prov SA'))
+
+        _, content = self.download('products', format='csv')
+        self.assertIn('Herramientas | Herramientas > Manuales > Martillos,"{""peso"": ""500 g""}",Prov SA', content.decode())
+        Product.objects.filter(sku='A-1').update(name='Otro', base_price=1, stock=99, attributes={}, supplier=None)
+        Product.objects.filter(sku='A-2').update(is_active=True, supplier='Nadie')
+        hammer.categories.set([manual])
+        Product.objects.get(sku='A-2').categories.set([tools])
+
+        upload = BytesIO(content)
+        upload.name = 'productos.csv'
+        preview = ProductImporter(upload).process(dry_run=True)
+        changed = {row['sku']: row['changes'] for row in preview['preview']['changed']}
+        self.assertEqual(changed['A-1']['categories'], {
+            'before': ['Herramientas > Manuales'], 'after': ['Herramientas', 'Herramientas > Manuales > Martillos'],
+        })
+        self.assertEqual(changed['A-2']['supplier'], {'before': 'Nadie', 'after': None})
+
+        upload.seek(0)
+        result = ProductImporter(upload).process(dry_run=False)
+        self.assertTrue(result['success'])
+        self.assertEqual(result['stats']['updated'], 2)
+        self.assertEqual(
+            list(Product.objects.order_by('sku').values_list('sku', 'name', 'base_price', 'stock', 'category__name', 'is_active')),
+            [('A-1', 'Martillo', Decimal('10.00'), 3, 'Herramientas', True), ('A-2', 'Pinza', Decimal('7.50'), 0, None, False)],
+        )
+        hammer.refresh_from_db()
+        self.assertEqual((hammer.attributes, hammer.supplier), ({'peso': '500 g'}, 'Prov SA'))
+        self.assertEqual(set(hammer.categories.all()), {tools, hammers})
+        self.assertFalse(Product.objects.get(sku='A-2').categories.exists())
+
+    def test_orders_xlsx(self):
+        from io import BytesIO
+        from openpyxl import load_workbook
+        _, content = self.download('orders')
+        rows = list(load_workbook(BytesIO(content)).active.iter_rows(values_only=True))
+        self.assertEqual(rows[0], ('ID', 'Fecha', 'Cliente', 'Empresa', 'Total', 'Estado'))
+        self.assertEqual(rows[1][2:], ('acme', 'Acme SA', 0, 'PENDING'))
+
+    def test_csv_and_ndjson_stream_with_optional_gzip(self):
+        import gzip
+        import json
+        from unittest import mock
+        from .exporter import DataExporter
+        from .models import Order, OrderItem
+        order = Order.objects.get()
+        OrderItem.objects.create(order=order, product=Product.objects.get(sku='A-1'), quantity=3, unit_price_applied=10)
+
+        with mock.patch.object(DataExporter, 'STREAM_BUFFER', 1):
+            response, content = self.download('order-lines', format='csv')
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        lines = content.decode().splitlines()
+        self.assertEqual(lines[0], 'Pedido,Fecha,Cliente,Estado,SKU,Producto,Cantidad,Precio Unitario,Subtotal')
+        self.assertTrue(lines[1].endswith(',acme,PENDING,A-1,Martillo,3,10.00,30.00'))
+
+        response, content = self.download('clients', format='ndjson', gzip='1')
+        self.assertIn('clientes.ndjson.gz', response['Content-Disposition'])
+        records = [json.loads(line) for line in gzip.decompress(content).decode().splitlines()]
+        self.assertEqual([(r['username'], r['company_name'], r['password']) for r in records], [('acme', 'Acme SA', '')])
+
+    def test_exports_accept_admin_list_filters(self):
+        import json
+        from .models import Order
+        tools = Category.objects.get(name='Herramientas')
+        manual = Category.objects.create(name='Manuales', slug='manuales', parent=tools)
+        Product.objects.create(sku='B-1', name='Serrucho', base_price=5, brand='Bahco').categories.add(manual)
+        Product.objects.get(sku='A-1').categories.add(tools)
+
+        def skus(**params):
+            _, content = self.download('products', format='csv', **params)
+            return [line.split(',')[0] for line in content.decode().splitlines()[1:]]
+
+        self.assertEqual(skus(brand='acm'), ['A-1'])
+        self.assertEqual(skus(category='herramientas'), ['A-1', 'B-1'])  # incluye la subcategoría
+        self.assertEqual(skus(search='serru', in_stock='false'), ['B-1'])
+        self.assertEqual(self.client.get('/api/export/products/', {'min_price': 'x'}).status_code, 400)
+
+        other = User.objects.create_user(username='otro', password='x')
+        Order.objects.create(client=other, status='PAID')
+        _, content = self.download('orders', format='ndjson', status='PAID')
+        self.assertEqual([json.loads(line)['client'] for line in content.decode().splitlines()], ['otro'])
+        self.assertEqual(self.client.get('/api/export/orders/', {'client': other.pk, 'status': 'PENDING'}).status_code, 404)
+
+
+class ExportArtifactTests(TestCase):
+    def setUp(self):
+        import tempfile
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        self.settings_override = self.settings(MEDIA_ROOT=self.media.name)
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+        self.client = APIClient()
+        self.admin = User.objects.create_superuser(username='admin', password='password', role='ADMIN')
+        self.client.force_authenticate(user=self.admin)
+        Product.objects.create(sku='A-1', name='Martillo', base_price=10, stock=3)
+
+    def request_export(self, **data):
+        return self.client.post('/api/admin/exports/', {'type': 'products', 'format': 'csv', **data}, format='json')
+
+    def test_identical_requests_reuse_the_artifact_until_data_changes(self):
+        import os
+        from .exports import run_next_export
+        from .models import ExportArtifact
+
+        response = self.request_export()
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(self.request_export().data['id'], response.data['id'])  # encolado: no se duplica
+        self.assertEqual(run_next_export('test').status, 'COMPLETED')
+
+        response = self.request_export()
+        self.assertEqual(response.status_code, 200)
+        first = ExportArtifact.objects.get(pk=response.data['id'])
+        download = self.client.get(f"/api/admin/exports/{first.pk}/download/")
+        self.assertIn('attachment; filename="productos.csv"', download['Content-Disposition'])
+        self.assertIn(b'A-1,Martillo', b''.join(download.streaming_content))
+
+        Product.objects.filter(sku='A-1').update(name='Maza')  # update(): sin signals
+        self.assertEqual(self.request_export().status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.get(sku='A-1').save()
+        response = self.request_export()
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(run_next_export('test').pk, response.data['id'])
+
+        # El archivo anterior se reemplazó: registro y archivo borrados
+        self.assertFalse(ExportArtifact.objects.filter(pk=first.pk).exists())
+        self.assertFalse(os.path.exists(first.file.path))
+        download = self.client.get(f"/api/admin/exports/{response.data['id']}/download/")
+        self.assertIn(b'A-1,Maza', b''.join(download.streaming_content))
+
+        # Con filtros es otra exportación; el worker los aplica sin request
+        filtered = self.client.post('/api/admin/exports/?search=zzz', {'type': 'products', 'format': 'csv'}, format='json')
+        self.assertNotEqual(filtered.data['id'], response.data['id'])
+        self.assertEqual(filtered.data['params'], {'search': ['zzz']})
+        artifact = run_next_export('test')
+        self.assertEqual((artifact.status, artifact.file.read().decode().count('\n')), ('COMPLETED', 1))
+
+        # Orden y paginación del listado no cambian los datos: mismo artefacto
+        same = self.client.post('/api/admin/exports/?search=zzz&ordering=-sku&page=2', {'type': 'products', 'format': 'csv'}, format='json')
+        self.assertEqual((same.status_code, same.data['id']), (200, filtered.data['id']))
+
+    def test_bulk_writes_and_logins_versioning(self):
+        from io import BytesIO
+        from .importer import ProductImporter
+        from .models import DataVersion
+
+        def version():
+            return DataVersion.current(['products', 'clients'])
+
+        before = version()
+        self.client.login(username='admin', password='password')
+        self.assertEqual(version(), before)
+
+        upload = BytesIO(b'sku,stock\nA-1,7\n')
+        upload.name = 'stock.csv'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertTrue(ProductImporter(upload).process(dry_run=False)['success'])
+        self.assertNotEqual(version(), before)
+
+        # Las escrituras no tocan el contador dentro de la transacción: un solo incremento al confirmar
+        products = DataVersion.objects.get(name='products').version
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertNumQueries(6):  # 3 x (SELECT + UPDATE)
+                for _ in range(3):
+                    Product.objects.get(sku='A-1').save()
+        self.assertEqual(DataVersion.objects.get(name='products').version, products + 1)
+
+
+class InvoiceTests(TestCase):
+    def setUp(self):
+        import tempfile
+        from .models import Order, OrderItem
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        override = self.settings(MEDIA_ROOT=media.name)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.client = APIClient()
+        self.admin = User.objects.create_superuser(username='admin', password='password', role='ADMIN')
+        self.client.force_authenticate(user=self.admin)
+        self.buyer = User.objects.create_user(username='acme', password='x', company_name='Acme & Hijos SA', tax_id='30-1-2')
+        product = Product.objects.create(sku='A-1', name='Martillo <grande>', base_price=10)
+        self.orders = [Order.objects.create(client=self.buyer, total_amount=2500) for _ in range(2)]
+        for order in self.orders:
+            OrderItem.objects.create(order=order, product=product, quantity=2, unit_price_applied=1250)
+
+    def test_confirmed_orders_are_rendered_by_the_worker_and_served_from_storage(self):
+        from io import BytesIO
+        from pypdf import PdfReader
+        from .invoicing import run_next_invoice
+        from .models import Invoice
+        order, other = self.orders
+        self.assertEqual(self.client.get(f'/api/orders/{order.pk}/invoice/').status_code, 409)
+
+        # Cambio masivo (update) y guardado individual encolan la factura sin renderizar
+        self.client.post('/api/admin/orders/bulk-status/', {'status': 'CONFIRMED', 'ids': [order.pk]}, format='json')
+        other.status = 'PAID'
+        other.save()
+        self.assertEqual(list(Invoice.objects.values_list('status', flat=True)), ['PENDING', 'PENDING'])
+        self.assertEqual(self.client.get(f'/api/orders/{order.pk}/invoice/').status_code, 202)
+
+        while run_next_invoice() is not None:
+            pass
+        invoice = Invoice.objects.get(order=order)
+        self.assertEqual((invoice.status, invoice.number, invoice.client_name), ('COMPLETED', 'B-0001-00000001', 'Acme & Hijos SA'))
+
+        response = self.client.get(f'/api/orders/{order.pk}/invoice/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(f'filename="{invoice.number}.pdf"', response['Content-Disposition'])
+        text = PdfReader(BytesIO(b''.join(response.streaming_content))).pages[0].extract_text()
+        for expected in ('Acme & Hijos SA', 'Martillo <grande>', '$ 1.250,00', '$ 2.500,00', invoice.number):
+            self.assertIn(expected, text)
+
+        # Se sirve el archivo guardado: no se vuelve a generar
+        self.assertIsNone(run_next_invoice())
+        self.client.force_authenticate(user=User.objects.create_user(username='otro', password='x'))
+        self.assertEqual(self.client.get(f'/api/orders/{order.pk}/invoice/').status_code, 403)
+
+    @override_settings(PARALLEL_WORKERS=2)
+    def test_period_zip_waits_for_the_missing_invoices(self):
+        import zipfile
+        from datetime import datetime
+        from io import BytesIO, StringIO
+        from unittest import mock
+        from django.core.management import call_command
+        from django.utils import timezone
+        from . import invoicing
+        from .models import Invoice, Order
+        september, october = self.orders
+        late = Order.objects.create(client=self.buyer, total_amount=10)
+        dates = {september: datetime(2026, 9, 3, 12), october: datetime(2026, 9, 30, 23), late: datetime(2026, 10, 1, 9)}
+        for order, date in dates.items():
+            # update(): pedidos confirmados sin factura encolada
+            Order.objects.filter(pk=order.pk).update(status='CONFIRMED', created_at=timezone.make_aware(date))
+
+        period = {'date_from': '2026-09-01', 'date_to': '2026-09-30'}
+        # El request solo encola las faltantes: nada se renderiza en el web worker
+        with mock.patch.object(invoicing, 'render_invoice_pdf') as render:
+            response = self.client.get('/api/admin/invoices/zip/', period)
+        render.assert_not_called()
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data, {'status': 'PENDING', 'pending': 2, 'completed': 0, 'failed': 0})
+
+        # El cierre de mes por comando las genera en procesos paralelos
+        with mock.patch.object(invoicing, 'PARALLEL_MIN_INVOICES', 1), \
+                mock.patch.object(invoicing, 'ordered_imap', wraps=invoicing.ordered_imap) as imap:
+            call_command('generate_invoices', '--from', '2026-09-01', '--to', '2026-09-30', stdout=StringIO())
+        self.assertIsNotNone(imap.call_args.args[2])  # renderizado en el pool de procesos
+
+        response = self.client.get('/api/admin/invoices/zip/', period)
+        self.assertEqual(response.status_code, 200)
+        archive = zipfile.ZipFile(BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(archive.namelist(), ['B-0001-00000001.pdf', 'B-0001-00000002.pdf'])
+        self.assertTrue(archive.read(archive.namelist()[0]).startswith(b'%PDF'))
+        self.assertEqual(set(Invoice.objects.values_list('order_id', 'status')), {(september.pk, 'COMPLETED'), (october.pk, 'COMPLETED')})
+
+        self.assertEqual(self.client.get('/api/admin/invoices/zip/', {'date_from': '2026-13-01'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/admin/invoices/zip/', {'client': self.admin.pk}).status_code, 404)
+
+    def test_numbers_are_consecutive_per_letter_and_not_reused(self):
+        from .invoicing import queue_invoices
+        from .models import Invoice, Order
+        registered = User.objects.create_user(username='ri', password='x', iva_condition='RI')
+        orders = self.orders + [Order.objects.create(client=registered, total_amount=1) for _ in range(2)]
+        Order.objects.update(status='CONFIRMED')
+
+        queue_invoices([order.pk for order in orders])
+        queue_invoices([order.pk for order in orders])  # ya facturados: no consumen números
+        self.assertEqual(list(Invoice.objects.order_by('order_id').values_list('number', flat=True)), [
+            'B-0001-00000001', 'B-0001-00000002', 'A-0001-00000001', 'A-0001-00000002',
+        ])
+
+    def test_allocation_locks_the_series_row_before_reading_it(self):
+        from django.db import connection, transaction
+        from django.test.utils import CaptureQueriesContext
+        from .invoicing import allocate_invoice_numbers
+
+        with transaction.atomic():
+            self.assertEqual(allocate_invoice_numbers('B', 3, 7), range(1, 4))
+        # El UPDATE toma el lock de la fila de la serie; recién después se lee el valor propio
+        with transaction.atomic(), CaptureQueriesContext(connection) as queries:
+            self.assertEqual(allocate_invoice_numbers('B', 2, 7), range(4, 6))
+        statements = [query['sql'].split()[0].upper() for query in queries.captured_queries]
+        self.assertEqual([sql for sql in statements if sql in ('UPDATE', 'SELECT')], ['UPDATE', 'SELECT'])
+
+        # Si la transacción se revierte los números vuelven a la serie
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            allocate_invoice_numbers('B', 5, 7)
+            raise RuntimeError
+        with transaction.atomic():
+            self.assertEqual(allocate_invoice_numbers('B', 1, 7), range(6, 7))
+            self.assertEqual(allocate_invoice_numbers('A', 1, 7), range(1, 2))  # otra serie, otra fila
+
+    @override_settings(INVOICE_POINT_OF_SALE=3)
+    def test_migration_assigns_legacy_invoices_to_their_series(self):
+        from importlib import import_module
+        from django.apps import apps
+        from .models import Invoice, InvoiceSequence, Order
+        migration = import_module('store.migrations.0019_invoice_sequences')
+        registered = User.objects.create_user(username='ri', password='x', iva_condition='RI')
+        orders = self.orders + [Order.objects.create(client=registered, total_amount=1)]
+        for order in orders:
+            # Número anterior (A-{id de pedido}) y serie provisoria fuera de rango
+            Invoice.objects.create(order=order, number=f'A-{order.pk:08d}', sequence=1000 + order.pk, total_amount=1)
+
+        Invoice.objects.update(status='COMPLETED')
+
+        migration.number_existing_invoices(apps, None)
+
+        # Número reescrito con el formato de la serie y PDF de nuevo en la cola
+        self.assertEqual(
+            list(Invoice.objects.order_by('pk').values_list('number', 'letter', 'sequence', 'status')),
+            [('B-0003-00000001', 'B', 1, 'PENDING'), ('B-0003-00000002', 'B', 2, 'PENDING'), ('A-0003-00000001', 'A', 1, 'PENDING')],
+        )
+        self.assertEqual(
+            set(InvoiceSequence.objects.values_list('point_of_sale', 'letter', 'last_number')), {(3, 'A', 1), (3, 'B', 2)}
+        )
+
+
+class InvoiceNumberingStressTests(TransactionTestCase):
+    def test_concurrent_allocations_are_gapless(self):
+        from io import StringIO
+        from django.core.management import call_command
+        from django.db import connection
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            # La base en memoria compartida no espera a otros escritores: falla con "table is locked"
+            self.skipTest('requiere PostgreSQL o SQLite en archivo')
+        out = StringIO()
+        call_command('stress_invoice_numbering', threads=8, allocations=25, stdout=out)
+        self.assertIn('sin huecos ni duplicados', out.getvalue())
@@ -2,25 +2,36 @@ from rest_framework import generics, permissions, status, filters, viewsets
 from rest_framework.decorators import action
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework.parsers import MultiPartParser, FormParser
+from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
 from django_filters.rest_framework import DjangoFilterBackend
-from django.http import HttpResponse, StreamingHttpResponse
+from django.db import transaction
+from django.db.models import Count
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, render, redirect
+from django.utils.dateparse import parse_date
 from django.contrib.admin.views.decorators import staff_member_required
 
-from .models import Product, Order, OrderItem, Category, CustomUser, Payment
+from .models import Product, Order, OrderItem, Category, CustomUser, Payment, ImportJob, ExportArtifact, Invoice
 from .serializers import (
     ProductSerializer, OrderSerializer, UserSerializer, 
     AdminOrderSerializer, AdminProductSerializer,
     CategoryTreeSerializer, AdminCategorySerializer,
-    PublicProductSerializer
+    PublicProductSerializer, ImportJobSerializer, ExportArtifactSerializer
 )
 
 from .importer import ClientImporter, ProductImporter, CategoryImporter
-from .filters import ProductFilter
-from .invoicing import generate_invoice_pdf
+from .jobs import create_import_job, create_staging, confirm_staging, iter_job_events, retry_job, StagingError
+from .filters import ProductFilter, OrderFilter, OrderSearchFilter, ProductSearchFilter, ClientSearchFilter
+from .readers import is_supported_import
+from .invoicing import INVOICED_STATUSES, invoice_orders, iter_invoices_zip, queue_invoices
 from .payments import PaymentService
 from .exporter import DataExporter
+from .exports import export_params, export_queryset, request_export, touch_artifact
+from .orders import transition_orders
+from .pricing import price_lines, iter_product_prices
+from . import quick_order
+from decimal import Decimal
+import json
 from rest_framework.pagination import PageNumberPagination
 
 class LargePagination(PageNumberPagination):
@@ -36,7 +47,6 @@ class StandardResultsSetPagination(PageNumberPagination):
     max_page_size = 100
 
 
-
 class ClientPagination(PageNumberPagination):
     """Paginación para clientes - 100 por página para carga rápida."""
     page_size = 100
@@ -208,32 +218,183 @@ class OrderListView(generics.ListAPIView):
         return Order.objects.filter(client=self.request.user).order_by('-created_at')
 
 
+class QuickOrderView(APIView):
+    """
+    POST /api/orders/quick/
+    Pedido rápido: recibe un listado SKU/cantidad y devuelve el carrito cotizado.
+
+    Acepta:
+      - multipart con 'file' (.csv o .xlsx, SKU en col 1 y cantidad en col 2)
+      - JSON/form con 'text' (una línea por producto: "SKU,cantidad")
+    Con 'create_order=true' crea el pedido (PENDING) con las líneas válidas.
+    Las líneas con error se informan pero no se incluyen en el pedido.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    parser_classes = (JSONParser, MultiPartParser, FormParser)
+
+    def post(self, request):
+        file_obj = request.FILES.get('file')
+        text = request.data.get('text')
+
+        try:
+            if file_obj:
+                lines = quick_order.parse_file(file_obj)
+            elif text:
+                lines = quick_order.parse_text(text)
+            else:
+                return Response({'error': "Enviá un archivo ('file') o el listado como texto ('text')."}, status=400)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=400)
+        except Exception as e:
+            return Response({'error': f"No se pudo leer el archivo: {e}"}, status=400)
+
+        if not lines:
+            return Response({'error': 'El listado no contiene líneas.'}, status=400)
+
+        quote = price_lines(request.user, lines, key='sku')
+        quote['order_id'] = None
+
+        create_order = str(request.data.get('create_order', 'false')).lower() == 'true'
+        valid_lines = [line for line in quote['lines'] if line['status'] == 'OK']
+
+        if create_order and valid_lines:
+            with transaction.atomic():
+                order = Order.objects.create(
+                    client=request.user,
+                    total_amount=Decimal(quote['totals']['total'])
+                )
+                OrderItem.objects.bulk_create([
+                    OrderItem(
+                        order=order,
+                        product_id=line['product_id'],
+                        quantity=line['quantity'],
+                        unit_price_applied=Decimal(line['unit_price'])
+                    )
+                    for line in valid_lines
+                ], batch_size=1000)
+            quote['order_id'] = order.id
+            return Response(quote, status=status.HTTP_201_CREATED)
+
+        return Response(quote)
+
+
+class CartQuoteView(APIView):
+    """
+    POST /api/cart/quote/
+    Revalida el carrito en un solo round trip: precios con descuento vigentes,
+    disponibilidad de stock y totales, resueltos en una sola consulta.
+    Body: { "items": [{"product_id": 1, "quantity": 2}, ...] }
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        items = request.data.get('items', [])
+        if not isinstance(items, list):
+            return Response({'error': 'items debe ser una lista'}, status=400)
+        if len(items) > quick_order.MAX_QUICK_ORDER_LINES:
+            return Response({'error': f"Se permiten hasta {quick_order.MAX_QUICK_ORDER_LINES} líneas."}, status=400)
+
+        lines = []
+        for number, item in enumerate(items, start=1):
+            if not isinstance(item, dict):
+                item = {}
+            try:
+                product_id = int(item.get('product_id'))
+            except (TypeError, ValueError):
+                product_id = None
+            lines.append({
+                'line': number,
+                'product_id': product_id,
+                'quantity': quick_order.parse_quantity(item.get('quantity', 1)),
+            })
+
+        return Response(price_lines(request.user, lines, key='product_id'))
+
+
+class ProductLookupView(APIView):
+    """
+    POST /api/products/lookup/
+    Búsqueda masiva por lista de SKUs o ids (ERP, carrito).
+    Body: { "skus": ["A1", "B2", ...] }  o  { "ids": [1, 2, ...] }
+    Devuelve precio con descuento del cliente, stock y estado activo, en una
+    sola consulta indexada y con respuesta en streaming:
+    { "results": [...], "not_found": [...] }
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    MAX_KEYS = 5000
+
+    def post(self, request):
+        skus = request.data.get('skus')
+        ids = request.data.get('ids')
+
+        if skus is not None:
+            field, raw_keys = 'sku', skus
+        elif ids is not None:
+            field, raw_keys = 'id', ids
+        else:
+            return Response({'error': "Enviá 'skus' o 'ids'."}, status=400)
+
+        if not isinstance(raw_keys, list):
+            return Response({'error': f"'{field}s' debe ser una lista"}, status=400)
+        if len(raw_keys) > self.MAX_KEYS:
+            return Response({'error': f"Se permiten hasta {self.MAX_KEYS} claves por consulta."}, status=400)
+
+        try:
+            if field == 'id':
+                keys = list(dict.fromkeys(int(k) for k in raw_keys))
+            else:
+                keys = list(dict.fromkeys(str(k).strip() for k in raw_keys if str(k).strip()))
+        except (TypeError, ValueError):
+            return Response({'error': 'Los ids deben ser numéricos'}, status=400)
+
+        rows = iter_product_prices(request.user, field, keys)
+
+        def stream():
+            found = set()
+            yield '{"results":['
+            for index, row in enumerate(rows):
+                found.add(row[field])
+                yield (',' if index else '') + json.dumps(row, ensure_ascii=False)
+            not_found = [k for k in keys if k not in found]
+            yield '],"not_found":' + json.dumps(not_found, ensure_ascii=False) + '}'
+
+        return StreamingHttpResponse(stream(), content_type='application/json')
+
+
 class GenerateInvoiceView(APIView):
-    """Genera y descarga el PDF de factura para una orden."""
+    """
+    Descarga el PDF de factura de una orden confirmada.
+
+    El PDF se genera una sola vez en el worker (store/invoicing.py) y acá se
+    sirve el archivo guardado. Si todavía no está listo responde 202 (se
+    puede reintentar en unos segundos).
+    """
     permission_classes = [permissions.IsAuthenticated]
 
     def get(self, request, pk):
         try:
-            order = Order.objects.get(pk=pk)
-            if order.client != request.user and not request.user.is_staff:
-                return Response({"error": "No tienes permiso"}, status=403)
-            
-            invoice = generate_invoice_pdf(pk)
-            if not invoice:
-                return Response({"error": "Error generando PDF"}, status=500)
-            
-            if invoice.pdf_file:
-                with invoice.pdf_file.open('rb') as f:
-                    pdf_data = f.read()
-                
-                response = HttpResponse(pdf_data, content_type='application/pdf')
-                response['Content-Disposition'] = f'attachment; filename="{invoice.number}.pdf"'
-                return response
-            
-            return Response({"error": "PDF no encontrado"}, status=404)
-
+            order = Order.objects.select_related('invoice').get(pk=pk)
         except Order.DoesNotExist:
             return Response({"error": "Orden no encontrada"}, status=404)
+        if order.client_id != request.user.pk and not request.user.is_staff:
+            return Response({"error": "No tienes permiso"}, status=403)
+        if order.status not in INVOICED_STATUSES:
+            return Response({"error": "La orden todavía no fue confirmada"}, status=409)
+
+        invoice = getattr(order, 'invoice', None)
+        if invoice is None:
+            # Orden confirmada antes de generar facturas en segundo plano
+            queue_invoices([order.pk])
+            return Response({"status": "PENDING"}, status=status.HTTP_202_ACCEPTED)
+        if invoice.status == 'FAILED':
+            return Response({"error": f"Error generando PDF: {invoice.error}"}, status=500)
+        if invoice.status != 'COMPLETED' or not invoice.pdf_file:
+            return Response({"status": invoice.status}, status=status.HTTP_202_ACCEPTED)
+
+        return FileResponse(
+            invoice.pdf_file.open('rb'), as_attachment=True, filename=f"{invoice.number}.pdf",
+            content_type='application/pdf',
+        )
 
 
 # =============================================================================
@@ -268,9 +429,7 @@ class AdminCategoryViewSet(viewsets.ModelViewSet):
             queryset = queryset.filter(is_active=is_active.lower() == 'true')
         
         return queryset
-    
 
-    
     @action(detail=True, methods=['post'], url_path='assign-products')
     def assign_products(self, request, pk=None):
         """
@@ -385,9 +544,8 @@ class AdminProductViewSet(viewsets.ModelViewSet):
     serializer_class = AdminProductSerializer
     permission_classes = [permissions.IsAdminUser]
     pagination_class = LargePagination
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter]
+    filter_backends = [DjangoFilterBackend, ProductSearchFilter]
     filterset_class = ProductFilter
-    search_fields = ['name', 'sku', 'brand', 'supplier']
     
     # Override pagination for admin - more items per page
     def get_queryset(self):
@@ -400,8 +558,7 @@ class AdminUserViewSet(viewsets.ModelViewSet):
     serializer_class = UserSerializer
     permission_classes = [permissions.IsAdminUser]
     pagination_class = ClientPagination  # 100 items por página
-    filter_backends = [filters.SearchFilter, filters.OrderingFilter]
-    search_fields = ['username', 'email', 'company_name', 'tax_id', 'client_number', 'contact_name', 'phone']
+    filter_backends = [ClientSearchFilter, filters.OrderingFilter]
     ordering_fields = ['date_joined', 'company_name', 'client_number']
     ordering = ['-date_joined']
 
@@ -420,30 +577,54 @@ class AdminOrderViewSet(viewsets.ModelViewSet):
     queryset = Order.objects.all().order_by('-created_at')
     serializer_class = AdminOrderSerializer
     permission_classes = [permissions.IsAdminUser]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter]
-    filterset_fields = ['status', 'client']
-    search_fields = ['client__company_name', 'client__client_number', 'client__email']
+    filter_backends = [DjangoFilterBackend, OrderSearchFilter]
+    filterset_class = OrderFilter  # ?status=, ?client= y ?client_id=
 
     def get_queryset(self):
-        """Permite filtrar por client_id via query param."""
-        queryset = Order.objects.all().select_related('client').prefetch_related('items__product').order_by('-created_at')
-        client_id = self.request.query_params.get('client_id')
-        if client_id:
-            queryset = queryset.filter(client_id=client_id)
-        return queryset
-
-
-
-
+        return Order.objects.all().select_related('client').prefetch_related('items__product').order_by('-created_at')
 
+    @action(detail=False, methods=['post'], url_path='bulk-status')
+    def bulk_status(self, request):
+        """
+        POST /api/admin/orders/bulk-status/
+        Body:
+          - { "status": "SHIPPED", "ids": [1, 2, 3] }  (Selección manual)
+          - { "status": "SHIPPED", "select_all_matching": true }
+            (Masivo: aplica los mismos filtros del listado vía query params,
+             ej: ?status=PAID&client=5&search=acme)
+        Devuelve el resultado por pedido y los totales.
+        """
+        target = request.data.get('status')
+        if target not in dict(Order.STATUS_CHOICES):
+            return Response({'error': f"Estado inválido: {target}"}, status=400)
 
+        if request.data.get('select_all_matching'):
+            queryset = self.filter_queryset(self.get_queryset()).order_by()
+            order_ids = list(queryset.values_list('id', flat=True))
+        else:
+            order_ids = request.data.get('ids', [])
+            if not isinstance(order_ids, list):
+                return Response({'error': 'ids debe ser una lista'}, status=400)
+            try:
+                order_ids = [int(pk) for pk in order_ids]
+            except (TypeError, ValueError):
+                return Response({'error': 'Los ids deben ser numéricos'}, status=400)
 
+        results, moved = transition_orders(order_ids, target)
+        return Response({
+            'message': f'{len(moved)} de {len(results)} pedidos pasaron a {target}',
+            'updated_count': len(moved),
+            'failed_count': len(results) - len(moved),
+            'results': results,
+        })
 
 
 class ClientImportPreviewView(APIView):
     """
     Paso 1: Previsualizar importación de clientes (Streaming).
-    Devuelve estadísticas y lista de cambios sin aplicar en DB.
+    Devuelve estadísticas y lista de cambios sin aplicar en DB. Las filas
+    validadas quedan en un staging identificado por `content_hash` (en el
+    resultado) para confirmarlas sin volver a subir el archivo.
     """
     parser_classes = (MultiPartParser, FormParser)
     permission_classes = [permissions.IsAdminUser]
@@ -453,39 +634,86 @@ class ClientImportPreviewView(APIView):
         if not file_obj:
             return Response({"error": "No se envió ningún archivo"}, status=400)
 
-        if not file_obj.name.endswith('.xlsx'):
-            return Response({"error": "El archivo debe ser Excel (.xlsx)"}, status=400)
+        if not is_supported_import(file_obj.name):
+            return Response({"error": "El archivo debe ser Excel (.xlsx), CSV o Parquet"}, status=400)
+
+        try:
+            staging = create_staging('CLIENTS', file_obj, user=request.user)
+        except StagingError as e:
+            return Response({"error": str(e)}, status=e.status)
 
         importer = ClientImporter(file_obj)
         # Streaming para barra de carga en analisis
         response = StreamingHttpResponse(
-            importer.process_streaming(dry_run=True),
+            importer.process_streaming(dry_run=True, staging=staging),
             content_type='application/json'
         )
         return response
 
 
+def enqueue_import(request, kind, options=None):
+    """Guarda el archivo subido como ImportJob y responde 202 con el job (el worker lo procesa)."""
+    file_obj = request.FILES.get('file')
+    if not file_obj:
+        return Response({"error": "No se envió ningún archivo."}, status=400)
+    if not is_supported_import(file_obj.name):
+        return Response({"error": "El archivo debe ser Excel (.xlsx), CSV o Parquet"}, status=400)
+
+    job = create_import_job(kind, file_obj, user=request.user, options=options)
+    return Response(ImportJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+
+
 class ClientImportConfirmView(APIView):
     """
-    Paso 2: Ejecutar importación real (Streaming).
+    Paso 2: Encolar la importación real. Con `content_hash` aplica la
+    previsualización guardada (sin re-subir ni re-parsear el archivo); con
+    `file` importa el archivo completo. El progreso se consulta en
+    /api/admin/imports/<id>/ (polling) o /api/admin/imports/<id>/events/ (NDJSON).
     """
-    parser_classes = (MultiPartParser, FormParser)
+    parser_classes = (MultiPartParser, FormParser, JSONParser)
     permission_classes = [permissions.IsAdminUser]
 
     def post(self, request, *args, **kwargs):
-        file_obj = request.FILES.get('file')
-        update_passwords = request.data.get('update_passwords', 'false').lower() == 'true'
-        
-        if not file_obj:
-            return Response({"error": "No se envió ningún archivo."}, status=400)
+        update_passwords = str(request.data.get('update_passwords', 'false')).lower() == 'true'
+        digest = request.data.get('content_hash')
+        if not digest:
+            return enqueue_import(request, 'CLIENTS', {'update_passwords': update_passwords})
 
-        importer = ClientImporter(file_obj)
-        # Usamos StreamingHttpResponse con el generador
-        response = StreamingHttpResponse(
-            importer.process_streaming(dry_run=False, update_passwords=update_passwords),
-            content_type='application/json'
-        )
-        return response
+        try:
+            job = confirm_staging('CLIENTS', digest, user=request.user, options={'update_passwords': update_passwords})
+        except StagingError as e:
+            return Response({"error": str(e)}, status=e.status)
+        return Response(ImportJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+
+
+class ImportJobViewSet(viewsets.ReadOnlyModelViewSet):
+    """Estado de las importaciones en segundo plano (clientes, productos, categorías)."""
+    serializer_class = ImportJobSerializer
+    permission_classes = [permissions.IsAdminUser]
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = ['kind', 'status']
+
+    def get_queryset(self):
+        return ImportJob.objects.defer('file_data').order_by('-created_at')
+
+    @action(detail=True, methods=['get'])
+    def events(self, request, pk=None):
+        """
+        Stream NDJSON del progreso (mismo formato que el importador). Cortar la
+        conexión no afecta al job; los streams largos terminan con un evento
+        'reconnect' (ver jobs.iter_job_events).
+        """
+        job = self.get_object()
+        return StreamingHttpResponse(iter_job_events(job.pk), content_type='application/x-ndjson')
+
+    @action(detail=True, methods=['post'])
+    def retry(self, request, pk=None):
+        """Reencola un job fallido; retoma desde el último bloque confirmado."""
+        job = self.get_object()
+        if not retry_job(job):
+            return Response({'error': 'Solo se pueden reintentar importaciones fallidas'}, status=400)
+        job.refresh_from_db()
+        return Response(ImportJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
 
 
 class DeleteAllClientsView(APIView):
@@ -515,33 +743,151 @@ class DeleteAllClientsView(APIView):
         })
 
 
+class InvoiceBatchView(APIView):
+    """
+    Facturas de un período y/o cliente en un único ZIP (cierre de mes).
+
+    Query params: date_from / date_to (YYYY-MM-DD, inclusive) y client (id).
+    No genera PDFs en el request: encola las facturas que falten para el
+    worker y, mientras haya pendientes, responde 202 con el avance
+    ({status, pending, completed, failed}) para reintentar en unos segundos.
+    Con todas generadas envía el ZIP en streaming, copiando los PDFs
+    guardados de a bloques (las fallidas se listan en errores.txt).
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        dates = {}
+        for param in ('date_from', 'date_to'):
+            raw = request.query_params.get(param)
+            try:
+                dates[param] = parse_date(raw) if raw else None
+            except ValueError:
+                dates[param] = None
+            if raw and dates[param] is None:
+                return Response({'error': f"Fecha inválida en '{param}' (YYYY-MM-DD)"}, status=400)
+        client_id = request.query_params.get('client')
+        if client_id and not client_id.isdigit():
+            return Response({'error': "'client' debe ser un id numérico"}, status=400)
+
+        orders = invoice_orders(dates['date_from'], dates['date_to'], client_id)
+        if not orders.exists():
+            return Response({'error': 'No hay pedidos facturados en el período'}, status=404)
+        order_ids = orders.order_by().values('pk')
+        queue_invoices(order_ids)
+
+        invoices = Invoice.objects.filter(order__in=order_ids)
+        counts = dict(invoices.order_by().values_list('status').annotate(total=Count('pk')))
+        pending = counts.get('PENDING', 0) + counts.get('RUNNING', 0)
+        if pending:
+            return Response({
+                'status': 'PENDING',
+                'pending': pending,
+                'completed': counts.get('COMPLETED', 0),
+                'failed': counts.get('FAILED', 0),
+            }, status=status.HTTP_202_ACCEPTED)
+
+        period = '_'.join(str(d) for d in dates.values() if d) or 'todas'
+        response = StreamingHttpResponse(iter_invoices_zip(invoices), content_type='application/zip')
+        response['Content-Disposition'] = f'attachment; filename="facturas_{period}.zip"'
+        return response
+
+
 class ExportDataView(APIView):
-    """Exporta datos a Excel (productos o ventas)."""
+    """
+    Exporta datos: productos, ventas (orders), detalle de ventas
+    (order-lines) o clientes.
+
+    Query params:
+      - format: xlsx (default), csv o ndjson. csv/ndjson se envían en
+        streaming a medida que se leen de la base; el Excel se genera en un
+        archivo temporal y se envía al terminar.
+      - gzip=1: comprime csv/ndjson (.gz).
+      - Filtros: los mismos del listado del admin (ver exports.export_queryset),
+        ej: ?brand=acme&category=herramientas o ?status=PAID&search=acme.
+    """
     permission_classes = [permissions.IsAdminUser]
 
+    def perform_content_negotiation(self, request, force=False):
+        # `format` elige el formato del archivo, no el renderer de DRF
+        return super().perform_content_negotiation(request, force=True)
+
     def get(self, request, type_):
         exporter = DataExporter()
-        data = None
-        filename = "export.xlsx"
-
-        if type_ == 'products':
-            data = exporter.export_products()
-            filename = "productos.xlsx"
-        elif type_ == 'orders':
-            data = exporter.export_orders()
-            filename = "ventas.xlsx"
-        
-        if not data:
+        format_ = request.query_params.get('format', 'xlsx').lower()
+        compress = request.query_params.get('gzip', '').lower() in ('1', 'true')
+        if type_ not in exporter.EXPORTS:
             return Response({'error': 'No data found'}, status=404)
+        if format_ not in exporter.FORMATS:
+            return Response({'error': f"Formato inválido: {format_}. Opciones: {', '.join(exporter.FORMATS)}"}, status=400)
 
-        response = HttpResponse(
-            data,
-            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        )
-        response['Content-Disposition'] = f'attachment; filename={filename}'
+        queryset = export_queryset(type_, export_params(type_, request.query_params))
+        if not queryset.exists():
+            return Response({'error': 'No data found'}, status=404)
+
+        filename = exporter.filename(type_, format_, compress)
+        content_type = exporter.content_type(format_, compress)
+        if format_ == 'xlsx':
+            return FileResponse(
+                exporter.export_xlsx(type_, queryset), as_attachment=True, filename=filename, content_type=content_type
+            )
+
+        response = StreamingHttpResponse(exporter.stream(type_, format_, queryset, compress), content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
         return response
 
 
+class ExportArtifactViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Exportaciones en segundo plano con archivos cacheados (ver store/exports.py).
+
+    POST { "type": "products", "format": "xlsx", "gzip": false }
+      -> 200 con el archivo ya generado para los datos actuales (download_url),
+         o 202 con el artefacto encolado/en curso para consultar su estado.
+         Los filtros van como query params, igual que en el listado del admin
+         (ej: ?brand=acme&search=martillo).
+    GET <id>/download/ -> el archivo, servido desde el storage.
+    """
+    serializer_class = ExportArtifactSerializer
+    permission_classes = [permissions.IsAdminUser]
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = ['export_type', 'format', 'status']
+    queryset = ExportArtifact.objects.order_by('-created_at')
+
+    def create(self, request):
+        exporter = DataExporter()
+        type_ = request.data.get('type')
+        format_ = str(request.data.get('format', 'xlsx')).lower()
+        compress = str(request.data.get('gzip', 'false')).lower() in ('1', 'true')
+        if type_ not in exporter.EXPORTS:
+            return Response({'error': f"Tipo inválido: {type_}. Opciones: {', '.join(exporter.EXPORTS)}"}, status=400)
+        if format_ not in exporter.FORMATS:
+            return Response({'error': f"Formato inválido: {format_}. Opciones: {', '.join(exporter.FORMATS)}"}, status=400)
+
+        params = export_params(type_, request.query_params)
+        export_queryset(type_, params)  # valida los filtros antes de encolar
+        artifact, _ = request_export(type_, format_, compress, params, user=request.user)
+        code = status.HTTP_200_OK if artifact.status == 'COMPLETED' else status.HTTP_202_ACCEPTED
+        return Response(self.get_serializer(artifact).data, status=code)
+
+    @action(detail=True, methods=['get'])
+    def download(self, request, pk=None):
+        artifact = self.get_object()
+        if artifact.status != 'COMPLETED' or not artifact.file:
+            return Response({'error': 'La exportación todavía no está lista'}, status=409)
+        touch_artifact(artifact)
+        try:
+            # Storage local: FileResponse usa wsgi.file_wrapper (sendfile) si el servidor lo soporta
+            artifact.file.path
+        except NotImplementedError:
+            # Storage remoto (S3, etc.): el cliente descarga directo de ahí
+            return redirect(artifact.file.url)
+        return FileResponse(
+            artifact.file.open('rb'), as_attachment=True, filename=artifact.file_name,
+            content_type=DataExporter().content_type(artifact.format, artifact.compress),
+        )
+
+
 # =============================================================================
 # PAYMENT VIEWS
 # =============================================================================
@@ -610,38 +956,38 @@ from rest_framework.views import APIView
 from rest_framework.parsers import MultiPartParser
 
 class ProductImportAPIView(APIView):
+    """Encola una importación de productos (ver ImportJobViewSet para el progreso)."""
+    permission_classes = [permissions.IsAdminUser]
+    parser_classes = [MultiPartParser]
+
+    def post(self, request, format=None):
+        return enqueue_import(request, 'PRODUCTS')
+
+class ProductImportPreviewView(APIView):
+    """
+    Previsualiza una importación de productos sin escribir en la base: altas,
+    cambios (antes/después por campo), sin cambios y filas inválidas.
+    """
     permission_classes = [permissions.IsAdminUser]
     parser_classes = [MultiPartParser]
 
     def post(self, request, format=None):
         file_obj = request.FILES.get('file')
         if not file_obj:
-            return Response({'error': 'No file provided'}, status=400)
-        
-        importer = ProductImporter(file_obj)
-        result = importer.process(dry_run=False)
-        
-        if result.get('success'):
-            return Response(result)
-        else:
-            return Response({'error': result.get('error')}, status=400)
+            return Response({"error": "No se envió ningún archivo."}, status=400)
+        if not is_supported_import(file_obj.name):
+            return Response({"error": "El archivo debe ser Excel (.xlsx), CSV o Parquet"}, status=400)
+
+        result = ProductImporter(file_obj).process(dry_run=True)
+        return Response(result, status=200 if result.get('success') else 400)
 
 class CategoryImportAPIView(APIView):
+    """Encola una importación de categorías (ver ImportJobViewSet para el progreso)."""
     permission_classes = [permissions.IsAdminUser]
     parser_classes = [MultiPartParser]
 
     def post(self, request, format=None):
-        file_obj = request.FILES.get('file')
-        if not file_obj:
-            return Response({'error': 'No file provided'}, status=400)
-        
-        importer = CategoryImporter(file_obj)
-        result = importer.process(dry_run=False)
-        
-        if result.get('success'):
-            return Response(result)
-        else:
-            return Response({'error': result.get('error')}, status=400)
+        return enqueue_import(request, 'CATEGORIES')
 
 @staff_member_required
 def admin_custom_import(request):
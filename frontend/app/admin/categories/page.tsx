@@ -6,6 +6,7 @@ import Cookies from 'js-cookie';
 import { Layers, Plus, Edit, Trash2, Folder, FolderOpen, Save, X, Eye, EyeOff, Package, CheckSquare, Square, Search, List as ListIcon, Trash } from 'lucide-react';
 import { useDebounce } from 'use-debounce';
 import { apiEndpoints } from '@/lib/config';
+import { waitForImportJob } from '@/lib/importJobs';
 
 interface Category {
     id: number;
@@ -236,8 +237,11 @@ export default function AdminCategoriesPage() {
                     Authorization: `Bearer ${getToken()}`
                 }
             });
-            setImportResult(res.data);
-            if (res.data.success) {
+            // La importación corre en segundo plano: esperar a que termine
+            const job = await waitForImportJob(res.data.id, getToken());
+            const result = job.status === 'COMPLETED' ? job.result : { success: false, error: job.error };
+            setImportResult(result);
+            if (result.success) {
                 fetchCategories(); // Refresh list
             }
         } catch (err: any) {
@@ -825,7 +829,7 @@ export default function AdminCategoriesPage() {
                                         <div className="border-2 border-dashed border-gray-300 rounded-lg p-6 text-center hover:bg-gray-50 transition cursor-pointer relative">
                                             <input
                                                 type="file"
-                                                accept=".xlsx, .xls"
+                                                accept=".xlsx,.csv,.parquet"
                                                 onChange={(e) => setImportFile(e.target.files?.[0] || null)}
                                                 className="absolute inset-0 w-full h-full opacity-0 cursor-pointer"
                                             />
@@ -834,7 +838,7 @@ export default function AdminCategoriesPage() {
                                                 <div className="text-sm font-bold text-gray-700">
                                                     {importFile ? importFile.name : 'Haz clic para seleccionar el Excel'}
                                                 </div>
-                                                <div className="text-xs text-gray-500">Solo archivos .xlsx</div>
+                                                <div className="text-xs text-gray-500">Archivos .xlsx, .csv o .parquet</div>
                                             </div>
                                         </div>
 
@@ -848,7 +852,7 @@ export default function AdminCategoriesPage() {
                                             </button>
                                         </div>
                                         <div className="text-xs text-gray-400 mt-2 text-center">
-                                            Columnas esperadas: Name (obligatorio), Slug, Order
+                                            Columnas: Ruta (ej: Herramientas &gt; Manuales) o Nombre + Padre, Slug, Orden
                                         </div>
                                     </form>
                                 ) : (
@@ -861,6 +865,7 @@ export default function AdminCategoriesPage() {
                                                 <ul className="text-sm space-y-1 list-disc pl-5">
                                                     <li>Creadas: <b>{importResult.stats?.created}</b></li>
                                                     <li>Actualizadas: <b>{importResult.stats?.updated}</b></li>
+                                                    <li>Sin cambios: <b>{importResult.stats?.unchanged ?? 0}</b></li>
                                                     <li>Errores: <b>{importResult.stats?.errors}</b></li>
                                                 </ul>
                                             </div>
@@ -5,6 +5,7 @@ import axios from 'axios';
 import Cookies from 'js-cookie';
 import { Package, Search, Edit, Plus, Eye, EyeOff, X, Check, ChevronLeft, ChevronRight, Save } from 'lucide-react';
 import { apiEndpoints } from '@/lib/config';
+import { waitForImportJob } from '@/lib/importJobs';
 
 interface Category {
     id: number;
@@ -52,6 +53,7 @@ export default function AdminProductsPage() {
     const [importFile, setImportFile] = useState<File | null>(null);
     const [importing, setImporting] = useState(false);
     const [importResult, setImportResult] = useState<any>(null);
+    const [importPreview, setImportPreview] = useState<any>(null);
 
     // Filter states
     const [showOnlyActive, setShowOnlyActive] = useState<boolean | null>(null);
@@ -190,12 +192,39 @@ export default function AdminProductsPage() {
         }
     };
 
+    const handlePreview = async () => {
+        if (!importFile) return;
+
+        setImporting(true);
+        setImportPreview(null);
+
+        const formData = new FormData();
+        formData.append('file', importFile);
+
+        try {
+            // Solo lectura: compara el archivo con los productos actuales
+            const res = await axios.post(apiEndpoints.productImportPreviewAPI, formData, {
+                headers: {
+                    'Content-Type': 'multipart/form-data',
+                    Authorization: `Bearer ${getToken()}`
+                }
+            });
+            setImportPreview(res.data);
+        } catch (err: any) {
+            console.error('Preview Error:', err);
+            setImportResult({ success: false, error: err.response?.data?.error || err.message || 'Error de conexión' });
+        } finally {
+            setImporting(false);
+        }
+    };
+
     const handleImport = async (e: React.FormEvent) => {
         e.preventDefault();
         if (!importFile) return;
 
         setImporting(true);
         setImportResult(null);
+        setImportPreview(null);
 
         const formData = new FormData();
         formData.append('file', importFile);
@@ -207,8 +236,11 @@ export default function AdminProductsPage() {
                     Authorization: `Bearer ${getToken()}`
                 }
             });
-            setImportResult(res.data);
-            if (res.data.success) {
+            // La importación corre en segundo plano: esperar a que termine
+            const job = await waitForImportJob(res.data.id, getToken());
+            const result = job.status === 'COMPLETED' ? job.result : { success: false, error: job.error };
+            setImportResult(result);
+            if (result.success) {
                 fetchProducts(); // Refresh list
             }
         } catch (err: any) {
@@ -634,8 +666,8 @@ export default function AdminProductsPage() {
                                     <div className="border-2 border-dashed border-gray-300 rounded-lg p-6 text-center hover:bg-gray-50 transition cursor-pointer relative">
                                         <input
                                             type="file"
-                                            accept=".xlsx, .xls"
-                                            onChange={(e) => setImportFile(e.target.files?.[0] || null)}
+                                            accept=".xlsx,.csv,.parquet"
+                                            onChange={(e) => { setImportFile(e.target.files?.[0] || null); setImportPreview(null); }}
                                             className="absolute inset-0 w-full h-full opacity-0 cursor-pointer"
                                         />
                                         <div className="space-y-2">
@@ -643,17 +675,51 @@ export default function AdminProductsPage() {
                                             <div className="text-sm font-bold text-gray-700">
                                                 {importFile ? importFile.name : 'Haz clic para seleccionar el Excel'}
                                             </div>
-                                            <div className="text-xs text-gray-500">Solo archivos .xlsx</div>
+                                            <div className="text-xs text-gray-500">Archivos .xlsx, .csv o .parquet</div>
                                         </div>
                                     </div>
 
-                                    <div className="pt-2">
+                                    {importPreview && (
+                                        <div className="bg-blue-50 p-4 rounded border border-blue-200 text-blue-900 text-sm space-y-2">
+                                            <div className="font-bold">Previsualización (no se guardó nada)</div>
+                                            <ul className="space-y-1 list-disc pl-5">
+                                                <li>Nuevos: <b>{importPreview.stats?.created}</b></li>
+                                                <li>Con cambios: <b>{importPreview.stats?.updated}</b></li>
+                                                <li>Sin cambios: <b>{importPreview.stats?.unchanged}</b></li>
+                                                <li>Inválidos: <b>{importPreview.stats?.errors}</b></li>
+                                            </ul>
+                                            <div className="max-h-48 overflow-y-auto bg-white p-2 rounded text-xs font-mono border border-blue-100">
+                                                {importPreview.preview?.changed?.map((c: any) => (
+                                                    <div key={c.sku}>
+                                                        <b>{c.sku}</b>{' '}
+                                                        {Object.entries(c.changes).map(([field, v]: [string, any]) => (
+                                                            <span key={field} className="mr-2">{field}: {String(v.before ?? '—')} → {String(v.after ?? '—')}</span>
+                                                        ))}
+                                                    </div>
+                                                ))}
+                                                {importPreview.preview?.invalid?.map((r: any) => (
+                                                    <div key={`inv-${r.row}`} className="text-red-700">Fila {r.row} ({r.sku}): {r.message}</div>
+                                                ))}
+                                                {importPreview.truncated && <div className="text-gray-500">Se muestran los primeros cambios.</div>}
+                                            </div>
+                                        </div>
+                                    )}
+
+                                    <div className="pt-2 flex gap-2">
+                                        <button
+                                            type="button"
+                                            onClick={handlePreview}
+                                            disabled={!importFile || importing}
+                                            className="flex-1 bg-gray-200 text-gray-800 font-bold py-3 rounded hover:bg-gray-300 transition disabled:opacity-50 disabled:cursor-not-allowed"
+                                        >
+                                            Previsualizar
+                                        </button>
                                         <button
                                             type="submit"
                                             disabled={!importFile || importing}
-                                            className="w-full bg-blue-600 text-white font-bold py-3 rounded hover:bg-blue-700 transition disabled:opacity-50 disabled:cursor-not-allowed flex justify-center items-center gap-2"
+                                            className="flex-1 bg-blue-600 text-white font-bold py-3 rounded hover:bg-blue-700 transition disabled:opacity-50 disabled:cursor-not-allowed flex justify-center items-center gap-2"
                                         >
-                                            {importing ? 'Importando...' : 'Subir e Importar'}
+                                            {importing ? 'Procesando...' : importPreview ? 'Confirmar e Importar' : 'Subir e Importar'}
                                         </button>
                                     </div>
                                 </form>
@@ -667,6 +733,7 @@ export default function AdminProductsPage() {
                                             <ul className="text-sm space-y-1 list-disc pl-5">
                                                 <li>Creados: <b>{importResult.stats?.created}</b></li>
                                                 <li>Actualizados: <b>{importResult.stats?.updated}</b></li>
+                                                <li>Sin cambios: <b>{importResult.stats?.unchanged ?? 0}</b></li>
                                                 <li>Errores: <b>{importResult.stats?.errors}</b></li>
                                             </ul>
                                         </div>
@@ -6,7 +6,7 @@ import Cookies from 'js-cookie';
 import { useRouter } from 'next/navigation';
 import { FileSpreadsheet, Download, ShieldAlert } from 'lucide-react';
 import Link from 'next/link';
-import { API_URL } from '@/lib/config';
+import { requestExport } from '@/lib/exportJobs';
 
 export default function ReportsPage() {
     const router = useRouter();
@@ -16,7 +16,13 @@ export default function ReportsPage() {
         if (!token) return router.push('/login');
 
         try {
-            const res = await axios.get(`${API_URL}/api/export/${type}/`, {
+            // Se genera en segundo plano; si no hubo cambios se reutiliza el último archivo
+            const artifact = await requestExport(type, token);
+            if (artifact.status !== 'COMPLETED' || !artifact.download_url) {
+                alert(`Error generando reporte: ${artifact.error || 'desconocido'}`);
+                return;
+            }
+            const res = await axios.get(artifact.download_url, {
                 headers: { Authorization: `Bearer ${token}` },
                 responseType: 'blob',
             });
@@ -24,7 +30,7 @@ export default function ReportsPage() {
             const url = window.URL.createObjectURL(new Blob([res.data]));
             const link = document.createElement('a');
             link.href = url;
-            link.setAttribute('download', `reporte_${type}.xlsx`);
+            link.setAttribute('download', artifact.file_name);
             document.body.appendChild(link);
             link.click();
             link.parentNode?.removeChild(link);
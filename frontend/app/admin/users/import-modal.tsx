@@ -5,6 +5,7 @@ import { X, Upload, CheckCircle, AlertCircle, AlertTriangle, FileUp, Loader2, Fi
 import axios from 'axios';
 import Cookies from 'js-cookie';
 import { apiEndpoints } from '@/lib/config';
+import { waitForImportJob } from '@/lib/importJobs';
 
 interface ImportModalProps {
     isOpen: boolean;
@@ -22,8 +23,11 @@ interface PreviewStats {
     total_rows: number;
     to_create: number;
     to_update: number;
+    unchanged?: number;
+    password_only?: number;
     skipped: number;
     errors: number;
+    conflicts?: number;
 }
 
 interface PreviewResult {
@@ -31,12 +35,17 @@ interface PreviewResult {
     stats: PreviewStats;
     preview: UserChange[];
     errors: string[];
+    // Clave de la previsualización guardada en el servidor (confirm sin re-subir)
+    content_hash?: string;
+    expires_at?: string;
 }
 
 interface ProgressState {
     current: number;
     total: number;
     message?: string;
+    // Etapa de encriptado de contraseñas (se informa aparte del avance por filas)
+    hashing?: { current: number; total: number };
 }
 
 export default function ClientImportModal({ isOpen, onClose, onSuccess }: ImportModalProps) {
@@ -166,65 +175,33 @@ export default function ClientImportModal({ isOpen, onClose, onSuccess }: Import
             message: 'Iniciando importación...'
         });
 
-        const formData = new FormData();
-        formData.append('file', file);
-        formData.append('update_passwords', updatePasswords.toString());
-
         try {
-            const response = await fetch(apiEndpoints.clientImportConfirm, {
-                method: 'POST',
-                headers: {
-                    Authorization: `Bearer ${getToken()}`,
-                },
-                body: formData
+            // Se confirma la previsualización ya analizada (sin volver a subir el archivo);
+            // la importación se encola en el servidor y acá solo consultamos el progreso
+            const payload = { content_hash: previewData?.content_hash, update_passwords: updatePasswords.toString() };
+            const res = await axios.post(apiEndpoints.clientImportConfirm, payload, {
+                headers: { Authorization: `Bearer ${getToken()}` }
             });
 
-            if (!response.body) throw new Error("No se pudo iniciar la lectura del stream");
-
-            const reader = response.body.getReader();
-            const decoder = new TextDecoder();
-            let buffer = '';
-
-            while (true) {
-                const { done, value } = await reader.read();
-                if (done) break;
-
-                buffer += decoder.decode(value, { stream: true });
-                const lines = buffer.split('\n');
-                buffer = lines.pop() || '';
+            const job = await waitForImportJob(res.data.id, getToken(), current => {
+                const hashing = current.progress?.stage === 'hashing'
+                    ? { current: current.progress.current || 0, total: current.progress.total || 0 }
+                    : undefined;
+                setProgress(prev => ({
+                    current: current.processed_rows,
+                    total: current.total_rows || prev.total,
+                    message: current.status === 'PENDING' ? 'En cola...' : current.progress?.message,
+                    hashing: hashing || prev.hashing
+                }));
+            });
 
-                for (const line of lines) {
-                    if (!line.trim()) continue;
-                    try {
-                        const data = JSON.parse(line);
-
-                        if (data.type === 'start') {
-                            setProgress(prev => ({ ...prev, total: data.total }));
-                        }
-                        else if (data.type === 'progress') {
-                            setProgress({
-                                current: data.current,
-                                total: data.total,
-                                message: data.message
-                            });
-                        }
-                        else if (data.type === 'result') {
-                            setFinalResult(data.data);
-                            setStep('Result');
-                        }
-                        else if (data.type === 'error') {
-                            throw new Error(data.message);
-                        }
-                    } catch (e: any) {
-                        console.error('Error parsing stream json', e);
-                        if (e.message && !e.message.includes('JSON')) setGeneralError(e.message);
-                    }
-                }
-            }
+            if (job.status === 'FAILED') throw new Error(job.error);
+            setFinalResult(job.result);
+            setStep('Result');
 
         } catch (err: any) {
             console.error(err);
-            setGeneralError(err.message || 'Error de conexión durante la importación');
+            setGeneralError(err.response?.data?.error || err.message || 'Error de conexión durante la importación');
             setStep('PREVIEW');
         } finally {
             setLoading(false);
@@ -301,7 +278,7 @@ export default function ClientImportModal({ isOpen, onClose, onSuccess }: Import
                                     type="file"
                                     ref={fileInputRef}
                                     className="hidden"
-                                    accept=".xlsx"
+                                    accept=".xlsx,.csv,.parquet"
                                     onChange={handleFileSelect}
                                 />
 
@@ -317,7 +294,7 @@ export default function ClientImportModal({ isOpen, onClose, onSuccess }: Import
                                             <Upload className="w-8 h-8 text-gray-400" />
                                         </div>
                                         <p className="font-bold text-gray-700 text-lg">Click para seleccionar archivo</p>
-                                        <p className="text-sm text-gray-500 mt-1">Soporta archivos Excel (.xlsx)</p>
+                                        <p className="text-sm text-gray-500 mt-1">Soporta archivos Excel (.xlsx), CSV o Parquet</p>
                                     </div>
                                 )}
                             </div>
@@ -347,6 +324,12 @@ export default function ClientImportModal({ isOpen, onClose, onSuccess }: Import
                                         style={{ width: `${percentage}%` }}
                                     ></div>
                                 </div>
+
+                                {progress.hashing && progress.hashing.total > 0 && (
+                                    <p className="text-xs text-gray-400">
+                                        Contraseñas encriptadas: {progress.hashing.current} de {progress.hashing.total}
+                                    </p>
+                                )}
                             </div>
 
                             <div className="bg-yellow-50 text-yellow-800 text-xs px-4 py-2 rounded-lg border border-yellow-200 max-w-sm text-center">
@@ -378,6 +361,13 @@ export default function ClientImportModal({ isOpen, onClose, onSuccess }: Import
                                 </div>
                             </div>
 
+                            {!!previewData.stats.unchanged && (
+                                <p className="text-sm text-gray-500">
+                                    {previewData.stats.unchanged} clientes sin cambios (no se modificarán)
+                                    {!!previewData.stats.password_only && `, ${previewData.stats.password_only} solo con contraseña distinta`}.
+                                </p>
+                            )}
+
                             {/* Options */}
                             <div className="flex items-center gap-3 p-4 bg-orange-50 rounded-lg border border-orange-200">
                                 <input
@@ -432,6 +422,12 @@ export default function ClientImportModal({ isOpen, onClose, onSuccess }: Import
                                 </div>
                             </div>
 
+                            {!!finalResult.stats.conflicts && (
+                                <p className="text-sm text-amber-700">
+                                    {finalResult.stats.conflicts} filas no se aplicaron porque los datos cambiaron después de la previsualización.
+                                </p>
+                            )}
+
                             {finalResult.errors.length > 0 && (
                                 <div className="w-full mt-4 text-left">
                                     <h4 className="text-sm font-bold text-red-700 mb-2">Nuevos Errores:</h4>
@@ -4,17 +4,23 @@ import { useCart } from '@/context/CartContext';
 import { useRouter } from 'next/navigation';
 import axios from 'axios';
 import Cookies from 'js-cookie';
-import { useState } from 'react';
+import { useState, useEffect } from 'react';
 import { Trash2, ArrowLeft, CheckCircle } from 'lucide-react';
 import Link from 'next/link';
 import { apiEndpoints } from '@/lib/config';
 
 export default function CartPage() {
-    const { items, removeFromCart, clearCart, total } = useCart();
+    const { items, removeFromCart, clearCart, total, lineErrors, revalidate } = useCart();
     const [loading, setLoading] = useState(false);
     const [success, setSuccess] = useState(false);
     const router = useRouter();
 
+    // Precios del localStorage pueden estar desactualizados: revalidar al entrar
+    useEffect(() => {
+        revalidate().catch(err => console.error(err));
+        // eslint-disable-next-line react-hooks/exhaustive-deps
+    }, [items.length]);
+
     const handleCheckout = async () => {
         const token = Cookies.get('access_token');
         if (!token) return router.push('/login');
@@ -107,6 +113,9 @@ export default function CartPage() {
                                     <td className="p-4">
                                         <p className="font-medium text-gray-900">{item.name}</p>
                                         <p className="text-xs text-gray-500">{item.sku}</p>
+                                        {lineErrors[item.id] && (
+                                            <p className="text-xs text-red-600 mt-1">{lineErrors[item.id]}</p>
+                                        )}
                                     </td>
                                     <td className="p-4 text-gray-600">${item.price.toLocaleString()}</td>
                                     <td className="p-4 font-medium">{item.quantity}</td>
@@ -57,10 +57,22 @@ function DashboardContent() {
     const downloadReport = async (orderId: number) => {
         const token = Cookies.get('access_token');
         try {
-            const res = await axios.get(apiEndpoints.orderInvoice(orderId), {
+            // El PDF se genera en segundo plano: 202 mientras no está listo
+            let res = await axios.get(apiEndpoints.orderInvoice(orderId), {
                 headers: { Authorization: `Bearer ${token}` },
                 responseType: 'blob'
             });
+            for (let attempt = 0; res.status === 202 && attempt < 30; attempt++) {
+                await new Promise(resolve => setTimeout(resolve, 1000));
+                res = await axios.get(apiEndpoints.orderInvoice(orderId), {
+                    headers: { Authorization: `Bearer ${token}` },
+                    responseType: 'blob'
+                });
+            }
+            if (res.status === 202) {
+                alert("La factura todavía se está generando. Intentá de nuevo en unos minutos.");
+                return;
+            }
 
             const url = window.URL.createObjectURL(new Blob([res.data]));
             const link = document.createElement('a');
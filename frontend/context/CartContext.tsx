@@ -2,6 +2,8 @@
 
 import { createContext, useContext, useState, useEffect, ReactNode } from 'react';
 import Cookies from 'js-cookie';
+import axios from 'axios';
+import { apiEndpoints } from '@/lib/config';
 
 interface CartItem {
     id: number;
@@ -11,8 +13,18 @@ interface CartItem {
     quantity: number;
 }
 
+interface QuoteLine {
+    product_id: number | null;
+    unit_price: string | null;
+    stock: number | null;
+    status: 'OK' | 'ERROR';
+    error: string | null;
+}
+
 interface CartContextType {
     items: CartItem[];
+    lineErrors: Record<number, string>;
+    revalidate: () => Promise<void>;
     addToCart: (product: any) => void;
     removeFromCart: (productId: number) => void;
     clearCart: () => void;
@@ -24,6 +36,7 @@ const CartContext = createContext<CartContextType | undefined>(undefined);
 
 export function CartProvider({ children }: { children: ReactNode }) {
     const [items, setItems] = useState<CartItem[]>([]);
+    const [lineErrors, setLineErrors] = useState<Record<number, string>>({});
 
     // Cargar carrito del localStorage al iniciar
     useEffect(() => {
@@ -66,11 +79,36 @@ export function CartProvider({ children }: { children: ReactNode }) {
 
     const clearCart = () => setItems([]);
 
+    // Revalida precios y stock contra el backend (un solo request para todo el carrito)
+    const revalidate = async () => {
+        const token = Cookies.get('access_token');
+        if (!token || items.length === 0) return;
+
+        const res = await axios.post(apiEndpoints.cartQuote, {
+            items: items.map(item => ({ product_id: item.id, quantity: item.quantity }))
+        }, {
+            headers: { Authorization: `Bearer ${token}` }
+        });
+
+        const lines: QuoteLine[] = res.data.lines;
+        const byId = new Map(lines.map(line => [line.product_id, line]));
+        const errors: Record<number, string> = {};
+        lines.forEach(line => {
+            if (line.product_id !== null && line.error) errors[line.product_id] = line.error;
+        });
+
+        setItems(prev => prev.map(item => {
+            const line = byId.get(item.id);
+            return line?.unit_price ? { ...item, price: parseFloat(line.unit_price) } : item;
+        }));
+        setLineErrors(errors);
+    };
+
     const total = items.reduce((sum, item) => sum + (item.price * item.quantity), 0);
     const count = items.reduce((sum, item) => sum + item.quantity, 0);
 
     return (
-        <CartContext.Provider value={{ items, addToCart, removeFromCart, clearCart, total, count }}>
+        <CartContext.Provider value={{ items, lineErrors, revalidate, addToCart, removeFromCart, clearCart, total, count }}>
             {children}
         </CartContext.Provider>
     );
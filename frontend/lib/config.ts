@@ -20,6 +20,7 @@ export const apiEndpoints = {
 
     // Products (Authenticated)
     products: `${API_URL}/api/products/`,
+    productLookup: `${API_URL}/api/products/lookup/`,
     adminProducts: `${API_URL}/api/admin/products/`,
     adminProduct: (id: number) => `${API_URL}/api/admin/products/${id}/`,
     productImport: `${API_URL}/api/products/import/`,
@@ -34,6 +35,8 @@ export const apiEndpoints = {
     // Orders
     orders: `${API_URL}/api/orders/`,
     myOrders: `${API_URL}/api/orders/my-orders/`,
+    quickOrder: `${API_URL}/api/orders/quick/`,
+    cartQuote: `${API_URL}/api/cart/quote/`,
     adminOrders: `${API_URL}/api/admin/orders/`,
     adminOrder: (id: number) => `${API_URL}/api/admin/orders/${id}/`,
     orderInvoice: (id: number) => `${API_URL}/api/orders/${id}/invoice/`,
@@ -49,6 +52,8 @@ export const apiEndpoints = {
     // Exports
     exportProducts: `${API_URL}/api/export/products/`,
     exportOrders: `${API_URL}/api/export/orders/`,
+    exports: `${API_URL}/api/admin/exports/`,
+    exportJob: (id: number) => `${API_URL}/api/admin/exports/${id}/`,
 
     // Payments
     paymentCheckout: `${API_URL}/api/payments/checkout/`,
@@ -63,5 +68,8 @@ export const apiEndpoints = {
 
     // API Imports
     productImportAPI: `${API_URL}/api/admin/products/import/`,
+    productImportPreviewAPI: `${API_URL}/api/admin/products/import/preview/`,
     categoryImportAPI: `${API_URL}/api/admin/categories/import/`,
+    importJob: (id: number) => `${API_URL}/api/admin/imports/${id}/`,
+    importJobEvents: (id: number) => `${API_URL}/api/admin/imports/${id}/events/`,
 };
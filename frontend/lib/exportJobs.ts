@@ -0,0 +1,36 @@
+'use client';
+
+import axios from 'axios';
+import { apiEndpoints } from '@/lib/config';
+
+export interface ExportArtifact {
+    id: number;
+    export_type: string;
+    format: 'xlsx' | 'csv' | 'ndjson';
+    status: 'PENDING' | 'RUNNING' | 'COMPLETED' | 'FAILED';
+    is_finished: boolean;
+    file_name: string;
+    size: number;
+    error: string;
+    download_url: string | null;
+}
+
+/**
+ * Pide una exportación en segundo plano y espera el archivo. Si los datos no
+ * cambiaron desde la última exportación igual, el servidor devuelve el
+ * archivo ya generado sin esperar.
+ */
+export async function requestExport(
+    type: string,
+    token: string | undefined,
+    format: ExportArtifact['format'] = 'xlsx',
+    intervalMs = 1000
+): Promise<ExportArtifact> {
+    const headers = { Authorization: `Bearer ${token}` };
+    let artifact = (await axios.post<ExportArtifact>(apiEndpoints.exports, { type, format }, { headers })).data;
+    while (!artifact.is_finished) {
+        await new Promise(resolve => setTimeout(resolve, intervalMs));
+        artifact = (await axios.get<ExportArtifact>(apiEndpoints.exportJob(artifact.id), { headers })).data;
+    }
+    return artifact;
+}
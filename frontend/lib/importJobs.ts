@@ -0,0 +1,38 @@
+'use client';
+
+import axios from 'axios';
+import { apiEndpoints } from '@/lib/config';
+
+export interface ImportJob {
+    id: number;
+    kind: 'CLIENTS' | 'PRODUCTS' | 'CATEGORIES';
+    status: 'PENDING' | 'RUNNING' | 'COMPLETED' | 'FAILED';
+    status_display: string;
+    is_finished: boolean;
+    total_rows: number;
+    processed_rows: number;
+    progress: { type?: string; stage?: string; current?: number; total?: number; message?: string };
+    result: any;
+    error: string;
+}
+
+/**
+ * Consulta el estado de una importación en segundo plano hasta que termina.
+ * El job sigue corriendo en el servidor aunque se cierre la página: se puede
+ * volver a consultar con el mismo id.
+ */
+export async function waitForImportJob(
+    jobId: number,
+    token: string | undefined,
+    onProgress?: (job: ImportJob) => void,
+    intervalMs = 1000
+): Promise<ImportJob> {
+    while (true) {
+        const res = await axios.get<ImportJob>(apiEndpoints.importJob(jobId), {
+            headers: { Authorization: `Bearer ${token}` }
+        });
+        onProgress?.(res.data);
+        if (res.data.is_finished) return res.data;
+        await new Promise(resolve => setTimeout(resolve, intervalMs));
+    }
+}